@@ -10,6 +10,10 @@ from helpers.msg_utils import MakeButtons
 MERGE_MODE = {}  # Maintain each user merge_mode
 UPLOAD_AS_DOC = {}  # Maintain each user ul_type
 UPLOAD_TO_DRIVE = {}  # Maintain each user drive_choice
+OVERSIZE_CHOICE = {}  # Pending split/compress answer of each user
+PREVIEW_MODE = {}  # Preview of each user's merge, "before" or "only" the full file
+METADATA_EDITS = {}  # Title, track names and languages for each user's next merge
+TRIM_RANGES = {}  # Trim range of queued videos, {user: {message id: (start, end, exact)}}, start None is auto
 
 FINISHED_PROGRESS_STR = os.environ.get("FINISHED_PROGRESS_STR", "█")
 UN_FINISHED_PROGRESS_STR = os.environ.get("UN_FINISHED_PROGRESS_STR", "░")
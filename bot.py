@@ -15,11 +15,13 @@ from pyrogram.types import InlineKeyboardButton, InlineKeyboardMarkup, Message
 
 # Import configurations
 from __init__ import (
-    AUDIO_EXTENSIONS, LOGGER, MERGE_MODE, SUBTITLE_EXTENSIONS, 
-    UPLOAD_AS_DOC, UPLOAD_TO_DRIVE, VIDEO_EXTENSIONS,
+    AUDIO_EXTENSIONS, LOGGER, MERGE_MODE, METADATA_EDITS, OVERSIZE_CHOICE, PREVIEW_MODE,
+    SUBTITLE_EXTENSIONS, TRIM_RANGES, UPLOAD_AS_DOC, UPLOAD_TO_DRIVE, VIDEO_EXTENSIONS,
     formatDB, gDict, queueDB, replyDB
 )
 from config import Config
+from helpers.metadata_editor import parse_edits
+from helpers.trimmer import parse_timestamp
 from helpers.utils import UserSettings, get_readable_file_size, get_readable_time
 
 botStartTime = time.time()
@@ -178,7 +180,7 @@ async def start_handler(c: Client, m: Message):
 
 # ================== VIDEO UPLOAD HANDLER ==================
 
-@mergeApp.on_message((filters.video | filters.document) & filters.private)
+@mergeApp.on_message((filters.video | filters.document | filters.audio) & filters.private)
 async def video_upload_handler(c: Client, m: Message):
     """Handle video uploads and add to queue"""
     user = UserSettings(m.from_user.id, m.from_user.first_name)
@@ -202,6 +204,12 @@ async def video_upload_handler(c: Client, m: Message):
         file_size = m.video.file_size
         file_added = True
         
+    elif m.audio:
+        queueDB[m.from_user.id]["audios"].append(m.id)
+        file_name = m.audio.file_name or f"audio_{m.id}"
+        file_size = m.audio.file_size
+        file_added = True
+        
     elif m.document:
         file_ext = m.document.file_name.split('.')[-1].lower() if m.document.file_name else ""
         
@@ -290,10 +298,15 @@ async def callback_handler(c: Client, cb):
 🚫 **Banned:** No ✅
 ✅ **Allowed:** Yes"""
             
+            preview_status = {"before": "Before Upload", "only": "Only"}.get(
+                PREVIEW_MODE.get(user_id), "❌"
+            )
             keyboard = InlineKeyboardMarkup([
                 [InlineKeyboardButton("🎥 Mode: Video+Video", callback_data="mode_1")],
                 [InlineKeyboardButton("🎵 Mode: Video+Audio", callback_data="mode_2")],
                 [InlineKeyboardButton("📝 Mode: Video+Subtitle", callback_data="mode_3")],
+                [InlineKeyboardButton("🎧 Mode: Audio+Audio", callback_data="mode_5")],
+                [InlineKeyboardButton(f"🎞 Preview: {preview_status}", callback_data="preview_toggle")],
                 [InlineKeyboardButton("🔙 Back", callback_data="back_to_start")]
             ])
             
@@ -304,13 +317,28 @@ async def callback_handler(c: Client, cb):
             user.merge_mode = mode_id
             user.set()
             
-            mode_names = {1: "Video+Video", 2: "Video+Audio", 3: "Video+Subtitle"}
+            mode_names = {1: "Video+Video", 2: "Video+Audio", 3: "Video+Subtitle", 5: "Audio+Audio"}
             await cb.answer(f"✅ Mode changed to: {mode_names.get(mode_id, 'Unknown')}")
             
         elif data == "merge":
             if not user.allowed:
                 await cb.answer("🔐 Login required!", show_alert=True)
                 return
+            
+            file_name = f"downloads/{user_id}/[@{Config.OWNER_USERNAME}]_{int(time.time())}.mkv"
+            if user.merge_mode == 5:
+                audio_count = len(queueDB.get(user_id, {}).get("audios", []))
+                if audio_count < 2:
+                    await cb.answer("📥 Need at least 2 audio files to join!", show_alert=True)
+                    return
+                await cb.message.edit_text(
+                    "🔄 **Starting Audio Join...**\n\n"
+                    f"🎧 Processing {audio_count} audio files\n"
+                    "⏳ Please wait, this may take a while..."
+                )
+                from plugins.mergeAudios import mergeAudios
+                await mergeAudios(c, cb, file_name)
+                return
                 
             if user_id not in queueDB or not queueDB[user_id]["videos"]:
                 await cb.answer("📋 Queue is empty! Please add videos first.", show_alert=True)
@@ -329,9 +357,11 @@ async def callback_handler(c: Client, cb):
             )
             
             try:
-                # Import and call merge function
-                from helpers.merge_helper import start_merge_process
-                await start_merge_process(c, cb, user_id)
+                # Full pipeline: trims, duplicates, oversize handling, preview
+                from plugins.mergeVideo import mergeNow
+                UPLOAD_AS_DOC.setdefault(str(user_id), False)
+                UPLOAD_TO_DRIVE.setdefault(str(user_id), False)
+                await mergeNow(c, cb, file_name)
                 
             except ImportError:
                 await cb.message.edit_text(
@@ -347,6 +377,29 @@ async def callback_handler(c: Client, cb):
                     "💡 Please try again or contact support."
                 )
                 
+        elif data.startswith("oversize_"):
+            # Split/compress answer for a merge waiting in uploadOversized
+            future = OVERSIZE_CHOICE.get(user_id)
+            if future is None or future.done():
+                await cb.answer("⌛ This choice has expired", show_alert=True)
+                return
+            picked = data.split("_", 1)[1]
+            future.set_result(picked)
+            await cb.answer("🗜 Compressing" if picked == "compress" else "✂️ Splitting")
+            
+        elif data == "preview_toggle":
+            # Off -> before the full file -> preview only
+            current = PREVIEW_MODE.get(user_id)
+            if current is None:
+                PREVIEW_MODE[user_id] = "before"
+                await cb.answer("🎞 Preview sent before the full file")
+            elif current == "before":
+                PREVIEW_MODE[user_id] = "only"
+                await cb.answer("🎞 Only the preview is sent")
+            else:
+                PREVIEW_MODE.pop(user_id, None)
+                await cb.answer("🎞 Preview disabled")
+            
         elif data == "show_queue":
             if user_id not in queueDB:
                 await cb.answer("📋 Queue is empty!", show_alert=True)
@@ -367,6 +420,7 @@ Total Items: {video_count + audio_count + subtitle_count}"""
             await cb.answer(queue_text, show_alert=True)
             
         elif data == "clear_queue":
+            TRIM_RANGES.pop(user_id, None)
             if user_id in queueDB:
                 queueDB[user_id] = {"videos": [], "subtitles": [], "audios": []}
                 await cb.answer("🗑️ Queue cleared successfully!", show_alert=True)
@@ -436,6 +490,8 @@ async def help_handler(c: Client, m: Message):
 • `/login <password>` - Login to use bot
 • `/help` - Show this help
 • `/settings` - User preferences
+• `/trim <start> [end] [exact]` - Reply to a queued video to cut it before merging
+• `/metadata title=<title> | a1.lang=<code>` - Title, track names and languages of the next merge
 
 **Support:** Contact @{Config.OWNER_USERNAME}"""
     
@@ -457,6 +513,102 @@ async def settings_command(c: Client, m: Message):
         'message': m,
         'answer': lambda x, show_alert=False: None
     })())
+@mergeApp.on_message(filters.command(["trim"]) & filters.private)
+async def trim_command(c: Client, m: Message):
+    """Set the trim range of a queued video, reply to the video with the command"""
+    user = UserSettings(m.from_user.id, m.from_user.first_name)
+
+    if not user.allowed and m.from_user.id != int(Config.OWNER):
+        await m.reply_text("🔐 **Access Required!** Please login first.")
+        return
+
+    target = m.reply_to_message
+    queued = queueDB.get(m.from_user.id, {}).get("videos", [])
+    if target is None or target.id not in queued:
+        await m.reply_text(
+            "✂️ **Trim a queued video**\n\n"
+            "Reply to a video in the queue with\n"
+            "`/trim <start> [end] [exact]`\n\n"
+            "**Examples:**\n"
+            "`/trim 1:30` - drop the first 90 seconds\n"
+            "`/trim 0 1:58:00` - drop everything after 1h58m\n"
+            "`/trim 0:45 42:10 exact` - frame accurate cut (slower)\n"
+            "`/trim auto` - cut at the black, silent breaks around intro and credits\n"
+            "`/trim off` - remove the trim",
+            quote=True,
+        )
+        return
+
+    args = m.command[1:]
+    if args and args[0].lower() == "off":
+        TRIM_RANGES.get(m.from_user.id, {}).pop(target.id, None)
+        await m.reply_text("✅ Trim removed", quote=True)
+        return
+
+    if args and args[0].lower() == "auto":
+        # Start None: the breaks are searched once the video is downloaded
+        TRIM_RANGES.setdefault(m.from_user.id, {})[target.id] = (None, None, False)
+        await m.reply_text("✂️ **Auto trim set:** intro and credits are cut at merge", quote=True)
+        return
+
+    exact = bool(args) and args[-1].lower() == "exact"
+    if exact:
+        args = args[:-1]
+    times = [parse_timestamp(a) for a in args[:2]]
+    if not times or None in times or (len(times) == 2 and times[1] <= times[0]):
+        await m.reply_text("❌ **Invalid range!** Use `SS`, `MM:SS` or `HH:MM:SS`", quote=True)
+        return
+    start = times[0]
+    end = times[1] if len(times) == 2 else None
+    TRIM_RANGES.setdefault(m.from_user.id, {})[target.id] = (start, end, exact)
+    await m.reply_text(
+        f"✂️ **Trim set:** `{get_readable_time(start)}` → "
+        f"`{get_readable_time(end) if end is not None else 'end'}`"
+        f"{' (frame accurate)' if exact else ' (at keyframes)'}",
+        quote=True,
+    )
+
+@mergeApp.on_message(filters.command(["metadata"]) & filters.private)
+async def metadata_command(c: Client, m: Message):
+    """Set the title, track names and languages written into the next merge"""
+    user = UserSettings(m.from_user.id, m.from_user.first_name)
+
+    if not user.allowed and m.from_user.id != int(Config.OWNER):
+        await m.reply_text("🔐 **Access Required!** Please login first.")
+        return
+
+    if not user.edit_metadata:
+        await m.reply_text(
+            "🏷 **Edit Metadata is off**\n\nTurn it on in /settings first.", quote=True
+        )
+        return
+
+    parts = (m.text or "").split(None, 1)
+    if len(parts) < 2:
+        await m.reply_text(
+            "🏷 **Edit metadata of the next merge**\n\n"
+            "`/metadata title=<title> | <track>.name=<name> | <track>.lang=<code>`\n\n"
+            "Tracks are `v`, `a` or `s` plus their number, e.g. `a2` is the second audio.\n\n"
+            "**Examples:**\n"
+            "`/metadata title=My Film`\n"
+            "`/metadata a1.lang=jpn | a1.name=Japanese | s1.lang=eng`\n"
+            "`/metadata off` - forget the edits",
+            quote=True,
+        )
+        return
+
+    if parts[1].strip().lower() == "off":
+        METADATA_EDITS.pop(m.from_user.id, None)
+        await m.reply_text("✅ Metadata edits removed", quote=True)
+        return
+
+    try:
+        edits = parse_edits(parts[1])
+    except ValueError as err:
+        await m.reply_text(f"❌ **Invalid metadata!** {err}", quote=True)
+        return
+    METADATA_EDITS[m.from_user.id] = edits
+    await m.reply_text(f"🏷 **Applied at the next merge:**\n{edits.describe()}", quote=True)
 
 if __name__ == "__main__":
     LOGGER.info("🚀 Starting SSMERGE Bot...")
@@ -67,6 +67,15 @@ class Config(object):
     MAX_CONCURRENT_USERS = int(get_env_var.__func__("MAX_CONCURRENT_USERS", required=False, default="5"))
     MAX_FILE_SIZE = int(get_env_var.__func__("MAX_FILE_SIZE", required=False, default="2147483648"))
 
+    # FFmpeg Settings
+    MAX_FFMPEG_JOBS = int(get_env_var.__func__("MAX_FFMPEG_JOBS", required=False, default="2"))
+    FFMPEG_CPU_AFFINITY = get_env_var.__func__("FFMPEG_CPU_AFFINITY", required=False, default="false").lower() == "true"
+    FFMPEG_STALL_TIMEOUT = int(get_env_var.__func__("FFMPEG_STALL_TIMEOUT", required=False, default="120"))
+    FFMPEG_MEMORY_LIMIT_MB = int(get_env_var.__func__("FFMPEG_MEMORY_LIMIT_MB", required=False, default="4096"))
+    RCLONE_MIN_SPEED = int(get_env_var.__func__("RCLONE_MIN_SPEED", required=False, default="524288"))
+    AUDIO_AUTO_ALIGN = get_env_var.__func__("AUDIO_AUTO_ALIGN", required=False, default="true").lower() == "true"
+    SUBTITLE_AUTO_SYNC = get_env_var.__func__("SUBTITLE_AUTO_SYNC", required=False, default="false").lower() == "true"
+
     # Runtime Variables
     IS_PREMIUM = False
     MODES = ["video-video", "video-audio", "video-subtitle", "extract-streams"]
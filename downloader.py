@@ -16,6 +16,7 @@ from hashlib import sha256
 # Import from bot modules
 from __init__ import LOGGER
 from config import Config
+from helpers.probe import HEADER_PROBE_SIZE
 from helpers.utils import get_readable_file_size, get_readable_time
 
 # Configuration Constants
@@ -240,10 +241,11 @@ def handle_gofile_url(url: str, password: str = None) -> tuple:
     retry=retry_if_exception_type(aiohttp.ClientError) | retry_if_exception_type(asyncio.TimeoutError),
     reraise=True
 )
-async def _perform_download_request(session: aiohttp.ClientSession, url: str, dest_path: str, status_message, total_size: int):
+async def _perform_download_request(session: aiohttp.ClientSession, url: str, dest_path: str, status_message, total_size: int, on_header=None):
     """Internal function to perform download with retry logic"""
     start_time = time.time()
     downloaded = 0
+    headed = False
     
     try:
         async with session.get(url) as response:
@@ -258,6 +260,12 @@ async def _perform_download_request(session: aiohttp.ClientSession, url: str, de
                     f.write(chunk)
                     downloaded += len(chunk)
                     
+                    # Container header is on disk, let the caller inspect it
+                    if on_header is not None and not headed and HEADER_PROBE_SIZE <= downloaded < total_size:
+                        f.flush()
+                        on_header(dest_path, total_size)
+                        headed = True
+                    
                     # Update progress
                     if total_size > 0:
                         progress_percent = downloaded / total_size
@@ -283,8 +291,13 @@ async def _perform_download_request(session: aiohttp.ClientSession, url: str, de
         LOGGER.error(f"Download request error: {e}")
         raise e
 
-async def download_from_url(url: str, user_id: int, status_message, password: str = None) -> str | None:
-    """Download video from direct download link"""
+async def download_from_url(url: str, user_id: int, status_message, password: str = None, on_header=None) -> str | None:
+    """
+    Download video from direct download link
+
+    `on_header(path, size)` is called once the first `HEADER_PROBE_SIZE`
+    bytes are on disk, with the growing file and its final size.
+    """
     start_time = time.time()
     
     # Validate URL
@@ -373,7 +386,7 @@ async def download_from_url(url: str, user_id: int, status_message, password: st
                 total_size = 0
             
             # Perform download
-            downloaded_size = await _perform_download_request(session, url, dest_path, status_message, total_size)
+            downloaded_size = await _perform_download_request(session, url, dest_path, status_message, total_size, on_header)
             
             # Verify download
             actual_size = os.path.getsize(dest_path)
@@ -414,8 +427,13 @@ async def download_from_url(url: str, user_id: int, status_message, password: st
         )
         return None
 
-async def download_from_tg(message, user_id: int, status_message) -> str | None:
-    """Download video from Telegram message"""
+async def download_from_tg(message, user_id: int, status_message, on_header=None) -> str | None:
+    """
+    Download video from Telegram message
+
+    `on_header(path, size)` is called once the first `HEADER_PROBE_SIZE`
+    bytes are on disk, with the growing file and its final size.
+    """
     try:
         # Setup paths
         user_download_dir = f"downloads/{str(user_id)}"
@@ -468,8 +486,15 @@ async def download_from_tg(message, user_id: int, status_message) -> str | None:
         
         # Progress callback
         start_time = time.time()
+        # Pyrogram writes to "<file>.temp" and renames it when done
+        partial_path = os.path.abspath(dest_path) + ".temp"
+        headed = False
         
         async def progress_callback(current, total):
+            nonlocal headed
+            if on_header is not None and not headed and HEADER_PROBE_SIZE <= current < total:
+                on_header(partial_path, total)
+                headed = True
             progress = current / total
             speed = get_speed(start_time, current)
             eta = get_time_left(start_time, current, total)
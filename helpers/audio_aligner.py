@@ -0,0 +1,129 @@
+# audio_aligner.py - Finds the offset of an external audio track against the video
+import asyncio
+
+import numpy as np
+
+from __init__ import LOGGER
+from helpers.ffmpeg_runner import run_ffmpeg_pipe
+from helpers.probe import get_duration, get_streams, probe_async
+
+ALIGN_SAMPLE_RATE = 8000  # Mono 8 kHz keeps the speech and music onsets
+ALIGN_WINDOW = 60  # Seconds decoded from each track
+ALIGN_MAX_LAG = 5.0  # Offsets beyond this are not trusted
+# Peak height over the correlation RMS needed to accept a lag
+ALIGN_MIN_CONFIDENCE = 8.0
+ALIGN_MIN_OFFSET = 0.02  # Below one video frame, leave the track alone
+
+
+async def decode_pcm(
+    path: str, stream: str, start: float, seconds: float, rate: int = ALIGN_SAMPLE_RATE
+) -> np.ndarray:
+    """
+    Decodes `seconds` of one audio stream to mono float32 PCM at `rate`.
+
+    returns: Samples, empty when nothing could be decoded
+    """
+    cmd = [
+        "ffmpeg",
+        "-hide_banner",
+        "-ss",
+        f"{start:.3f}",
+        "-t",
+        f"{seconds:.3f}",
+        "-i",
+        path,
+        "-map",
+        stream,
+        "-vn",
+        "-sn",
+        "-ac",
+        "1",
+        "-ar",
+        str(rate),
+        "-f",
+        "s16le",
+        "-",
+    ]
+    returncode, raw, _ = await run_ffmpeg_pipe(cmd)
+    if returncode != 0:
+        return np.zeros(0, dtype=np.float32)
+    samples = np.frombuffer(raw[: len(raw) // 2 * 2], dtype="<i2")
+    return samples.astype(np.float32) / 32768.0
+
+
+def find_lag(reference: np.ndarray, track: np.ndarray, rate: int, max_lag: float):
+    """
+    Lag of `track` against `reference` by FFT cross-correlation.
+
+    The cross spectrum is phase-normalised (GCC-PHAT), so a dub that shares
+    only the music and effects bed with the original still gives one sharp
+    peak instead of a broad hump dominated by loud passages.
+
+    returns: (seconds `track` must be delayed by, confidence)
+    """
+    n = len(reference) + len(track)
+    size = 1 << (n - 1).bit_length()
+    spectrum = np.fft.rfft(reference - reference.mean(), size) * np.conj(
+        np.fft.rfft(track - track.mean(), size)
+    )
+    spectrum /= np.maximum(np.abs(spectrum), 1e-12)
+    corr = np.fft.irfft(spectrum, size)
+    limit = min(int(max_lag * rate), size // 2 - 1)
+    # Negative lags wrap to the end of the circular correlation
+    window = np.concatenate((corr[-limit:], corr[: limit + 1]))
+    peak = int(np.argmax(window))
+    rms = float(np.sqrt(np.mean(window**2)))
+    confidence = float(window[peak]) / rms if rms > 0 else 0.0
+    return (peak - limit) / rate, confidence
+
+
+async def track_offset(video_path: str, track_path: str) -> float:
+    """
+    Offset to apply to the first audio stream of `track_path` so it lines
+    up with the first audio stream of `video_path`.
+
+    returns: Seconds, positive delays the track, 0.0 when unsure
+    """
+    video_data, track_data = await asyncio.gather(
+        probe_async(video_path), probe_async(track_path)
+    )
+    if not get_streams(video_data, "audio") or not get_streams(track_data, "audio"):
+        return 0.0
+    duration = min(get_duration(video_data), get_duration(track_data))
+    if duration <= 2 * ALIGN_MAX_LAG:
+        return 0.0
+    # Skip cold opens and logos, they are often silent in one of the tracks
+    start = min(ALIGN_WINDOW / 2, max(0.0, duration - ALIGN_WINDOW) / 2)
+    seconds = min(ALIGN_WINDOW, duration - start)
+    # The track window is wider so a lag of up to ALIGN_MAX_LAG stays inside it
+    track_start = max(0.0, start - ALIGN_MAX_LAG)
+    reference, track = await asyncio.gather(
+        decode_pcm(video_path, "0:a:0", start, seconds),
+        decode_pcm(track_path, "0:a:0", track_start, seconds + 2 * ALIGN_MAX_LAG),
+    )
+    if not len(reference) or not len(track):
+        return 0.0
+    lag, confidence = find_lag(reference, track, ALIGN_SAMPLE_RATE, 2 * ALIGN_MAX_LAG)
+    # Windows started at different times, undo that before judging the lag
+    offset = lag + start - track_start
+    if confidence < ALIGN_MIN_CONFIDENCE or abs(offset) > ALIGN_MAX_LAG:
+        LOGGER.info(f"No reliable offset for {track_path} (confidence {confidence:.1f})")
+        return 0.0
+    if abs(offset) < ALIGN_MIN_OFFSET:
+        return 0.0
+    LOGGER.info(f"{track_path} is off by {offset:+.3f}s (confidence {confidence:.1f})")
+    return offset
+
+
+def offset_args(offset: float) -> list:
+    """
+    Input options shifting the next input by `offset` seconds.
+
+    A delay uses `-itsoffset`; an advance drops the leading audio with an
+    input seek instead, so no negative timestamps reach the muxer.
+    """
+    if offset > 0:
+        return ["-itsoffset", f"{offset:.3f}"]
+    if offset < 0:
+        return ["-ss", f"{-offset:.3f}"]
+    return []
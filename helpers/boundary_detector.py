@@ -0,0 +1,151 @@
+# boundary_detector.py - Finds black, silent breaks that frame intros and credits
+import asyncio
+
+import numpy as np
+
+from __init__ import LOGGER
+from helpers.ffmpeg_runner import run_ffmpeg_stream
+from helpers.probe import get_duration, get_streams, probe_async
+
+INTRO_WINDOW = 240  # Seconds searched at the start for the end of recap/intro
+OUTRO_WINDOW = 360  # Seconds searched at the end for the start of the credits
+MAX_WINDOW_SHARE = 0.25  # Short clips: never search more than this share
+ANALYSIS_FPS = 4  # Steps per second for both luma and audio
+LUMA_WIDTH = 64
+LUMA_HEIGHT = 36
+BLACK_PIXEL = 32  # Luma at or below this counts as black
+BLACK_RATIO = 0.98  # Share of black pixels in a black frame
+SILENCE_RATE = 4000
+SILENCE_DB = -50.0  # RMS level in dBFS under which a step is silent
+MIN_BREAK = 0.5  # Seconds a black (and silent) span must last
+
+
+class _Steps(object):
+    """Reduces a raw frame stream to one flag per frame as it arrives"""
+
+    def __init__(self, frame_size: int, test):
+        self.frame_size = frame_size
+        self.test = test  # (n, frame_size) array -> n flags
+        self.flags = []
+
+    def feed(self, chunk: bytes):
+        self.flags.append(self.test(chunk))
+
+    def result(self) -> np.ndarray:
+        if not self.flags:
+            return np.zeros(0, dtype=bool)
+        return np.concatenate(self.flags)
+
+
+def _black(chunk: bytes) -> np.ndarray:
+    frames = np.frombuffer(chunk, dtype=np.uint8).reshape(-1, LUMA_WIDTH * LUMA_HEIGHT)
+    return (frames <= BLACK_PIXEL).mean(axis=1) >= BLACK_RATIO
+
+
+def _silent(chunk: bytes) -> np.ndarray:
+    samples = np.frombuffer(chunk, dtype="<i2").astype(np.float32) / 32768.0
+    steps = samples.reshape(-1, SILENCE_RATE // ANALYSIS_FPS)
+    rms = np.sqrt((steps**2).mean(axis=1))
+    return 20 * np.log10(rms + 1e-9) < SILENCE_DB
+
+
+async def _black_steps(path: str, start: float, seconds: float) -> np.ndarray:
+    steps = _Steps(LUMA_WIDTH * LUMA_HEIGHT, _black)
+    cmd = [
+        "ffmpeg",
+        "-hide_banner",
+        "-ss",
+        f"{start:.3f}",
+        "-t",
+        f"{seconds:.3f}",
+        "-i",
+        path,
+        "-map",
+        "0:v:0",
+        "-vf",
+        f"fps={ANALYSIS_FPS},scale={LUMA_WIDTH}:{LUMA_HEIGHT},format=gray",
+        "-f",
+        "rawvideo",
+        "-",
+    ]
+    await run_ffmpeg_stream(cmd, steps.feed, frame_bytes=steps.frame_size)
+    return steps.result()
+
+
+async def _silent_steps(path: str, start: float, seconds: float) -> np.ndarray:
+    steps = _Steps(SILENCE_RATE // ANALYSIS_FPS * 2, _silent)
+    cmd = [
+        "ffmpeg",
+        "-hide_banner",
+        "-ss",
+        f"{start:.3f}",
+        "-t",
+        f"{seconds:.3f}",
+        "-i",
+        path,
+        "-map",
+        "0:a:0",
+        "-vn",
+        "-sn",
+        "-ac",
+        "1",
+        "-ar",
+        str(SILENCE_RATE),
+        "-f",
+        "s16le",
+        "-",
+    ]
+    await run_ffmpeg_stream(cmd, steps.feed, frame_bytes=steps.frame_size)
+    return steps.result()
+
+
+def break_spans(flags: np.ndarray, min_steps: int) -> list:
+    """(first, last + 1) step of every run of True at least `min_steps` long"""
+    edges = np.diff(np.concatenate(([0], flags.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    keep = ends - starts >= min_steps
+    return list(zip(starts[keep].tolist(), ends[keep].tolist()))
+
+
+async def _breaks(path: str, start: float, seconds: float, audio: bool) -> list:
+    """Black spans, silent as well when there is audio, as (start, end) seconds"""
+    if audio:
+        black, silent = await asyncio.gather(
+            _black_steps(path, start, seconds), _silent_steps(path, start, seconds)
+        )
+        n = min(len(black), len(silent))
+        flags = black[:n] & silent[:n]
+    else:
+        flags = await _black_steps(path, start, seconds)
+    return [
+        (start + a / ANALYSIS_FPS, start + b / ANALYSIS_FPS)
+        for a, b in break_spans(flags, int(MIN_BREAK * ANALYSIS_FPS))
+    ]
+
+
+async def find_trim_points(path: str):
+    """
+    Proposes where an intro ends and where the credits start.
+
+    Only the first and last minutes are decoded, at 64x36 luma and 4 kHz
+    mono, and reduced with NumPy as they stream in. The intro ends after
+    the last black and silent break near the start, the credits begin at
+    the first such break near the end.
+
+    returns: (start, end) in seconds, either None when nothing was found
+    """
+    data = await probe_async(path)
+    duration = get_duration(data)
+    if duration <= 0 or not get_streams(data, "video"):
+        return None, None
+    audio = bool(get_streams(data, "audio"))
+    head = min(INTRO_WINDOW, duration * MAX_WINDOW_SHARE)
+    tail = min(OUTRO_WINDOW, duration * MAX_WINDOW_SHARE)
+    intro, outro = await asyncio.gather(
+        _breaks(path, 0.0, head, audio), _breaks(path, duration - tail, tail, audio)
+    )
+    start = intro[-1][1] if intro else None
+    end = outro[0][0] if outro else None
+    LOGGER.info(f"Trim candidates for {path}: start {start}, end {end}")
+    return start, end
@@ -0,0 +1,135 @@
+# compressor.py - Re-encode a video so it fits a target file size
+import os
+
+from __init__ import LOGGER
+from helpers.ffmpeg_runner import available_cpus
+from helpers.probe import forget, get_duration, get_streams, probe_async
+from helpers.segment_encoder import encode_segmented
+
+COMPRESS_HEADROOM = 0.96  # Container overhead and rate control overshoot
+COMPRESS_MIN_VIDEO_BITRATE = 150_000  # Below this the result is unwatchable
+COMPRESS_DEFAULT_AUDIO_BITRATE = 128_000  # When the probe has no bit_rate
+COMPRESS_CRF = "23"
+COMPRESS_PRESET = "veryfast"
+COMPRESS_MAX_ATTEMPTS = 2
+# Rough libx264 veryfast throughput of one core, used only for the ETA
+ENCODE_PIXELS_PER_CPU_SECOND = 25_000_000
+# Bits per pixel under which 1080p and up is scaled down to 720p
+LOW_BPP = 0.045
+
+
+class CompressionEstimate(object):
+    """What a size targeted encode will produce and roughly how long it takes"""
+
+    def __init__(self, data: dict, target_size: int):
+        self.target_size = target_size
+        self.duration = get_duration(data)
+        self.audio_bitrate = 0
+        for audio in get_streams(data, "audio"):
+            try:
+                self.audio_bitrate += int(audio["bit_rate"])
+            except (KeyError, TypeError, ValueError):
+                self.audio_bitrate += COMPRESS_DEFAULT_AUDIO_BITRATE
+        videos = get_streams(data, "video")
+        self.video = videos[0] if videos else {}
+        self.width = int(self.video.get("width") or 0)
+        self.height = int(self.video.get("height") or 0)
+        self.fps = _fps(self.video.get("r_frame_rate") or self.video.get("avg_frame_rate"))
+        self.video_bitrate = 0
+        if self.duration > 0:
+            total_bits = target_size * 8 * COMPRESS_HEADROOM
+            self.video_bitrate = int(total_bits / self.duration) - self.audio_bitrate
+        self.scale_height = None
+        if self.height > 720 and self.width and self.fps:
+            bpp = self.video_bitrate / (self.width * self.height * self.fps)
+            if bpp < LOW_BPP:
+                self.scale_height = 720
+
+    @property
+    def feasible(self) -> bool:
+        return self.video_bitrate >= COMPRESS_MIN_VIDEO_BITRATE
+
+    @property
+    def projected_size(self) -> int:
+        return int((self.video_bitrate + self.audio_bitrate) * self.duration / 8)
+
+    @property
+    def projected_seconds(self) -> float:
+        height = self.scale_height or self.height
+        width = self.width * height / self.height if self.height else 0
+        pixels = width * height * self.fps * self.duration
+        return pixels / (ENCODE_PIXELS_PER_CPU_SECOND * available_cpus())
+
+
+def _fps(rate) -> float:
+    try:
+        num, den = str(rate).split("/")
+        return float(num) / float(den) if float(den) else 0.0
+    except ValueError:
+        try:
+            return float(rate)
+        except (TypeError, ValueError):
+            return 0.0
+
+
+async def estimate_compression(file_path: str, target_size: int) -> CompressionEstimate:
+    return CompressionEstimate(await probe_async(file_path), target_size)
+
+
+async def compress_to_size(
+    file_path: str, target_size: int, message=None, estimate: CompressionEstimate = None
+):
+    """
+    Re-encode the video with a capped CRF so the result fits `target_size`.
+
+    The video bitrate cap comes from the duration and the audio bitrate,
+    audio and subtitles are copied. If the output still overshoots, the cap
+    is lowered by the overshoot ratio and the encode is repeated once.
+
+    returns: Path of the compressed file, None if it does not fit
+    """
+    if estimate is None:
+        estimate = await estimate_compression(file_path, target_size)
+    if not estimate.feasible:
+        LOGGER.warning(f"{file_path} can not be compressed to {target_size} bytes")
+        return None
+    stem, ext = os.path.splitext(file_path)
+    out = f"{stem}.compressed.mkv"
+    video_bitrate = estimate.video_bitrate
+    for attempt in range(COMPRESS_MAX_ATTEMPTS):
+        video_args = [
+            "-c:v",
+            "libx264",
+            "-preset",
+            COMPRESS_PRESET,
+            "-crf",
+            COMPRESS_CRF,
+            "-maxrate",
+            str(video_bitrate),
+            "-bufsize",
+            str(video_bitrate * 2),
+        ]
+        if estimate.scale_height:
+            video_args += ["-vf", f"scale=-2:{estimate.scale_height}"]
+        ok = await encode_segmented(
+            file_path,
+            out,
+            video_args,
+            audio_args=["-map", "0:a?", "-c:a", "copy"],
+            subtitles=True,
+            message=message,
+        )
+        if not ok:
+            return None
+        size = os.path.getsize(out)
+        if size <= target_size:
+            LOGGER.info(f"Compressed {file_path} to {size} bytes")
+            return out
+        LOGGER.warning(f"Compressed size {size} is above {target_size}, lowering bitrate")
+        forget(out)
+        video_bitrate = int(video_bitrate * target_size * COMPRESS_HEADROOM / size)
+        if video_bitrate < COMPRESS_MIN_VIDEO_BITRATE:
+            break
+    if os.path.exists(out):
+        os.remove(out)
+    return None
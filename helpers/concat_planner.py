@@ -0,0 +1,326 @@
+# concat_planner.py - Decides which inputs can be stream-copy concatenated
+import os
+from collections import Counter
+
+from __init__ import LOGGER
+from helpers.ffmpeg_runner import run_ffmpeg
+from helpers.probe import get_duration, get_streams, probe_many
+from helpers.segment_encoder import encode_segmented
+
+# Action for every input of a concat
+ACTION_COPY = "copy"  # Already matches the reference, used as-is
+ACTION_REMUX = "remux"  # Timebase or bitstream format differs, cheap rewrite
+ACTION_ENCODE = "encode"  # Codec parameters differ, needs a re-encode
+
+VIDEO_ENCODERS = {
+    "h264": "libx264",
+    "hevc": "libx265",
+    "mpeg4": "mpeg4",
+    "vp8": "libvpx",
+    "vp9": "libvpx-vp9",
+}
+AUDIO_ENCODERS = {
+    "aac": "aac",
+    "ac3": "ac3",
+    "eac3": "eac3",
+    "mp3": "libmp3lame",
+    "opus": "libopus",
+    "vorbis": "libvorbis",
+    "flac": "flac",
+}
+H264_PROFILES = {
+    "Constrained Baseline": "baseline",
+    "Baseline": "baseline",
+    "Main": "main",
+    "High": "high",
+    "High 10": "high10",
+    "High 4:2:2": "high422",
+    "High 4:4:4 Predictive": "high444",
+}
+# Containers that carry H.264/HEVC as Annex B instead of length prefixed
+ANNEXB_CONTAINERS = ("ts", "m2ts", "mts", "mpg")
+CONFORM_PRESET = "veryfast"
+CONFORM_CRF = "20"
+DISK_HEADROOM = 1.1  # Muxing overhead and temporary files on top of the estimate
+
+
+class ConcatInput(object):
+    """
+    Concat relevant parameters of one probed input. `size` is the final
+    size of a file that is still downloading, otherwise the size on disk.
+    """
+
+    def __init__(self, path: str, data: dict, size: int = None):
+        self.path = path
+        # Telegram downloads grow under "<name>.temp" until they finish
+        name = path[: -len(".temp")] if path.endswith(".temp") else path
+        self.ext = os.path.splitext(name)[1].lstrip(".").lower() or "mkv"
+        if size is None:
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+        self.size = size
+        self.duration = get_duration(data)
+        videos = get_streams(data, "video")
+        # Cover art is reported as a video stream, skip it
+        videos = [v for v in videos if not v.get("disposition", {}).get("attached_pic")]
+        self.video = videos[0] if videos else None
+        self.audios = get_streams(data, "audio")
+        self.time_base = self.video.get("time_base") if self.video else None
+
+    @property
+    def signature(self):
+        """Everything that has to be identical for a safe `-c copy` concat"""
+        video = None
+        if self.video is not None:
+            video = (
+                self.video.get("codec_name"),
+                self.video.get("profile"),
+                self.video.get("width"),
+                self.video.get("height"),
+                self.video.get("pix_fmt"),
+                self.video.get("r_frame_rate"),
+            )
+        audio = tuple(
+            (
+                a.get("codec_name"),
+                a.get("sample_rate"),
+                a.get("channels"),
+            )
+            for a in self.audios
+        )
+        return (video, audio)
+
+
+class ConcatPlan(object):
+    """Per input decision between stream copy, remux and re-encode"""
+
+    def __init__(self, inputs: list, unreadable: list = None):
+        self.inputs = inputs
+        self.unreadable = unreadable or []  # Paths ffprobe could not read
+        self.reference = None
+        self.time_base = None
+        self.actions = [ACTION_COPY] * len(inputs)
+        if len(inputs) < 2:
+            return
+        # Majority wins, ties go to the earliest input
+        counts = Counter(i.signature for i in inputs)
+        best = max(counts.values())
+        self.reference = next(i for i in inputs if counts[i.signature] == best)
+        tb_counts = Counter(
+            i.time_base for i in inputs if i.signature == self.reference.signature
+        )
+        ref_tb = tb_counts.most_common(1)[0][0]
+        for n, i in enumerate(inputs):
+            if i.signature != self.reference.signature:
+                self.actions[n] = ACTION_ENCODE
+            elif i.time_base != ref_tb or self._bitstream_differs(i):
+                self.actions[n] = ACTION_REMUX
+        self.time_base = ref_tb
+
+    def _bitstream_differs(self, i: ConcatInput) -> bool:
+        ref_annexb = self.reference.ext in ANNEXB_CONTAINERS
+        return (i.ext in ANNEXB_CONTAINERS) != ref_annexb
+
+    @property
+    def needs_work(self) -> bool:
+        return any(a != ACTION_COPY for a in self.actions)
+
+    @property
+    def can_encode(self) -> bool:
+        """False when the reference uses a codec we have no encoder for"""
+        ref = self.reference
+        if ref is None:
+            return False
+        if ref.video is not None and ref.video.get("codec_name") not in VIDEO_ENCODERS:
+            return False
+        return all(a.get("codec_name") in AUDIO_ENCODERS for a in ref.audios)
+
+    def describe(self) -> str:
+        return ", ".join(
+            f"{os.path.basename(i.path)}={a}" for i, a in zip(self.inputs, self.actions)
+        )
+
+    @property
+    def duration(self) -> float:
+        return sum(i.duration for i in self.inputs)
+
+    @property
+    def required_space(self) -> int:
+        """
+        Bytes of free disk the merge needs: the concatenated output plus a
+        rewritten copy of every input that is not used as-is.
+        """
+        total = sum(i.size for i in self.inputs)
+        total += sum(
+            i.size for i, a in zip(self.inputs, self.actions) if a != ACTION_COPY
+        )
+        return int(total * DISK_HEADROOM)
+
+    def report(self) -> str:
+        """Human readable compatibility summary of all inputs"""
+        counts = Counter(self.actions)
+        lines = [
+            f"Inputs: {len(self.inputs)}, {int(self.duration)}s total",
+            f"Copy: {counts[ACTION_COPY]}, remux: {counts[ACTION_REMUX]}, "
+            f"re-encode: {counts[ACTION_ENCODE]}",
+        ]
+        if self.unreadable:
+            names = ", ".join(os.path.basename(p) for p in self.unreadable)
+            lines.append(f"Unreadable: {names}")
+        return "\n".join(lines)
+
+
+async def plan_concat(paths: list, partial: bool = False, sizes: list = None) -> ConcatPlan:
+    """
+    Probe every input concurrently and decide per input whether it can be
+    concatenated with stream copy.
+
+    - `paths`: Input files in concat order.
+    - `partial`: Judge from container headers only, for inputs that are
+      still downloading (see `probe_many`).
+    - `sizes`: Final size of every input, needed with `partial` as the
+      files on disk are still growing.
+
+    returns: ConcatPlan, inputs that could not be probed are listed in
+    `unreadable` instead of `inputs`
+    """
+    datas = await probe_many(paths, partial=partial)
+    sizes = sizes or [None] * len(paths)
+    inputs = [ConcatInput(p, d, s) for p, d, s in zip(paths, datas, sizes) if d is not None]
+    unreadable = [p for p, d in zip(paths, datas) if d is None]
+    return ConcatPlan(inputs, unreadable)
+
+
+def _timescale_args(plan: ConcatPlan) -> list:
+    ref = plan.reference
+    if ref.ext not in ("mp4", "m4v", "mov") or not plan.time_base:
+        return []
+    try:
+        return ["-video_track_timescale", plan.time_base.split("/")[1]]
+    except IndexError:
+        return []
+
+
+def _remux_command(plan: ConcatPlan, src: ConcatInput, out: str) -> list:
+    cmd = ["ffmpeg", "-hide_banner", "-y", "-i", src.path, "-map", "0", "-c", "copy"]
+    cmd += _timescale_args(plan)
+    cmd.append(out)
+    return cmd
+
+
+def _encode_args(plan: ConcatPlan, src: ConcatInput):
+    """
+    Build encoder options that turn `src` into a copy of the reference
+    layout, split the way `encode_segmented` expects them.
+
+    returns: (video_args, audio_inputs, audio_args)
+    """
+    ref = plan.reference
+    video_args, audio_inputs, audio_args = [], [], []
+    missing_audio = max(0, len(ref.audios) - len(src.audios))
+    if missing_audio:
+        first = ref.audios[0]
+        layout = first.get("channel_layout") or "stereo"
+        audio_inputs = [
+            "-f",
+            "lavfi",
+            "-i",
+            f"anullsrc=r={first.get('sample_rate', '48000')}:cl={layout}",
+        ]
+    if ref.video is not None:
+        v = ref.video
+        video_args += ["-c:v", VIDEO_ENCODERS[v["codec_name"]]]
+        if v["codec_name"] in ("h264", "hevc"):
+            video_args += ["-preset", CONFORM_PRESET, "-crf", CONFORM_CRF]
+        if v["codec_name"] == "h264" and v.get("profile") in H264_PROFILES:
+            video_args += ["-profile:v", H264_PROFILES[v["profile"]]]
+        w, h = v.get("width"), v.get("height")
+        vf = [
+            f"scale={w}:{h}:force_original_aspect_ratio=decrease",
+            f"pad={w}:{h}:(ow-iw)/2:(oh-ih)/2",
+            "setsar=1",
+        ]
+        video_args += ["-vf", ",".join(vf)]
+        if v.get("pix_fmt"):
+            video_args += ["-pix_fmt", v["pix_fmt"]]
+        if v.get("r_frame_rate") and v["r_frame_rate"] != "0/0":
+            video_args += ["-r", v["r_frame_rate"]]
+    for n, a in enumerate(ref.audios):
+        if n < len(src.audios):
+            audio_args += ["-map", f"0:a:{n}"]
+        else:
+            audio_args += ["-map", "1:a:0"]
+        audio_args += [
+            f"-c:a:{n}",
+            AUDIO_ENCODERS[a["codec_name"]],
+            f"-ar:a:{n}",
+            str(a.get("sample_rate")),
+            f"-ac:a:{n}",
+            str(a.get("channels")),
+        ]
+    return video_args, audio_inputs, audio_args
+
+
+async def conform_inputs(plan: ConcatPlan, work_dir: str, message=None) -> list:
+    """
+    Rewrite only the non-conforming inputs so all of them match the
+    reference of the plan.
+
+    - `plan`: Result of `plan_concat`.
+    - `work_dir`: Where to place the rewritten inputs.
+    - `message`: Optional editable message for status.
+
+    returns: List of paths ready for stream-copy concat, None on failure
+    """
+    if not plan.needs_work:
+        return [i.path for i in plan.inputs]
+    if ACTION_ENCODE in plan.actions and not plan.can_encode:
+        LOGGER.warning(f"No encoder for reference of {plan.describe()}, trying copy concat")
+        return [i.path for i in plan.inputs]
+    LOGGER.info(f"Concat plan: {plan.describe()}")
+    total = sum(1 for a in plan.actions if a != ACTION_COPY)
+    done = 0
+    paths = []
+    for n, (src, action) in enumerate(zip(plan.inputs, plan.actions)):
+        if action == ACTION_COPY:
+            paths.append(src.path)
+            continue
+        done += 1
+        out = os.path.join(work_dir, f"conform_{n}.{plan.reference.ext}")
+        if message is not None:
+            try:
+                await message.edit(
+                    f"🛠 Fixing incompatible input {done}/{total} ({action}) ...\n\n"
+                    f"`{os.path.basename(src.path)}`"
+                )
+            except Exception:
+                pass
+        if action == ACTION_REMUX:
+            returncode, _ = await run_ffmpeg(_remux_command(plan, src, out))
+            ok = returncode == 0 and os.path.exists(out)
+        else:
+            video_args, audio_inputs, audio_args = _encode_args(plan, src)
+            ok = await encode_segmented(
+                src.path,
+                out,
+                video_args,
+                audio_inputs=audio_inputs,
+                audio_args=audio_args,
+                extra_args=_timescale_args(plan),
+                subtitles=plan.reference.ext in ("mkv", "mka", "webm"),
+                message=message,
+            )
+        if not ok:
+            LOGGER.error(f"Failed to conform {src.path}")
+            return None
+        paths.append(out)
+    return paths
+
+
+async def input_offsets(paths: list) -> list:
+    """Start of every input in the concatenated timeline, in seconds"""
+    datas = await probe_many(paths)
+    offsets, position = [], 0.0
+    for data in datas:
+        offsets.append(position)
+        position += get_duration(data or {})
+    return offsets
@@ -0,0 +1,114 @@
+# container_picker.py - Chooses between streamable MP4 and MKV for merged output
+from __init__ import LOGGER
+from helpers.probe import get_duration, get_streams
+
+# Codecs the MP4 muxer takes without re-encoding. FLAC and Opus are left
+# out, older FFmpeg (Debian's 5.1) wants `-strict experimental` for them
+MP4_VIDEO_CODECS = ("h264", "hevc", "av1", "vp9", "mpeg4", "mpeg2video")
+MP4_AUDIO_CODECS = ("aac", "mp3", "ac3", "eac3", "alac")
+# Plain text subtitles survive the conversion to mov_text, ASS styling does not
+MP4_SUBTITLE_CODECS = ("subrip", "mov_text", "text")
+MP4_SUBTITLE_FILES = ("srt",)
+
+# moov index cost per packet, sample size + timing + chunk offset tables
+MOOV_BYTES_PER_VIDEO_FRAME = 24
+MOOV_BYTES_PER_AUDIO_FRAME = 12
+MOOV_BASE_SIZE = 64 * 1024
+MOOV_MARGIN = 1.25
+AUDIO_FRAME_SAMPLES = 1024  # Smallest common frame, over-estimates others
+
+
+def _rate(value) -> float:
+    try:
+        num, den = str(value).split("/")
+        return float(num) / float(den) if float(den) else 0.0
+    except ValueError:
+        return 0.0
+
+
+def pick_container(datas: list, subtitle_file: str = None) -> str:
+    """
+    Picks the output container for a stream-copy merge.
+
+    MP4 when every stream of every input fits it, so Telegram can stream
+    the result progressively, MKV otherwise (ASS or bitmap subtitles,
+    attachments, DTS/TrueHD/PCM audio, ...).
+
+    Parameters:
+    - `datas`: Probe dict of every input, None for one that could not be
+      probed (MKV then, it takes whatever the input holds).
+    - `subtitle_file`: Extra subtitle file muxed with the merge, if any.
+
+    returns: `mp4` or `mkv`
+    """
+    if subtitle_file is not None:
+        if subtitle_file.rsplit(".", 1)[-1].lower() not in MP4_SUBTITLE_FILES:
+            return "mkv"
+    allowed = {
+        "video": MP4_VIDEO_CODECS,
+        "audio": MP4_AUDIO_CODECS,
+        "subtitle": MP4_SUBTITLE_CODECS,
+    }
+    for data in datas:
+        if data is None:
+            return "mkv"
+        for stream in data.get("streams", []):
+            kind = stream.get("codec_type")
+            if stream.get("disposition", {}).get("attached_pic"):
+                return "mkv"
+            if stream.get("codec_name") not in allowed.get(kind, ()):
+                LOGGER.info(f"{kind} stream {stream.get('codec_name')} needs MKV")
+                return "mkv"
+    return "mp4"
+
+
+def estimate_moov_size(datas: list) -> int:
+    """Upper estimate of the moov box of all inputs concatenated, in bytes"""
+    size = 0.0
+    for data in filter(None, datas):
+        duration = get_duration(data)
+        for video in get_streams(data, "video"):
+            fps = _rate(video.get("avg_frame_rate")) or _rate(video.get("r_frame_rate"))
+            size += duration * (fps or 60) * MOOV_BYTES_PER_VIDEO_FRAME
+        for audio in get_streams(data, "audio"):
+            rate = int(audio.get("sample_rate") or 48000)
+            size += duration * rate / AUDIO_FRAME_SAMPLES * MOOV_BYTES_PER_AUDIO_FRAME
+    return int(size * MOOV_MARGIN) + MOOV_BASE_SIZE
+
+
+def mp4_args(datas: list, faststart: bool = False) -> list:
+    """
+    Muxer options that put the moov box in front of the media data.
+
+    By default space for the moov is reserved at the start of the file, so
+    the merge writes it in place without a second pass over the output.
+    `faststart` moves it after muxing instead, the fallback when the
+    reservation turned out too small.
+    """
+    args = ["-c:s", "mov_text"]
+    if any(
+        v.get("codec_name") == "hevc"
+        for d in filter(None, datas)
+        for v in get_streams(d, "video")
+    ):
+        # hev1 plays on fewer clients, Apple and Telegram want hvc1
+        args += ["-tag:v", "hvc1"]
+    if faststart:
+        return args + ["-movflags", "+faststart"]
+    return args + ["-moov_size", str(estimate_moov_size(datas))]
+
+
+# Single-codec containers that also carry chapter markers
+AUDIO_CONTAINERS = {
+    "aac": "m4a",
+    "alac": "m4a",
+    "mp3": "mp3",
+    "flac": "flac",
+    "opus": "ogg",
+    "vorbis": "ogg",
+}
+
+
+def pick_audio_container(codec: str) -> str:
+    """Extension for a joined audio file of `codec`, Matroska audio for the rest"""
+    return AUDIO_CONTAINERS.get(codec, "mka")
@@ -9,57 +9,258 @@ from config import Config
 from pyrogram.types import Message
 from __init__ import LOGGER
 from helpers.utils import get_path_size
+from helpers.audio_aligner import offset_args, track_offset
+from helpers.concat_planner import conform_inputs, input_offsets, plan_concat
+from helpers.container_picker import mp4_args, pick_audio_container, pick_container
+from helpers.subtitle_merger import TEXT_SUBTITLE_FORMATS, merge_subtitles
+from helpers.subtitle_sync import sync_subtitle
+from helpers.ffmpeg_runner import run_ffmpeg
+from helpers.mp4_joiner import MP4_EXTENSIONS, join_mp4_async
+from helpers.probe import (
+    cached_keyframe_index,
+    get_duration,
+    get_streams,
+    probe_async,
+    probe_many,
+)
+from helpers.thumbnail_picker import pick_thumbnail_time
+from helpers.trimmer import trim_video
 
 
-async def MergeVideo(input_file: str, user_id: int, message: Message, format_: str):
+def read_concat_list(input_file: str) -> list:
+    """Returns the paths listed in an FFmpeg concat demuxer file."""
+    paths = []
+    with open(input_file) as _list:
+        for line in _list:
+            line = line.strip()
+            if line.startswith("file "):
+                entry = line[5:].strip()
+                if entry.startswith("'") and entry.endswith("'"):
+                    entry = entry[1:-1].replace("'\\''", "'")
+                paths.append(entry)
+    return paths
+
+
+def write_concat_list(input_file: str, paths: list):
+    """
+    Absolute paths, the concat demuxer resolves relative ones against the
+    list's directory. A quote inside a name is closed, escaped and reopened.
+    """
+    with open(input_file, "w") as _list:
+        _list.write(
+            "\n".join(
+                "file '" + os.path.abspath(p).replace("'", "'\\''") + "'" for p in paths
+            )
+        )
+
+
+def _ffmetadata_escape(text: str) -> str:
+    for char in ("\\", "=", ";", "#", "\n"):
+        text = text.replace(char, "\\" + char)
+    return text
+
+
+def write_chapters(path: str, titles: list, offsets: list, duration: float):
+    """Writes an FFmetadata file with one chapter per joined input"""
+    ends = offsets[1:] + [duration]
+    with open(path, "w", encoding="utf-8") as _list:
+        _list.write(";FFMETADATA1\n")
+        for title, start, end in zip(titles, offsets, ends):
+            _list.write(
+                "[CHAPTER]\nTIMEBASE=1/1000\n"
+                f"START={int(start * 1000)}\nEND={int(end * 1000)}\n"
+                f"title={_ffmetadata_escape(title)}\n"
+            )
+
+
+async def MergeVideo(
+    input_file: str,
+    user_id: int,
+    message: Message,
+    format_: str = None,
+    subtitles: list = None,
+):
     """
     This is for Merging Videos Together!
     :param `input_file`: input.txt file's location.
     :param `user_id`: Pass user_id as integer.
     :param `message`: Pass Editable Message for Showing FFmpeg Progress.
-    :param `format_`: Pass File Extension.
+    :param `format_`: Pass File Extension, None picks streamable MP4 when all
+        streams allow it and MKV otherwise, or when the MP4 muxer fails.
+    :param `subtitles`: Optional subtitle path (or None) per input, added as one
+        track shifted to the position of its input in the merged video.
     :return: This will return Merged Video File Path
     """
+    # Stream copy concat breaks on mismatching inputs, fix only those first
+    inputs = read_concat_list(input_file)
+    plan = await plan_concat(inputs)
+    if plan.unreadable:
+        await message.edit(f"❌ Unable to read inputs!\n\n{plan.report()}")
+        return None
+    if plan.needs_work:
+        inputs = await conform_inputs(plan, f"downloads/{str(user_id)}", message)
+        if inputs is None:
+            await message.edit("❌ Unable to make inputs compatible for merging!")
+            return None
+        write_concat_list(input_file, inputs)
+    merged_sub = None
+    if subtitles and any(subtitles):
+        exts = {
+            os.path.splitext(sub)[1].lstrip(".").lower() for sub in subtitles if sub
+        }
+        if exts.issubset(TEXT_SUBTITLE_FORMATS):
+            if Config.SUBTITLE_AUTO_SYNC:
+                await message.edit("📝 Syncing subtitles to the audio ...")
+                for path, sub in zip(inputs, subtitles):
+                    if sub is not None:
+                        await sync_subtitle(path, sub)
+            merged_sub = merge_subtitles(
+                subtitles,
+                await input_offsets(inputs),
+                f"downloads/{str(user_id)}/merged_subs",
+            )
+        else:
+            # Bitmap or container subtitles, fall back to muxing every input on its own
+            for n, (path, sub) in enumerate(zip(inputs, subtitles)):
+                if sub is not None:
+                    await message.edit(f"📝 Adding subtitles {n + 1}/{len(inputs)} ...")
+                    await MergeSub(path, sub, user_id)
+    datas = await probe_many(inputs)
+    picked = format_ is None
+    if picked:
+        format_ = pick_container(datas, merged_sub)
     output_vid = f"downloads/{str(user_id)}/[@yashoswalyo].{format_.lower()}"
+    is_mp4 = format_.lower() in ("mp4", "m4v", "mov")
+    if is_mp4 and merged_sub is None and all(
+        os.path.splitext(path)[1].lstrip(".").lower() in MP4_EXTENSIONS for path in inputs
+    ):
+        # Identical MP4 inputs only need their sample tables joined, no remux
+        await message.edit("Merging Video Now ...\n\nPlease Keep Patience ...")
+        if await join_mp4_async(inputs, output_vid) is not None:
+            return output_vid
     file_generator_command = [
         "ffmpeg",
+        "-hide_banner",
+        "-y",
         "-f",
         "concat",
         "-safe",
         "0",
         "-i",
         input_file,
-        "-map",
-        "0",
-        "-c",
-        "copy",
-        output_vid,
     ]
-    process = None
+    if merged_sub is not None:
+        file_generator_command += ["-i", merged_sub]
+    file_generator_command += ["-map", "0"]
+    if merged_sub is not None:
+        existing_subs = len(get_streams(datas[0] or {}, "subtitle"))
+        file_generator_command += [
+            "-map",
+            "1:0",
+            f"-metadata:s:s:{existing_subs}",
+            f"title=Track {existing_subs + 1} - tg@yashoswalyo",
+        ]
+    file_generator_command += ["-c", "copy"]
+    await message.edit("Merging Video Now ...\n\nPlease Keep Patience ...")
     try:
-        process = await asyncio.create_subprocess_exec(
-            *file_generator_command,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
+        returncode, _ = await run_ffmpeg(
+            file_generator_command
+            + (mp4_args(datas) if is_mp4 else [])
+            + [output_vid]
         )
+        if returncode != 0 and is_mp4:
+            # Reserved moov space was too small, let the muxer move it instead
+            LOGGER.warning("moov reservation failed, retrying with faststart")
+            returncode, _ = await run_ffmpeg(
+                file_generator_command + mp4_args(datas, faststart=True) + [output_vid]
+            )
+        if returncode != 0 and is_mp4 and picked:
+            # A stream the MP4 muxer still refuses, MKV takes everything
+            LOGGER.warning("MP4 muxing failed, falling back to MKV")
+            if os.path.lexists(output_vid):
+                os.remove(output_vid)
+            output_vid = f"downloads/{str(user_id)}/[@yashoswalyo].mkv"
+            returncode, _ = await run_ffmpeg(file_generator_command + [output_vid])
     except NotImplementedError:
         await message.edit(
             text="Unable to Execute FFmpeg Command! Got `NotImplementedError` ...\n\nPlease run bot in a Linux/Unix Environment."
         )
         await asyncio.sleep(10)
         return None
-    await message.edit("Merging Video Now ...\n\nPlease Keep Patience ...")
-    stdout, stderr = await process.communicate()
-    e_response = stderr.decode().strip()
-    t_response = stdout.decode().strip()
-    LOGGER.info(e_response)
-    LOGGER.info(t_response)
-    if os.path.lexists(output_vid):
+    if returncode == 0 and os.path.lexists(output_vid):
         return output_vid
     else:
         return None
 
 
+async def MergeAudios(input_file: str, user_id: int, message: Message):
+    """
+    This is for Joining Audio files (chapters, podcast parts) Together.
+
+    Uses the same concat plan as `MergeVideo`: matching parts are stream
+    copied, only mismatching ones are transcoded once to the majority
+    format. A chapter marker is written at every boundary.
+
+    Parameters:
+    - `input_file`: input.txt file's location.
+    - `user_id`: To get parent directory.
+    - `message`: Editable Message for showing progress.
+
+    returns: Joined Audio File Path, None on failure
+    """
+    inputs = read_concat_list(input_file)
+    titles = [os.path.splitext(os.path.basename(p))[0] for p in inputs]
+    plan = await plan_concat(inputs)
+    if plan.unreadable or not plan.inputs:
+        await message.edit(f"❌ Unable to read inputs!\n\n{plan.report()}")
+        return None
+    if plan.needs_work:
+        inputs = await conform_inputs(plan, f"downloads/{str(user_id)}", message)
+        if inputs is None:
+            await message.edit("❌ Unable to make audio files compatible for joining!")
+            return None
+        write_concat_list(input_file, inputs)
+    reference = plan.reference or plan.inputs[0]
+    if not reference.audios:
+        await message.edit("❌ No audio stream found!")
+        return None
+    offsets = await input_offsets(inputs)
+    datas = await probe_many(inputs)
+    duration = offsets[-1] + get_duration(datas[-1] or {})
+    chapters = f"downloads/{str(user_id)}/chapters.txt"
+    write_chapters(chapters, titles, offsets, duration)
+    ext = pick_audio_container(reference.audios[0].get("codec_name"))
+    output = f"downloads/{str(user_id)}/[@yashoswalyo]_joined.{ext}"
+    cmd = [
+        "ffmpeg",
+        "-hide_banner",
+        "-y",
+        "-f",
+        "concat",
+        "-safe",
+        "0",
+        "-i",
+        input_file,
+        "-i",
+        chapters,
+        "-map",
+        "0:a",
+        "-map_metadata",
+        "1",
+        "-map_chapters",
+        "1",
+        "-c",
+        "copy",
+    ]
+    if ext == "m4a":
+        cmd += ["-movflags", "+faststart"]
+    await message.edit("Joining Audio Now ...")
+    returncode, _ = await run_ffmpeg(cmd + [output])
+    if returncode == 0 and os.path.exists(output):
+        return output
+    return None
+
+
 async def MergeSub(filePath: str, subPath: str, user_id):
     """
     This is for Merging Video + Subtitle Together.
@@ -161,15 +362,34 @@ def MergeSubNew(filePath: str, subPath: str, user_id, file_list):
     return f"downloads/{str(user_id)}/[@yashoswalyo]_softmuxed_video.mkv"
 
 
-def MergeAudio(videoPath: str, files_list: list, user_id):
+async def MergeAudio(videoPath: str, files_list: list, user_id):
+    """
+    This is for Muxing Video + Audio track(s) Together.
+
+    With `AUDIO_AUTO_ALIGN` every added track is first lined up with the
+    video's own audio, the offsets are applied as input options of the mux.
+
+    Parameters:
+    - `videoPath`: Path to Video file.
+    - `files_list`: Video file followed by the audio files.
+    - `user_id`: To get parent directory.
+
+    returns: Muxed Video File Path
+    """
     LOGGER.info("Generating Mux Command")
     muxcmd = []
     muxcmd.append("ffmpeg")
     muxcmd.append("-hide_banner")
-    videoData = ffmpeg.probe(filename=videoPath)
+    videoData = await probe_async(videoPath)
     videoStreamsData = videoData.get("streams")
     audioTracks = 0
-    for i in files_list:
+    offsets = [0.0] * len(files_list)
+    if Config.AUDIO_AUTO_ALIGN:
+        offsets[1:] = await asyncio.gather(
+            *[track_offset(videoPath, i) for i in files_list[1:]]
+        )
+    for i, offset in zip(files_list, offsets):
+        muxcmd += offset_args(offset)
         muxcmd.append("-i")
         muxcmd.append(i)
     muxcmd.append("-map")
@@ -202,50 +422,61 @@ def MergeAudio(videoPath: str, files_list: list, user_id):
     muxcmd.append(f"downloads/{str(user_id)}/[@yashoswalyo]_export.mkv")
 
     LOGGER.info(muxcmd)
-    process = subprocess.call(muxcmd)
+    process, _ = await run_ffmpeg(muxcmd)
     LOGGER.info(process)
     return f"downloads/{str(user_id)}/[@yashoswalyo]_export.mkv"
 
 
-async def cult_small_video(video_file, output_directory, start_time, end_time, format_):
-    # https://stackoverflow.com/a/13891070/4723940
+async def cult_small_video(
+    video_file, output_directory, start_time, end_time, format_, exact=False
+):
+    """
+    Cuts `start_time`..`end_time` out of a video with stream copy, see
+    `helpers.trimmer.trim_video`. `end_time` None keeps the rest of the file.
+
+    returns: (path of the trimmed file, time it starts at in the source),
+    (None, None) on failure
+    """
     out_put_file_name = (
         output_directory + str(round(time.time())) + "." + format_.lower()
     )
-    file_generator_command = [
-        "ffmpeg",
-        "-ss",
-        str(start_time),
-        "-to",
-        str(end_time),
-        "-i",
-        video_file,
-        "-async",
-        "1",
-        "-strict",
-        "-2",
-        out_put_file_name,
-    ]
-    process = await asyncio.create_subprocess_exec(
-        *file_generator_command,
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE,
+    cut = await trim_video(
+        video_file, out_put_file_name, float(start_time), end_time, exact=exact
     )
-    stdout, stderr = await process.communicate()
-    e_response = stderr.decode().strip()
-    t_response = stdout.decode().strip()
-    LOGGER.info(e_response)
-    LOGGER.info(t_response)
-    if os.path.lexists(out_put_file_name):
-        return out_put_file_name
-    else:
-        return None
+    if cut is not None:
+        return out_put_file_name, cut
+    return None, None
+
+
+# Telegram rejects thumbnails larger than 320px on either side
+THUMB_MAX_SIZE = 320
+THUMB_SCALE = (
+    f"scale={THUMB_MAX_SIZE}:{THUMB_MAX_SIZE}:force_original_aspect_ratio=decrease"
+)
+VIDEO_FILE_EXTENSIONS = (
+    "MKV",
+    "MP4",
+    "WEBM",
+    "AVI",
+    "MOV",
+    "OGG",
+    "WMV",
+    "M4V",
+    "TS",
+    "MPG",
+    "MTS",
+    "M2TS",
+    "3GP",
+)
 
 
 async def take_screen_shot(video_file, output_directory, ttl):
     """
     This functions generates custom_thumbnail / Screenshot.
 
+    The frame is taken with input seeking and scaled by FFmpeg to fit the
+    Telegram thumbnail bound, so the JPEG can be uploaded as is.
+
     Parameters:
 
     - `video_file`: Path to video file.
@@ -254,174 +485,156 @@ async def take_screen_shot(video_file, output_directory, ttl):
 
     returns: This will return path of screenshot
     """
-    # https://stackoverflow.com/a/13891070/4723940
     out_put_file_name = os.path.join(output_directory, str(time.time()) + ".jpg")
-    if video_file.upper().endswith(
-        (
-            "MKV",
-            "MP4",
-            "WEBM",
-            "AVI",
-            "MOV",
-            "OGG",
-            "WMV",
-            "M4V",
-            "TS",
-            "MPG",
-            "MTS",
-            "M2TS",
-            "3GP",
-        )
-    ):
+    if video_file.upper().endswith(VIDEO_FILE_EXTENSIONS):
         file_genertor_command = [
             "ffmpeg",
+            "-hide_banner",
             "-ss",
             str(ttl),
             "-i",
             video_file,
-            "-vframes",
+            "-frames:v",
             "1",
+            "-vf",
+            THUMB_SCALE,
+            "-q:v",
+            "3",
             out_put_file_name,
         ]
-        # width = "90"
-        process = await asyncio.create_subprocess_exec(
-            *file_genertor_command,
-            # stdout must a pipe to be accessible as process.stdout
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
-        )
-        # Wait for the subprocess to finish
-        stdout, stderr = await process.communicate()
-        e_response = stderr.decode().strip()
-        t_response = stdout.decode().strip()
-    #
+        await run_ffmpeg(file_genertor_command)
     if os.path.exists(out_put_file_name):
         return out_put_file_name
     else:
         return None
 
 
-async def extractAudios(path_to_file, user_id):
+async def scale_thumbnail(image_file, output_directory):
+    """Fits a user supplied thumbnail into the Telegram bound as JPEG."""
+    out_put_file_name = os.path.join(output_directory, str(time.time()) + ".jpg")
+    cmd = [
+        "ffmpeg",
+        "-hide_banner",
+        "-i",
+        image_file,
+        "-frames:v",
+        "1",
+        "-vf",
+        THUMB_SCALE,
+        "-q:v",
+        "3",
+        out_put_file_name,
+    ]
+    await run_ffmpeg(cmd)
+    if os.path.exists(out_put_file_name):
+        return out_put_file_name
+    return None
+
+
+async def get_video_thumbnail(video_file, output_directory, duration, custom_thumb=None):
     """
-    docs
+    Produces the upload thumbnail and the source video dimensions.
+
+    Parameters:
+    - `video_file`: Path to video file.
+    - `output_directory`: Path where to save thumbnail.
+    - `duration`: Video duration in seconds, used to spread the sampled frames.
+    - `custom_thumb`: Optional user thumbnail to use instead of a frame.
+
+    returns: (thumbnail path or None, width, height)
     """
-    dir_name = os.path.dirname(os.path.dirname(path_to_file))
-    if not os.path.exists(path_to_file):
-        return None
-    if not os.path.exists(dir_name + "/extract"):
-        os.makedirs(dir_name + "/extract")
-    videoStreamsData = ffmpeg.probe(path_to_file)
-    # with open("data.json",'w') as f:
-    #     f.write(json.dumps(videoStreamsData))
-    extract_dir = dir_name + "/extract"
-    audios = []
-    for stream in videoStreamsData.get("streams"):
-        try:
-            if stream["codec_type"] == "audio":
-                audios.append(stream)
-        except Exception as e:
-            LOGGER.warning(e)
-    for audio in audios:
-        extractcmd = []
-        extractcmd.append("ffmpeg")
-        extractcmd.append("-hide_banner")
-        extractcmd.append("-i")
-        extractcmd.append(path_to_file)
-        extractcmd.append("-map")
-        try:
-            index = audio["index"]
-            extractcmd.append(f"0:{index}")
-            try:
-                output_file: str = (
-                    "("
-                    + audio["tags"]["language"]
-                    + ") "
-                    + audio["tags"]["title"]
-                    + "."
-                    + audio["codec_type"]
-                    + ".mka"
-                )
-                output_file = output_file.replace(" ", ".")
-            except:
-                output_file = str(audio["index"]) + "." + audio["codec_type"] + ".mka"
-            extractcmd.append("-c")
-            extractcmd.append("copy")
-            extractcmd.append(f"{extract_dir}/{output_file}")
-            LOGGER.info(extractcmd)
-            subprocess.call(extractcmd)
-        except Exception as e:
-            LOGGER.error(f"Something went wrong: {e}")
-    if get_path_size(extract_dir) > 0:
-        return extract_dir
-    else:
-        LOGGER.warning(f"{extract_dir} is empty")
-        return None
+    width, height = 1280, 720
+    try:
+        data = await probe_async(video_file)
+        video = next(
+            s for s in data.get("streams", []) if s.get("codec_type") == "video"
+        )
+        width, height = int(video["width"]), int(video["height"])
+    except Exception as e:
+        LOGGER.warning(f"Unable to read dimensions of {video_file}: {e}")
+    thumb = None
+    if custom_thumb is not None:
+        thumb = await scale_thumbnail(custom_thumb, output_directory)
+    if thumb is None:
+        ttl = await pick_thumbnail_time(video_file, duration)
+        if ttl is None:
+            ttl = duration / 2
+            # Seeking to a known keyframe decodes a single frame
+            index = cached_keyframe_index(video_file)
+            if index is not None:
+                ttl = index.at_or_before(ttl) or ttl
+        thumb = await take_screen_shot(video_file, output_directory, ttl)
+    return thumb, width, height
 
 
-async def extractSubtitles(path_to_file, user_id):
+def _extract_name(stream: dict) -> str:
+    """Output file name of an extracted stream from its language/title tags."""
+    tags = stream.get("tags", {})
+    codec_type = stream["codec_type"]
+    if "language" in tags and "title" in tags:
+        output_file = f"({tags['language']}) {tags['title']}.{codec_type}.mka"
+        return output_file.replace(" ", ".")
+    if codec_type == "subtitle" and "language" in tags:
+        return f"{stream['index']}.{tags['language']}.{codec_type}.mka"
+    return f"{stream['index']}.{codec_type}.mka"
+
+
+async def extractStreams(path_to_file, user_id, audios=True, subtitles=True):
     """
-    docs
+    Extracts audio and/or subtitle streams with a single FFmpeg run.
+
+    Every stream gets its own `-map 0:N -c copy` output, so the input is
+    demuxed once no matter how many tracks it has.
+
+    Parameters:
+    - `path_to_file`: Path to video file.
+    - `user_id`: To get parent directory.
+    - `audios`: Extract audio streams.
+    - `subtitles`: Extract subtitle streams.
+
+    returns: Directory with extracted streams, None if nothing was extracted
     """
     dir_name = os.path.dirname(os.path.dirname(path_to_file))
     if not os.path.exists(path_to_file):
         return None
-    if not os.path.exists(dir_name + "/extract"):
-        os.makedirs(dir_name + "/extract")
-    videoStreamsData = ffmpeg.probe(path_to_file)
-    # with open("data.json",'w') as f:
-    #     f.write(json.dumps(videoStreamsData))
     extract_dir = dir_name + "/extract"
-    subtitles = []
+    if not os.path.exists(extract_dir):
+        os.makedirs(extract_dir)
+    wanted = []
+    if audios:
+        wanted.append("audio")
+    if subtitles:
+        wanted.append("subtitle")
+    videoStreamsData = await probe_async(path_to_file)
+    extractcmd = ["ffmpeg", "-hide_banner", "-y", "-i", path_to_file]
+    used_names = set()
     for stream in videoStreamsData.get("streams"):
-        try:
-            if stream["codec_type"] == "subtitle":
-                subtitles.append(stream)
-        except Exception as e:
-            LOGGER.warning(e)
-    for subtitle in subtitles:
-        extractcmd = []
-        extractcmd.append("ffmpeg")
-        extractcmd.append("-hide_banner")
-        extractcmd.append("-i")
-        extractcmd.append(path_to_file)
-        extractcmd.append("-map")
-        try:
-            index = subtitle["index"]
-            extractcmd.append(f"0:{index}")
-            try:
-                output_file: str = (
-                    "("
-                    + subtitle["tags"]["language"]
-                    + ") "
-                    + subtitle["tags"]["title"]
-                    + "."
-                    + subtitle["codec_type"]
-                    + ".mka"
-                )
-                output_file = output_file.replace(" ", ".")
-            except:
-                try:
-                    output_file = (
-                        str(subtitle["index"])
-                        + "."
-                        + subtitle["tags"]["language"]
-                        + "."
-                        + subtitle["codec_type"]
-                        + ".mka"
-                    )
-                except:
-                    output_file = (
-                        str(subtitle["index"]) + "." + subtitle["codec_type"] + ".mka"
-                    )
-            extractcmd.append("-c")
-            extractcmd.append("copy")
-            extractcmd.append(f"{extract_dir}/{output_file}")
-            LOGGER.info(extractcmd)
-            subprocess.call(extractcmd)
-        except Exception as e:
-            LOGGER.error(f"Something went wrong: {e}")
+        if stream.get("codec_type") not in wanted:
+            continue
+        output_file = _extract_name(stream)
+        if output_file in used_names:
+            output_file = f"{stream['index']}.{output_file}"
+        used_names.add(output_file)
+        extractcmd += ["-map", f"0:{stream['index']}", "-c", "copy"]
+        extractcmd.append(f"{extract_dir}/{output_file}")
+    if not used_names:
+        LOGGER.warning(f"No {' or '.join(wanted)} streams in {path_to_file}")
+        return None
+    returncode, _ = await run_ffmpeg(extractcmd)
+    if returncode != 0:
+        LOGGER.error(f"Something went wrong extracting from {path_to_file}")
     if get_path_size(extract_dir) > 0:
         return extract_dir
     else:
         LOGGER.warning(f"{extract_dir} is empty")
         return None
+
+
+async def extractAudios(path_to_file, user_id):
+    """Extracts all audio streams, see `extractStreams`."""
+    return await extractStreams(path_to_file, user_id, audios=True, subtitles=False)
+
+
+async def extractSubtitles(path_to_file, user_id):
+    """Extracts all subtitle streams, see `extractStreams`."""
+    return await extractStreams(path_to_file, user_id, audios=False, subtitles=True)
@@ -0,0 +1,449 @@
+# ffmpeg_runner.py - Shared launcher for FFmpeg child processes
+import asyncio
+import os
+import re
+import signal
+from collections import Counter, deque
+
+from config import Config
+from __init__ import LOGGER
+from helpers.watchdog import (
+    Watchdog,
+    ionice_prefix,
+    kill_group,
+    limit_child,
+    read_bytes,
+    wall_limit,
+)
+
+# Caps how many FFmpeg processes the whole bot runs at once
+_ffmpeg_slots = asyncio.Semaphore(Config.MAX_FFMPEG_JOBS)
+
+STDERR_TAIL_LINES = 200  # Lines kept for the failure log
+STDERR_CHUNK = 64 * 1024
+STDOUT_CHUNK = 1024 * 1024  # Raw output handed to stream consumers at once
+MAX_WARNING_KINDS = 50
+_LINE_BREAK = re.compile(rb"[\r\n]+")
+# "[mp4 @ 0x55d...] Non-monotonous DTS ..." -> ("mp4", "Non-monotonous DTS ...")
+_LOG_CONTEXT = re.compile(r"^\[(\w+)[^\]]*@ 0x[0-9a-f]+\]\s*(.*)")
+_DIGITS = re.compile(r"\d+")
+# `-progress` key=value lines, written to stderr next to the normal log
+_PROGRESS_FIELD = re.compile(r"^([a-z][a-z0-9_]*)=(\S*)$")
+# Progress fields that only change while FFmpeg really advances
+_PROGRESS_MARKS = ("out_time_us", "total_size")
+
+# pid -> True for encode jobs, False for stream copy jobs
+_jobs = {}
+# Options that make a job decode/encode even next to `-c copy`
+_FILTER_OPTIONS = ("-vf", "-af", "-filter:v", "-filter:a", "-filter_complex", "-lavfi")
+# Options without a value, every other option is followed by one
+_FLAG_OPTIONS = (
+    "-y",
+    "-n",
+    "-hide_banner",
+    "-nostdin",
+    "-nostats",
+    "-stats",
+    "-an",
+    "-vn",
+    "-sn",
+    "-dn",
+    "-shortest",
+    "-copyts",
+)
+
+
+def available_cpus() -> float:
+    """
+    CPUs this process may really use.
+
+    Honours cgroup v2 (`cpu.max`) and v1 (`cpu.cfs_quota_us`) quotas as set
+    by docker `cpus:` limits, then the affinity mask, then `os.cpu_count()`.
+    """
+    try:
+        cpus = float(len(os.sched_getaffinity(0)))
+    except AttributeError:
+        cpus = float(os.cpu_count() or 1)
+    quota = None
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            limit, period = f.read().split()[:2]
+            if limit != "max":
+                quota = int(limit) / int(period)
+    except (OSError, ValueError):
+        try:
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+                limit = int(f.read())
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+                period = int(f.read())
+            if limit > 0 and period > 0:
+                quota = limit / period
+        except (OSError, ValueError):
+            pass
+    if quota is not None:
+        cpus = min(cpus, quota)
+    return max(cpus, 0.1)
+
+
+def _is_copy_job(cmd: list) -> bool:
+    """True when the command only remuxes, subtitle conversion aside"""
+    if "copy" not in cmd:
+        return False
+    for n, arg in enumerate(cmd[:-1]):
+        if arg in _FILTER_OPTIONS:
+            return False
+        if arg in ("-c", "-codec", "-vcodec", "-acodec") or arg.startswith(("-c:", "-codec:")):
+            if cmd[n + 1] != "copy" and not arg.endswith(":s"):
+                return False
+    return True
+
+
+def _thread_share(encode: bool) -> int:
+    """Threads for a new job, encoders split the CPU quota evenly"""
+    if not encode:
+        return 1
+    encoders = 1 + sum(1 for e in _jobs.values() if e)
+    return max(1, int(available_cpus() / encoders))
+
+
+def _with_threads(cmd: list, threads: int) -> list:
+    """
+    Caps every thread pool of the command: the filter graphs, the decoder
+    of every input and the encoders of every output, commands with several
+    outputs (stream extraction, preview clip and sheet) included.
+    """
+    if "-threads" in cmd:
+        return cmd
+    threads = str(threads)
+    out = [cmd[0], "-filter_threads", threads, "-filter_complex_threads", threads]
+    n = 1
+    while n < len(cmd):
+        arg = cmd[n]
+        if arg == "-i":
+            out += ["-threads", threads] + cmd[n : n + 2]
+            n += 2
+        elif arg in _FLAG_OPTIONS:
+            out.append(arg)
+            n += 1
+        elif arg.startswith("-") and arg != "-":
+            out += cmd[n : n + 2]
+            n += 2
+        else:
+            # Neither an option nor its value, so an output file
+            out += ["-threads", threads, arg]
+            n += 1
+    return out
+
+
+def _pin(pid: int, mask: list):
+    """
+    Applies `mask` to every thread of the process, `sched_setaffinity`
+    alone only moves the thread it is given. Threads started later inherit
+    the mask of the thread that creates them.
+    """
+    try:
+        tids = [int(tid) for tid in os.listdir(f"/proc/{pid}/task")]
+    except (OSError, ValueError):
+        tids = [pid]
+    for tid in tids:
+        try:
+            os.sched_setaffinity(tid, mask)
+        except OSError:
+            # The thread or the whole job already exited, _finish frees its slot
+            continue
+
+
+def _rebalance():
+    """
+    Give every running encode job its own slice of the allowed cores.
+
+    Only with `FFMPEG_CPU_AFFINITY`, re-run whenever a job starts or ends so
+    the remaining encoders take over the freed cores. Copy jobs are left
+    unpinned, they hardly use any CPU.
+    """
+    if not Config.FFMPEG_CPU_AFFINITY:
+        return
+    try:
+        cores = sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        return
+    encoders = [pid for pid, encode in _jobs.items() if encode]
+    if len(cores) < 2 or not encoders:
+        return
+    share = len(cores) // len(encoders)
+    for n, pid in enumerate(encoders):
+        if share == 0:
+            mask = [cores[n % len(cores)]]
+        elif n == len(encoders) - 1:
+            # The last encoder also takes the cores left over by the division
+            mask = cores[n * share :]
+        else:
+            mask = cores[n * share : (n + 1) * share]
+        _pin(pid, mask)
+
+
+def _with_progress(cmd: list) -> list:
+    """Machine readable progress on stderr, it keeps coming for sparse outputs"""
+    if "-progress" in cmd:
+        return cmd
+    return [cmd[0], "-progress", "pipe:2"] + cmd[1:]
+
+
+def _input_bytes(cmd: list) -> int:
+    """Total size of the inputs of a command, concat lists included"""
+    total = 0
+    for n, arg in enumerate(cmd[:-1]):
+        if arg != "-i" or not os.path.isfile(cmd[n + 1]):
+            continue
+        path = cmd[n + 1]
+        if path.endswith(".txt"):
+            with open(path) as _list:
+                for line in _list:
+                    line = line.strip()
+                    if line.startswith("file "):
+                        listed = line[5:].strip().strip("'")
+                        if os.path.isfile(listed):
+                            total += os.path.getsize(listed)
+        else:
+            total += os.path.getsize(path)
+    return total
+
+
+async def _start(cmd: list, stdout):
+    """
+    Launches a supervised FFmpeg job: own process group, lowered CPU and
+    I/O priority, capped memory and a watchdog sized to the input.
+
+    returns: (process, watchdog)
+    """
+    encode = not _is_copy_job(cmd)
+    limit = wall_limit(_input_bytes(cmd), encode)
+    cmd = ionice_prefix() + _with_progress(_with_threads(cmd, _thread_share(encode)))
+    LOGGER.info(cmd)
+    process = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdout=stdout,
+        stderr=asyncio.subprocess.PIPE,
+        preexec_fn=limit_child,
+        start_new_session=True,
+    )
+    _jobs[process.pid] = encode
+    _rebalance()
+    dog = Watchdog(
+        "ffmpeg",
+        process.pid,
+        lambda: process.returncode is None,
+        Config.FFMPEG_STALL_TIMEOUT,
+        limit,
+        # Filters with sparse output still read their input steadily
+        lambda: read_bytes(process.pid),
+    )
+    return process, dog
+
+
+def _finish(process):
+    _jobs.pop(process.pid, None)
+    _rebalance()
+
+
+class FFmpegLog(object):
+    """
+    Bounded view of an FFmpeg stderr stream.
+
+    Keeps the last `STDERR_TAIL_LINES` lines, counts warnings by kind and
+    remembers the last progress and final size lines, so a job that prints
+    millions of timestamp warnings still costs a few KB. The `-progress`
+    key=value lines only feed `on_progress` and are not kept.
+    """
+
+    def __init__(self, keep=None, on_progress=None):
+        self.keep = keep
+        self.on_progress = on_progress  # Called when out_time/size advance
+        self.marks = {}  # Last value of each of `_PROGRESS_MARKS`
+        self.kept = []  # Lines matching `keep`, for callers parsing e.g. showinfo
+        self.tail = deque(maxlen=STDERR_TAIL_LINES)
+        self.warnings = Counter()
+        self.lines = 0
+        self.progress = None
+        self.final = None
+
+    def feed(self, line: str):
+        line = line.strip()
+        if not line:
+            return
+        field = _PROGRESS_FIELD.match(line)
+        if field:
+            key, value = field.groups()
+            if key in _PROGRESS_MARKS and self.marks.get(key) != value:
+                self.marks[key] = value
+                if self.on_progress is not None:
+                    self.on_progress()
+            return
+        self.lines += 1
+        if line.startswith("frame=") or line.startswith("size="):
+            self.progress = line
+            return
+        if "muxing overhead" in line:
+            self.final = line
+            self.tail.append(line)
+            return
+        if self.keep is not None and self.keep.search(line):
+            self.kept.append(line)
+            return
+        self.tail.append(line)
+        match = _LOG_CONTEXT.match(line)
+        if match:
+            kind = f"{match.group(1)}: {_DIGITS.sub('#', match.group(2))[:60]}"
+            if kind in self.warnings or len(self.warnings) < MAX_WARNING_KINDS:
+                self.warnings[kind] += 1
+
+    @property
+    def text(self) -> str:
+        return "\n".join(self.kept + list(self.tail))
+
+    def summary(self) -> str:
+        parts = [f"{self.lines} lines"]
+        if self.warnings:
+            top = ", ".join(f"{k} x{n}" for k, n in self.warnings.most_common(5))
+            parts.append(f"warnings: {top}")
+        if self.progress:
+            parts.append(self.progress)
+        if self.final:
+            parts.append(self.final)
+        return " | ".join(parts)
+
+
+async def _drain(stream, log: FFmpegLog):
+    """Feeds stderr to `log` line by line, progress lines end with \\r"""
+    pending = b""
+    while True:
+        chunk = await stream.read(STDERR_CHUNK)
+        if not chunk:
+            break
+        pending += chunk
+        *lines, pending = _LINE_BREAK.split(pending)
+        for line in lines:
+            log.feed(line.decode(errors="ignore"))
+        pending = pending[-STDERR_CHUNK:]
+    if pending:
+        log.feed(pending.decode(errors="ignore"))
+
+
+def _report(cmd: list, returncode: int, log: FFmpegLog, dog: Watchdog):
+    """
+    Logs how the job ended. A job the watchdog killed always counts as
+    failed and its reason heads the stderr text, so callers handle it like
+    any other FFmpeg error.
+
+    returns: (returncode, stderr text)
+    """
+    text = log.text
+    if dog.reason is not None:
+        returncode = returncode or 1
+        text = f"{dog.reason}\n{text}"
+    if returncode != 0:
+        LOGGER.error(f"{cmd[0]} exited with {returncode}: {log.summary()}\n{text}")
+    else:
+        LOGGER.info(f"{cmd[0]} done: {log.summary()}")
+    return returncode, text
+
+
+async def run_ffmpeg(cmd: list, keep=None):
+    """
+    Run an FFmpeg command inside the global concurrency limit.
+
+    The job gets an explicit `-threads` from its share of the CPU quota,
+    a single thread for stream copy jobs.
+
+    Parameters:
+    - `cmd`: Full command as list, starting with `ffmpeg`.
+    - `keep`: Optional compiled regex, matching stderr lines are all kept
+      instead of only the bounded tail.
+
+    returns: (returncode, stderr text), the text being the kept lines plus
+    the last `STDERR_TAIL_LINES` lines. A job killed for stalling or running
+    out of time returns non-zero with the reason as first line.
+    """
+    async with _ffmpeg_slots:
+        process, dog = await _start(cmd, asyncio.subprocess.DEVNULL)
+        log = FFmpegLog(keep, dog.touch)
+        watch = asyncio.create_task(dog.watch())
+        try:
+            await _drain(process.stderr, log)
+            await process.wait()
+        finally:
+            watch.cancel()
+            if process.returncode is None:
+                # Cancelled from outside, do not leave the job running
+                kill_group(process.pid, signal.SIGKILL)
+            _finish(process)
+    return _report(cmd, process.returncode, log, dog)
+
+
+async def run_ffmpeg_pipe(cmd: list, keep=None):
+    """
+    Like `run_ffmpeg` but also collects what FFmpeg writes to stdout, for
+    commands that output raw frames or samples to `-`.
+
+    returns: (returncode, stdout bytes, stderr text)
+    """
+    async with _ffmpeg_slots:
+        process, dog = await _start(cmd, asyncio.subprocess.PIPE)
+        log = FFmpegLog(keep, dog.touch)
+        watch = asyncio.create_task(dog.watch())
+        try:
+            stdout, _ = await asyncio.gather(
+                process.stdout.read(), _drain(process.stderr, log)
+            )
+            await process.wait()
+        finally:
+            watch.cancel()
+            if process.returncode is None:
+                # Cancelled from outside, do not leave the job running
+                kill_group(process.pid, signal.SIGKILL)
+            _finish(process)
+    returncode, text = _report(cmd, process.returncode, log, dog)
+    return returncode, stdout, text
+
+
+async def run_ffmpeg_stream(cmd: list, on_chunk, frame_bytes: int = 1, keep=None):
+    """
+    Like `run_ffmpeg_pipe` but hands stdout to `on_chunk` piece by piece,
+    so long raw outputs (hours of PCM, every decoded frame) are reduced as
+    they arrive instead of held in memory.
+
+    Parameters:
+    - `on_chunk`: Called with each block of stdout bytes.
+    - `frame_bytes`: Every block is a whole number of these, e.g. the size
+      of one raw frame or sample.
+
+    returns: (returncode, stderr text)
+    """
+    async with _ffmpeg_slots:
+        process, dog = await _start(cmd, asyncio.subprocess.PIPE)
+        log = FFmpegLog(keep, dog.touch)
+        watch = asyncio.create_task(dog.watch())
+
+        async def _feed():
+            pending = b""
+            size = max(STDOUT_CHUNK // frame_bytes, 1) * frame_bytes
+            while True:
+                chunk = await process.stdout.read(size)
+                if not chunk:
+                    break
+                pending += chunk
+                whole = len(pending) - len(pending) % frame_bytes
+                if whole:
+                    on_chunk(pending[:whole])
+                    pending = pending[whole:]
+
+        try:
+            await asyncio.gather(_feed(), _drain(process.stderr, log))
+            await process.wait()
+        finally:
+            watch.cancel()
+            if process.returncode is None:
+                # Cancelled from outside, do not leave the job running
+                kill_group(process.pid, signal.SIGKILL)
+            _finish(process)
+    return _report(cmd, process.returncode, log, dog)
@@ -0,0 +1,155 @@
+# fingerprint.py - Perceptual fingerprints that spot the same video from two sources
+import ffmpeg
+import numpy as np
+
+from __init__ import LOGGER
+from helpers.ffmpeg_runner import run_ffmpeg_pipe
+from helpers.probe import get_duration, get_streams, probe_async
+
+FINGERPRINT_FRAMES = 8  # Positions sampled across the whole video
+HEAD_TIMES = (2.0, 5.0, 9.0, 14.0)  # Seconds sampled from a partial download
+HEAD_CHUNKS = 16  # 1 MiB Telegram chunks fetched for the early check
+SAMPLE_SIZE = 32  # Frames are reduced to 32x32 luma before the DCT
+HASH_SIZE = 8  # Low frequency DCT block, 64 bits per frame
+FLAT_FRAME_STD = 2.0  # Black or single colour frames hash alike, skip them
+DUPLICATE_MAX_DISTANCE = 12  # Mean differing bits per frame of a duplicate
+DUPLICATE_DURATION_SECONDS = 2.0
+DUPLICATE_DURATION_RATIO = 0.01
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    k = np.arange(n)
+    matrix = np.cos(np.pi * (2 * k[None, :] + 1) * k[:, None] / (2 * n)) * np.sqrt(2 / n)
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+
+_DCT = _dct_matrix(SAMPLE_SIZE)
+
+
+def phash(frames: np.ndarray):
+    """
+    Perceptual hashes of a stack of (n, 32, 32) luma frames.
+
+    returns: (bits shaped (n, 64), usable flag per frame)
+    """
+    f = frames.astype(np.float32)
+    coeffs = _DCT @ f @ _DCT.T
+    low = coeffs[:, :HASH_SIZE, :HASH_SIZE].reshape(len(f), -1)
+    # The DC term only says how bright the frame is, leave it out of the median
+    median = np.median(low[:, 1:], axis=1, keepdims=True)
+    return low > median, f.std(axis=(1, 2)) >= FLAT_FRAME_STD
+
+
+class Fingerprint(object):
+    """Frame hashes at fixed positions plus the duration they came from"""
+
+    __slots__ = ("duration", "bits", "usable")
+
+    def __init__(self, duration: float, bits: np.ndarray, usable: np.ndarray):
+        self.duration = duration
+        self.bits = bits
+        self.usable = usable
+
+    def distance(self, other) -> float:
+        """Mean differing bits over the positions usable in both, None if none are"""
+        n = min(len(self.bits), len(other.bits))
+        both = self.usable[:n] & other.usable[:n]
+        if both.sum() < max(1, n // 2):
+            return None
+        return float((self.bits[:n][both] != other.bits[:n][both]).sum(axis=1).mean())
+
+    def matches(self, other) -> bool:
+        if self.duration and other.duration:
+            allowed = max(
+                DUPLICATE_DURATION_SECONDS,
+                DUPLICATE_DURATION_RATIO * max(self.duration, other.duration),
+            )
+            if abs(self.duration - other.duration) > allowed:
+                return False
+        distance = self.distance(other)
+        return distance is not None and distance <= DUPLICATE_MAX_DISTANCE
+
+
+async def sample_frames(path: str, times: list) -> np.ndarray:
+    """
+    One 32x32 luma frame at each of `times`, from a single FFmpeg run with
+    one seeking input per position.
+
+    returns: Frames shaped (n, 32, 32), None when not all could be decoded
+    """
+    cmd = ["ffmpeg", "-hide_banner"]
+    for t in times:
+        cmd += ["-ss", f"{t:.3f}", "-i", path]
+    graph = [
+        f"[{n}:v:0]trim=end_frame=1,scale={SAMPLE_SIZE}:{SAMPLE_SIZE}:flags=area,"
+        f"format=gray,setsar=1[v{n}]"
+        for n in range(len(times))
+    ]
+    labels = "".join(f"[v{n}]" for n in range(len(times)))
+    graph.append(f"{labels}concat=n={len(times)}:v=1:a=0[out]")
+    cmd += [
+        "-filter_complex",
+        ";".join(graph),
+        "-map",
+        "[out]",
+        "-fps_mode",
+        "passthrough",
+        "-f",
+        "rawvideo",
+        "-",
+    ]
+    returncode, raw, _ = await run_ffmpeg_pipe(cmd)
+    size = SAMPLE_SIZE * SAMPLE_SIZE
+    if returncode != 0 or len(raw) < size * len(times):
+        return None
+    frames = np.frombuffer(raw[: size * len(times)], dtype=np.uint8)
+    return frames.reshape(len(times), SAMPLE_SIZE, SAMPLE_SIZE)
+
+
+async def fingerprint(path: str) -> Fingerprint:
+    """Fingerprint from frames spread over the whole video, None on failure"""
+    try:
+        data = await probe_async(path)
+    except (ffmpeg.Error, OSError, ValueError) as e:
+        # Corrupted downloads are reported by the concat plan, not here
+        LOGGER.warning(f"Unable to probe {path} for its fingerprint: {e}")
+        return None
+    duration = get_duration(data)
+    if duration <= 0 or not get_streams(data, "video"):
+        return None
+    times = [duration * (k + 0.5) / FINGERPRINT_FRAMES for k in range(FINGERPRINT_FRAMES)]
+    frames = await sample_frames(path, times)
+    if frames is None:
+        LOGGER.warning(f"Unable to fingerprint {path}")
+        return None
+    return Fingerprint(duration, *phash(frames))
+
+
+async def head_fingerprint(path: str, duration: float = None) -> Fingerprint:
+    """
+    Fingerprint of the first seconds only, comparable between a finished
+    download and the first chunks of another. `duration` is the full length
+    when known, e.g. from the Telegram media info.
+    """
+    frames = await sample_frames(path, list(HEAD_TIMES))
+    if frames is None:
+        return None
+    return Fingerprint(duration, *phash(frames))
+
+
+def find_duplicates(prints: list) -> dict:
+    """
+    Near-duplicates in a list of fingerprints (None entries are skipped).
+
+    returns: {index of a duplicate: index of the earlier input it repeats}
+    """
+    duplicates = {}
+    for j, b in enumerate(prints):
+        if b is None:
+            continue
+        for k, a in enumerate(prints[:j]):
+            if a is not None and k not in duplicates and a.matches(b):
+                duplicates[j] = k
+                break
+    return duplicates
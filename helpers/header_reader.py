@@ -0,0 +1,339 @@
+# header_reader.py - Duration, dimensions and tracks straight from MKV/MP4 headers
+import asyncio
+import mmap
+import struct
+
+import ffmpeg
+from __init__ import LOGGER
+from helpers.mp4_joiner import JoinError, parse_boxes
+from helpers.probe import get_duration, probe_async
+
+# Matroska element IDs, marker bits included as in the specification
+EBML_HEADER = 0x1A45DFA3
+EBML_DOCTYPE = 0x4282
+SEGMENT = 0x18538067
+SEEK_HEAD = 0x114D9B74
+SEEK = 0x4DBB
+SEEK_ID = 0x53AB
+SEEK_POSITION = 0x53AC
+INFO = 0x1549A966
+TIMECODE_SCALE = 0x2AD7B1
+DURATION = 0x4489
+TITLE = 0x7BA9
+TRACKS = 0x1654AE6B
+TRACK_ENTRY = 0xAE
+TRACK_NUMBER = 0xD7
+TRACK_TYPE = 0x83
+CODEC_ID = 0x86
+TRACK_NAME = 0x536E
+LANGUAGE = 0x22B59C
+VIDEO = 0xE0
+PIXEL_WIDTH = 0xB0
+PIXEL_HEIGHT = 0xBA
+CLUSTER = 0x1F43B675
+TAGS = 0x1254C367
+VOID = 0xEC
+
+MATROSKA_TRACK_TYPES = {1: "video", 2: "audio", 17: "subtitle"}
+MP4_HANDLERS = {b"vide": "video", b"soun": "audio", b"sbtl": "subtitle", b"text": "subtitle", b"subt": "subtitle"}
+
+
+class HeaderError(Exception):
+    """The file is not a Matroska or ISO-BMFF file this reader understands"""
+
+
+class TrackInfo(object):
+    __slots__ = ("kind", "codec", "language", "name", "width", "height")
+
+    def __init__(self, kind: str, codec: str, language: str = None, name: str = None,
+                 width: int = 0, height: int = 0):
+        self.kind = kind
+        self.codec = codec
+        self.language = language
+        self.name = name
+        self.width = width
+        self.height = height
+
+
+class MediaInfo(object):
+    """What the headers say about a file, `duration` is in milliseconds"""
+
+    __slots__ = ("container", "duration", "title", "tracks")
+
+    def __init__(self, container: str, duration: int, title: str = None, tracks: list = None):
+        self.container = container
+        self.duration = duration
+        self.title = title
+        self.tracks = tracks or []
+
+    @property
+    def seconds(self) -> int:
+        return self.duration // 1000
+
+    @property
+    def width(self) -> int:
+        return next((t.width for t in self.tracks if t.kind == "video"), 0)
+
+    @property
+    def height(self) -> int:
+        return next((t.height for t in self.tracks if t.kind == "video"), 0)
+
+
+def read_vint(buf, pos: int, marker: bool = False):
+    """
+    EBML variable length integer at `pos`, with its length marker kept for
+    element IDs. Sizes with all value bits set (unknown size) give None.
+
+    returns: (value, position after it)
+    """
+    first = buf[pos]
+    if first == 0:
+        raise HeaderError(f"Invalid EBML number at {pos}")
+    length = 9 - first.bit_length()
+    value = first if marker else first & (0xFF >> length)
+    for byte in buf[pos + 1 : pos + length]:
+        value = value << 8 | byte
+    if not marker and value == (1 << 7 * length) - 1:
+        value = None
+    return value, pos + length
+
+
+def read_element(buf, pos: int, end: int):
+    """returns: (element id, data start, data end), unknown sizes run to `end`"""
+    element_id, pos = read_vint(buf, pos, marker=True)
+    size, pos = read_vint(buf, pos)
+    if size is None or pos + size > end:
+        return element_id, pos, end
+    return element_id, pos, pos + size
+
+
+def iter_elements(buf, start: int, end: int):
+    """(element id, header start, data start, data end) of the children in a range"""
+    pos = start
+    while pos < end:
+        element_id, data, stop = read_element(buf, pos, end)
+        yield element_id, pos, data, stop
+        pos = stop
+
+
+def _uint(buf, start: int, end: int) -> int:
+    return int.from_bytes(buf[start:end], "big")
+
+
+def _float(buf, start: int, end: int) -> float:
+    if end - start == 4:
+        return struct.unpack(">f", buf[start:end])[0]
+    if end - start == 8:
+        return struct.unpack(">d", buf[start:end])[0]
+    return 0.0
+
+
+def _text(buf, start: int, end: int) -> str:
+    return bytes(buf[start:end]).rstrip(b"\0").decode("utf-8", "replace")
+
+
+def segment_elements(buf):
+    """
+    Locates the top level elements of a Matroska segment without walking
+    its clusters, through the SeekHead when there is one.
+
+    returns: (doctype, segment data start, {element id: (header start, data start, data end)})
+    """
+    element_id, start, end = read_element(buf, 0, len(buf))
+    if element_id != EBML_HEADER:
+        raise HeaderError("No EBML header")
+    doctype = "matroska"
+    for child, _, data, stop in iter_elements(buf, start, end):
+        if child == EBML_DOCTYPE:
+            doctype = _text(buf, data, stop)
+    element_id, segment, segment_end = read_element(buf, end, len(buf))
+    if element_id != SEGMENT:
+        raise HeaderError("No Matroska segment")
+
+    found = {}
+    seeks = {}
+    for child, head, data, stop in iter_elements(buf, segment, segment_end):
+        if child == SEEK_HEAD and not seeks:
+            found[SEEK_HEAD] = (head, data, stop)
+            for seek, _, s_data, s_stop in iter_elements(buf, data, stop):
+                if seek != SEEK:
+                    continue
+                target = position = None
+                for field, _, f_data, f_stop in iter_elements(buf, s_data, s_stop):
+                    if field == SEEK_ID:
+                        target = _uint(buf, f_data, f_stop)
+                    elif field == SEEK_POSITION:
+                        position = _uint(buf, f_data, f_stop)
+                if target is not None and position is not None:
+                    seeks.setdefault(target, segment + position)
+        elif child == CLUSTER:
+            # Everything wanted is either found or indexed, skip the media
+            if all(i in found or i in seeks for i in (INFO, TRACKS)):
+                break
+        else:
+            found.setdefault(child, (head, data, stop))
+    for target, position in seeks.items():
+        if target not in found and position < len(buf):
+            element_id, data, stop = read_element(buf, position, segment_end)
+            if element_id == target:
+                found[target] = (position, data, stop)
+    return doctype, segment, found
+
+
+def _read_matroska(buf) -> MediaInfo:
+    doctype, _, found = segment_elements(buf)
+    if INFO not in found:
+        raise HeaderError("No segment info")
+    scale, duration, title = 1000000, 0.0, None
+    _, start, end = found[INFO]
+    for child, _, data, stop in iter_elements(buf, start, end):
+        if child == TIMECODE_SCALE:
+            scale = _uint(buf, data, stop)
+        elif child == DURATION:
+            duration = _float(buf, data, stop)
+        elif child == TITLE:
+            title = _text(buf, data, stop)
+    tracks = []
+    if TRACKS in found:
+        _, start, end = found[TRACKS]
+        for entry, _, e_data, e_stop in iter_elements(buf, start, end):
+            if entry != TRACK_ENTRY:
+                continue
+            track = TrackInfo("other", "", language="eng")
+            for child, _, data, stop in iter_elements(buf, e_data, e_stop):
+                if child == TRACK_TYPE:
+                    track.kind = MATROSKA_TRACK_TYPES.get(_uint(buf, data, stop), "other")
+                elif child == CODEC_ID:
+                    track.codec = _text(buf, data, stop)
+                elif child == TRACK_NAME:
+                    track.name = _text(buf, data, stop)
+                elif child == LANGUAGE:
+                    track.language = _text(buf, data, stop)
+                elif child == VIDEO:
+                    for field, _, f_data, f_stop in iter_elements(buf, data, stop):
+                        if field == PIXEL_WIDTH:
+                            track.width = _uint(buf, f_data, f_stop)
+                        elif field == PIXEL_HEIGHT:
+                            track.height = _uint(buf, f_data, f_stop)
+            tracks.append(track)
+    return MediaInfo(doctype, int(duration * scale / 1000000), title, tracks)
+
+
+def find_box(buf, box_type: bytes, start: int = 0, end: int = None):
+    """returns: (box start, payload start, box end) of the first top level `box_type`, or None"""
+    end = len(buf) if end is None else end
+    pos = start
+    while pos + 8 <= end:
+        size, found = struct.unpack_from(">I4s", buf, pos)
+        header = 8
+        if size == 1:
+            size = struct.unpack_from(">Q", buf, pos + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header:
+            raise HeaderError(f"Broken {found!r} box")
+        if found == box_type:
+            return pos, pos + header, min(pos + size, end)
+        pos += size
+    return None
+
+
+def mp4_language(code: int) -> str:
+    """ISO 639-2 code packed as three 5 bit letters in an mdhd box"""
+    return "".join(chr(((code >> shift) & 0x1F) + 0x60) for shift in (10, 5, 0))
+
+
+def _read_mp4(buf) -> MediaInfo:
+    located = find_box(buf, b"moov")
+    if located is None:
+        raise HeaderError("No moov box")
+    _, start, end = located
+    moov = parse_boxes(bytes(buf[start:end]))
+    mvhd = next((b for b in moov if b.type == b"mvhd"), None)
+    if mvhd is None:
+        raise HeaderError("No movie header")
+    if mvhd.payload[0] == 1:
+        timescale, duration = struct.unpack_from(">IQ", mvhd.payload, 20)
+    else:
+        timescale, duration = struct.unpack_from(">II", mvhd.payload, 12)
+    title = None
+    udta = next((b for b in moov if b.type == b"udta"), None)
+    meta = next((b for b in parse_boxes(udta.payload) if b.type == b"meta"), None) if udta else None
+    ilst = next((b for b in parse_boxes(meta.payload[4:]) if b.type == b"ilst"), None) if meta else None
+    if ilst is not None:
+        name = next((b for b in parse_boxes(ilst.payload) if b.type == b"\xa9nam"), None)
+        if name is not None:
+            # The item holds a data box: type, locale, then the UTF-8 text
+            title = _text(name.payload, 16, len(name.payload))
+    tracks = []
+    for trak in (b for b in moov if b.type == b"trak"):
+        hdlr = trak.find(b"mdia", b"hdlr")
+        mdhd = trak.find(b"mdia", b"mdhd")
+        tkhd = trak.find(b"tkhd")
+        stsd = trak.find(b"mdia", b"minf", b"stbl", b"stsd")
+        if hdlr is None or mdhd is None or tkhd is None:
+            continue
+        track = TrackInfo(
+            MP4_HANDLERS.get(hdlr.payload[8:12], "other"),
+            stsd.payload[12:16].decode("latin-1") if stsd is not None else "",
+            name=_text(hdlr.payload, 24, len(hdlr.payload)) or None,
+        )
+        # The udta name is the track title, the handler name only a fallback
+        udta = trak.find(b"udta")
+        name = next((b for b in parse_boxes(udta.payload) if b.type == b"name"), None) if udta else None
+        if name is not None:
+            track.name = _text(name.payload, 0, len(name.payload)) or track.name
+        track.language = mp4_language(
+            struct.unpack_from(">H", mdhd.payload, 32 if mdhd.payload[0] == 1 else 20)[0]
+        )
+        # 16.16 fixed point size at the end of the track header
+        width, height = struct.unpack_from(">II", tkhd.payload, 88 if tkhd.payload[0] == 1 else 76)
+        track.width, track.height = width >> 16, height >> 16
+        tracks.append(track)
+    return MediaInfo("mp4", duration * 1000 // timescale if timescale else 0, title, tracks)
+
+
+def read_media_info(path: str) -> MediaInfo:
+    """
+    Reads an MKV/WebM or MP4/MOV header through mmap. Only the EBML segment
+    info and tracks, or the moov box, are touched; clusters and mdat are
+    skipped by their sizes, so the cost does not grow with the file.
+
+    raises: HeaderError for other or broken files
+    """
+    with open(path, "rb") as f:
+        try:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            raise HeaderError(f"{path} is empty")
+    with buf:
+        try:
+            if buf[:4] == b"\x1a\x45\xdf\xa3":
+                return _read_matroska(buf)
+            if buf[4:8] in (b"ftyp", b"moov", b"free", b"mdat", b"wide", b"skip"):
+                return _read_mp4(buf)
+        except (IndexError, struct.error, JoinError) as err:
+            raise HeaderError(f"Broken header in {path}: {err}")
+    raise HeaderError(f"{path} is neither Matroska nor ISO-BMFF")
+
+
+async def media_duration(path: str) -> int:
+    """
+    Duration in whole seconds from the container header, ffprobe is asked
+    when the header has none (other containers, live recordings).
+
+    returns: Seconds, None when the file can not be read at all
+    """
+    try:
+        info = await asyncio.get_running_loop().run_in_executor(None, read_media_info, path)
+        if info.duration > 0:
+            return info.seconds
+    except (HeaderError, OSError) as err:
+        LOGGER.info(f"Header read failed, asking ffprobe: {err}")
+    try:
+        duration = get_duration(await probe_async(path))
+    except (ffmpeg.Error, OSError, ValueError) as err:
+        LOGGER.warning(f"Unable to read the duration of {path}: {err}")
+        return None
+    return int(duration) if duration > 0 else None
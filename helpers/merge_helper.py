@@ -1,9 +1,9 @@
 # helpers/merge_helper.py - Merge Process Handler
 import os
 import time
-import asyncio
 from pyrogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 from __init__ import queueDB, LOGGER
+from helpers.ffmpeg_runner import run_ffmpeg
 from helpers.utils import get_readable_file_size, get_readable_time
 
 async def start_merge_process(c, cb, user_id):
@@ -89,15 +89,9 @@ async def start_merge_process(c, cb, user_id):
                 "-c", "copy", output_file, "-y"
             ]
             
-            process = await asyncio.create_subprocess_exec(
-                *ffmpeg_cmd,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            
-            stdout, stderr = await process.communicate()
+            returncode, _ = await run_ffmpeg(ffmpeg_cmd)
             
-            if process.returncode == 0 and os.path.exists(output_file):
+            if returncode == 0 and os.path.exists(output_file):
                 # Success - upload merged video
                 file_size = os.path.getsize(output_file)
                 
@@ -140,14 +134,13 @@ async def start_merge_process(c, cb, user_id):
                 )
                 
             else:
-                # Merge failed
-                error_msg = stderr.decode() if stderr else "Unknown error"
+                # Merge failed, the runner already logged the FFmpeg output tail
                 await progress_msg.edit_text(
                     "❌ **Merge Failed!**\n\n"
                     f"🚨 Error: FFmpeg process failed\n"
                     "💡 Make sure FFmpeg is installed and try again."
                 )
-                LOGGER.error(f"FFmpeg error: {error_msg}")
+                LOGGER.error(f"FFmpeg merge failed for user {user_id}")
                 
         except Exception as e:
             await progress_msg.edit_text(
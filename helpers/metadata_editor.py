@@ -0,0 +1,406 @@
+# metadata_editor.py - Edits titles, track names and languages without a remux
+import mmap
+import os
+import re
+import struct
+
+from helpers.header_reader import (
+    INFO,
+    LANGUAGE,
+    MP4_HANDLERS,
+    SEEK,
+    SEEK_HEAD,
+    SEEK_ID,
+    SEEK_POSITION,
+    TITLE,
+    TRACK_ENTRY,
+    TRACK_NAME,
+    TRACK_TYPE,
+    TRACKS,
+    VOID,
+    MATROSKA_TRACK_TYPES,
+    HeaderError,
+    find_box,
+    iter_elements,
+    read_element,
+    read_vint,
+    segment_elements,
+)
+from helpers.mp4_joiner import Box, JoinError, _full_box, parse_boxes
+
+CRC32 = 0xBF
+LANGUAGE_BCP47 = 0x22B59D
+KIND_LETTERS = {"video": "v", "audio": "a", "subtitle": "s"}
+# "title=..." or "a1.lang=jpn", tracks counted per kind from 1
+_FIELD = re.compile(r"^(?:(title)|([vas])(\d+)\.(name|lang))$")
+_LANGUAGE = re.compile(r"^[a-z]{3}$")
+
+
+class MetadataEdits(object):
+    """Title plus {(kind letter, number): {"name": ..., "language": ...}}"""
+
+    __slots__ = ("title", "tracks")
+
+    def __init__(self, title: str = None, tracks: dict = None):
+        self.title = title
+        self.tracks = tracks or {}
+
+    def describe(self) -> str:
+        lines = [f"Title: `{self.title}`"] if self.title is not None else []
+        for (kind, n), fields in sorted(self.tracks.items()):
+            for field, value in fields.items():
+                lines.append(f"{kind}{n} {field}: `{value}`")
+        return "\n".join(lines)
+
+
+def parse_edits(text: str) -> MetadataEdits:
+    """
+    Reads `title=My Film | a1.lang=jpn | a1.name=Japanese`, one field per
+    `|` or line.
+
+    raises: ValueError with a message for the user
+    """
+    edits = MetadataEdits()
+    for part in re.split(r"[|\n]", text):
+        if not part.strip():
+            continue
+        key, sep, value = part.partition("=")
+        match = _FIELD.match(key.strip().lower())
+        if not sep or not match:
+            raise ValueError(f"Unknown field `{key.strip()}`")
+        value = value.strip()
+        if match.group(1):
+            edits.title = value
+            continue
+        kind, n, field = match.group(2), int(match.group(3)), match.group(4)
+        if n < 1:
+            raise ValueError("Tracks are counted from 1")
+        if field == "lang":
+            value = value.lower()
+            if not _LANGUAGE.match(value):
+                raise ValueError(f"`{value}` is not a 3 letter ISO 639-2 code")
+            field = "language"
+        edits.tracks.setdefault((kind, n), {})[field] = value
+    if edits.title is None and not edits.tracks:
+        raise ValueError("Nothing to edit")
+    return edits
+
+
+def metadata_args(edits: MetadataEdits) -> list:
+    """The same edits as FFmpeg options, for the remux fallback"""
+    args = []
+    if edits.title is not None:
+        args += ["-metadata", f"title={edits.title}"]
+    for (kind, n), fields in sorted(edits.tracks.items()):
+        if "name" in fields:
+            args += [f"-metadata:s:{kind}:{n - 1}", f"title={fields['name']}"]
+        if "language" in fields:
+            args += [f"-metadata:s:{kind}:{n - 1}", f"language={fields['language']}"]
+    return args
+
+
+def _vint(value: int, width: int = None) -> bytes:
+    """EBML size with the smallest (or the given) width"""
+    if width is None:
+        width = 1
+        while value >= (1 << 7 * width) - 1:
+            width += 1
+    return (value | 1 << 7 * width).to_bytes(width, "big")
+
+
+def ebml_element(element_id: int, data: bytes, size_width: int = None) -> bytes:
+    return element_id.to_bytes((element_id.bit_length() + 7) // 8, "big") + _vint(len(data), size_width) + data
+
+
+def ebml_void(total: int) -> bytes:
+    """A Void element exactly `total` (at least 2) bytes long"""
+    for width in range(1, 9):
+        size = total - 1 - width
+        if 0 <= size < (1 << 7 * width) - 1:
+            return ebml_element(VOID, b"\0" * size, width)
+    raise HeaderError(f"No Void element fits {total} bytes")
+
+
+def _track_slots(kinds: list) -> list:
+    """(kind letter, number) of every track, in file order"""
+    seen = {}
+    slots = []
+    for kind in kinds:
+        letter = KIND_LETTERS.get(kind)
+        seen[letter] = seen.get(letter, 0) + 1
+        slots.append((letter, seen[letter]))
+    return slots
+
+
+def _matroska_info(buf, span, title: str) -> bytes:
+    _, start, end = span
+    children = [
+        bytes(buf[head:stop])
+        for child, head, _, stop in iter_elements(buf, start, end)
+        if child not in (TITLE, CRC32, VOID)
+    ]
+    children.append(ebml_element(TITLE, title.encode("utf-8")))
+    return ebml_element(INFO, b"".join(children))
+
+
+def _matroska_tracks(buf, span, tracks: dict):
+    _, start, end = span
+    entries = [e for e in iter_elements(buf, start, end) if e[0] == TRACK_ENTRY]
+    kinds = []
+    for _, _, data, stop in entries:
+        kind = next(
+            (int.from_bytes(buf[d:s], "big") for c, _, d, s in iter_elements(buf, data, stop) if c == TRACK_TYPE),
+            0,
+        )
+        kinds.append(MATROSKA_TRACK_TYPES.get(kind, "other"))
+    out = []
+    for slot, (_, head, data, stop) in zip(_track_slots(kinds), entries):
+        fields = tracks.get(slot)
+        if not fields:
+            out.append(bytes(buf[head:stop]))
+            continue
+        drop = {CRC32, VOID}
+        if "name" in fields:
+            drop.add(TRACK_NAME)
+        if "language" in fields:
+            # A BCP 47 tag would override the edited ISO 639-2 one
+            drop |= {LANGUAGE, LANGUAGE_BCP47}
+        children = [bytes(buf[h:s]) for c, h, _, s in iter_elements(buf, data, stop) if c not in drop]
+        if "name" in fields:
+            children.append(ebml_element(TRACK_NAME, fields["name"].encode("utf-8")))
+        if "language" in fields:
+            children.append(ebml_element(LANGUAGE, fields["language"].encode("ascii")))
+        out.append(ebml_element(TRACK_ENTRY, b"".join(children)))
+    return ebml_element(TRACKS, b"".join(out))
+
+
+def _edit_matroska(buf, edits: MetadataEdits):
+    """
+    returns: ([(offset, bytes)] to write, bytes to append, how it was done)
+    """
+    _, segment, found = segment_elements(buf)
+    rebuilt = []
+    if edits.title is not None:
+        if INFO not in found:
+            raise HeaderError("No segment info to hold the title")
+        rebuilt.append((INFO, _matroska_info(buf, found[INFO], edits.title)))
+    if edits.tracks:
+        if TRACKS not in found:
+            raise HeaderError("No track list")
+        rebuilt.append((TRACKS, _matroska_tracks(buf, found[TRACKS], edits.tracks)))
+
+    patches, appended, how = [], b"", "in place"
+    for element_id, new in rebuilt:
+        head, _, stop = found[element_id]
+        end = stop
+        # A Void right after the element is free room
+        if end < len(buf) and buf[end] == VOID:
+            end = read_element(buf, end, len(buf))[2]
+        room = end - head
+        if len(new) == room:
+            patches.append((head, new))
+        elif len(new) + 1 == room:
+            # One byte is too small for a Void, widen the size field instead
+            id_end = read_vint(new, 0, marker=True)[1]
+            data = read_vint(new, id_end)[1]
+            patches.append((head, ebml_element(element_id, new[data:], data - id_end + 1)))
+        elif len(new) < room:
+            patches.append((head, new + ebml_void(room - len(new))))
+            how = "void padding" if how == "in place" else how
+        else:
+            patches += _relocate(buf, segment, found, element_id, len(buf) + len(appended))
+            patches.append((head, ebml_void(room)))
+            appended += new
+            how = "relocated header"
+    if appended:
+        patches += _grow_segment(buf, segment, len(appended))
+    return patches, appended, how
+
+
+def _relocate(buf, segment: int, found: dict, element_id: int, position: int) -> list:
+    """Points the SeekHead entry of `element_id` at `position`"""
+    if SEEK_HEAD not in found:
+        raise HeaderError("No SeekHead, the header can not move")
+    _, start, end = found[SEEK_HEAD]
+    for seek, _, s_data, s_stop in iter_elements(buf, start, end):
+        if seek != SEEK:
+            continue
+        fields = {c: (d, s) for c, _, d, s in iter_elements(buf, s_data, s_stop)}
+        if SEEK_ID not in fields or SEEK_POSITION not in fields:
+            continue
+        if int.from_bytes(buf[slice(*fields[SEEK_ID])], "big") != element_id:
+            continue
+        data, stop = fields[SEEK_POSITION]
+        value = position - segment
+        if value >= 1 << 8 * (stop - data):
+            raise HeaderError("SeekPosition too narrow for the new header position")
+        return [(data, value.to_bytes(stop - data, "big"))]
+    raise HeaderError("SeekHead has no entry for the header")
+
+
+def _grow_segment(buf, segment: int, extra: int) -> list:
+    """Size field update of a segment that now ends `extra` bytes later"""
+    _, _, ebml_end = read_element(buf, 0, len(buf))
+    _, size_at = read_vint(buf, ebml_end, marker=True)
+    size, data = read_vint(buf, size_at)
+    if size is None:
+        return []  # Unknown size, runs to the end of the file anyway
+    if data + size != len(buf):
+        raise HeaderError("Data after the segment, it can not grow")
+    width = data - size_at
+    if size + extra >= (1 << 7 * width) - 1:
+        raise HeaderError("Segment size field too narrow")
+    return [(size_at, _vint(size + extra, width))]
+
+
+def _ilst_title(title: str) -> Box:
+    data = Box(b"data", struct.pack(">II", 1, 0) + title.encode("utf-8"))
+    return Box(b"\xa9nam", data.to_bytes())
+
+
+def _with_title(udta: Box, title: str) -> Box:
+    """Copy of a udta box with `title` as the iTunes style ©nam item"""
+    children = parse_boxes(udta.payload) if udta is not None else []
+    meta = next((c for c in children if c.type == b"meta"), None)
+    if meta is not None:
+        items = parse_boxes(meta.payload[4:])
+    else:
+        hdlr = _full_box(b"hdlr", 0, b"\0" * 4 + b"mdir" + b"appl" + b"\0" * 9)
+        items = [hdlr]
+    ilst = next((c for c in items if c.type == b"ilst"), None)
+    entries = [e for e in parse_boxes(ilst.payload) if e.type != b"\xa9nam"] if ilst else []
+    ilst = Box(b"ilst", b"".join(e.to_bytes() for e in entries + [_ilst_title(title)]))
+    items = [c for c in items if c.type != b"ilst"] + [ilst]
+    meta = Box(b"meta", (meta.payload[:4] if meta else b"\0" * 4) + b"".join(c.to_bytes() for c in items))
+    children = [c for c in children if c.type != b"meta"] + [meta]
+    return Box(b"udta", b"".join(c.to_bytes() for c in children))
+
+
+def _with_name(udta: Box, name: str) -> Box:
+    """Copy of a trak udta box with `name`, the track title FFmpeg reads and writes"""
+    children = [c for c in parse_boxes(udta.payload) if c.type != b"name"] if udta is not None else []
+    children.append(Box(b"name", name.encode("utf-8")))
+    return Box(b"udta", b"".join(c.to_bytes() for c in children))
+
+
+def _edit_trak(trak: Box, fields: dict) -> Box:
+    children = []
+    mdia = trak.find(b"mdia")
+    new_mdia = []
+    for c in mdia.children:
+        if c.type == b"mdhd" and "language" in fields:
+            payload = bytearray(c.payload)
+            code = 0
+            for letter in fields["language"]:
+                code = code << 5 | (ord(letter) - 0x60)
+            struct.pack_into(">H", payload, 32 if payload[0] == 1 else 20, code)
+            c = Box(b"mdhd", bytes(payload))
+        elif c.type == b"hdlr" and "name" in fields:
+            # Some readers show the handler name as the track title
+            c = Box(b"hdlr", c.payload[:24] + fields["name"].encode("utf-8") + b"\0")
+        new_mdia.append(c)
+    for c in trak.children:
+        if c.type == b"mdia":
+            c = Box(b"mdia", children=new_mdia)
+        elif c.type == b"udta" and "name" in fields:
+            c = _with_name(c, fields["name"])
+        children.append(c)
+    if "name" in fields and trak.find(b"udta") is None:
+        children.append(_with_name(None, fields["name"]))
+    return Box(b"trak", children=children)
+
+
+def _edit_mp4(buf, edits: MetadataEdits):
+    """
+    returns: ([(offset, bytes)] to write, bytes to append, how it was done)
+    """
+    located = find_box(buf, b"moov")
+    if located is None:
+        raise HeaderError("No moov box")
+    head, start, stop = located
+    children = parse_boxes(bytes(buf[start:stop]))
+    traks = [c for c in children if c.type == b"trak"]
+    handlers = [t.find(b"mdia", b"hdlr") for t in traks]
+    kinds = [MP4_HANDLERS.get(h.payload[8:12], "other") if h else "other" for h in handlers]
+    slots = dict(zip(map(id, traks), _track_slots(kinds)))
+    new_children = []
+    for c in children:
+        if c.type == b"trak" and edits.tracks.get(slots[id(c)]):
+            c = _edit_trak(c, edits.tracks[slots[id(c)]])
+        elif c.type == b"udta" and edits.title is not None:
+            c = _with_title(c, edits.title)
+        new_children.append(c)
+    if edits.title is not None and not any(c.type == b"udta" for c in children):
+        new_children.append(_with_title(None, edits.title))
+    new = Box(b"moov", children=new_children).to_bytes()
+
+    end = stop
+    # free/skip boxes behind the moov are free room
+    while end + 8 <= len(buf) and buf[end + 4 : end + 8] in (b"free", b"skip"):
+        size = struct.unpack_from(">I", buf, end)[0]
+        if size < 8:
+            break
+        end += size
+    room = end - head
+    if len(new) == room:
+        return [(head, new)], b"", "in place"
+    if len(new) + 8 <= room:
+        return [(head, new + struct.pack(">I4s", room - len(new), b"free"))], b"", "free padding"
+    if end >= len(buf):
+        # moov is last, nothing after it points into the file
+        return [(head, new)], b"", "rewritten at the end"
+    # moov in front of the media: the old one becomes a free box, the new one
+    # goes to the end, so no chunk offset changes
+    pos = end
+    while pos + 8 <= len(buf):
+        size = struct.unpack_from(">I", buf, pos)[0]
+        if size == 0:
+            raise HeaderError("Last box runs to the end of the file, nothing can follow it")
+        if size == 1:
+            size = struct.unpack_from(">Q", buf, pos + 8)[0]
+        pos += size
+    return [(head + 4, b"free")], new, "relocated header"
+
+
+def apply_edits(path: str, edits: MetadataEdits) -> str:
+    """
+    Writes `edits` into an MKV/WebM or MP4/MOV file in place.
+
+    Only the changed header (Matroska Info and Tracks, or the MP4 moov) is
+    rewritten. It goes back where it was when it fits, counting a Void or
+    free element right behind it as room; otherwise the old copy is turned
+    into padding and the new one appended, with the SeekHead (Matroska)
+    pointing at it. The media data never moves, so any size of file takes
+    the same few milliseconds.
+
+    returns: How the header was placed
+
+    raises: HeaderError when the file can not be edited this way
+    """
+    with open(path, "r+b") as f:
+        try:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            raise HeaderError(f"{path} is empty")
+        with buf:
+            try:
+                if buf[:4] == b"\x1a\x45\xdf\xa3":
+                    patches, appended, how = _edit_matroska(buf, edits)
+                elif buf[4:8] in (b"ftyp", b"moov", b"free", b"mdat", b"wide", b"skip"):
+                    patches, appended, how = _edit_mp4(buf, edits)
+                else:
+                    raise HeaderError(f"{path} is neither Matroska nor ISO-BMFF")
+            except (IndexError, struct.error, JoinError) as err:
+                raise HeaderError(f"Broken header in {path}: {err}")
+            size = len(buf)
+        if how == "rewritten at the end":
+            f.truncate(patches[0][0])
+        if appended:
+            f.seek(size)
+            f.write(appended)
+        for offset, data in patches:
+            f.seek(offset)
+            f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    return how
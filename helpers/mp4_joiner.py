@@ -0,0 +1,471 @@
+# mp4_joiner.py - Joins same-codec MP4 files by rewriting their sample tables
+import asyncio
+import bisect
+import os
+import struct
+import sys
+from array import array
+
+from __init__ import LOGGER
+
+MP4_EXTENSIONS = ("mp4", "m4v", "mov", "m4a")
+# Boxes whose children are parsed, everything else is kept as raw bytes
+CONTAINER_BOXES = (b"moov", b"trak", b"mdia", b"minf", b"stbl", b"edts")
+# Sample table boxes the joiner rebuilds
+MERGED_STBL_BOXES = (b"stsd", b"stts", b"ctts", b"stss", b"stsz", b"stsc", b"stco", b"co64")
+# Optional hints (sample groups, dependency flags), leaving them out is safe
+DROPPED_STBL_BOXES = (b"sgpd", b"sbgp", b"sdtp")
+COPY_CHUNK = 64 * 1024 * 1024
+MOOV_PADDING = 16 * 1024  # free box behind the moov, room for later metadata edits
+UINT32_MAX = 0xFFFFFFFF
+
+
+class JoinError(Exception):
+    """The inputs can not be joined at box level, FFmpeg has to do it"""
+
+
+class Box(object):
+    """One ISO-BMFF box, containers hold parsed children instead of a payload"""
+
+    __slots__ = ("type", "payload", "children")
+
+    def __init__(self, type_: bytes, payload: bytes = b"", children: list = None):
+        self.type = type_
+        self.payload = payload
+        self.children = children
+
+    def find(self, *path):
+        box = self
+        for type_ in path:
+            box = next((c for c in box.children or [] if c.type == type_), None)
+            if box is None:
+                return None
+        return box
+
+    def to_bytes(self) -> bytes:
+        if self.children is not None:
+            body = b"".join(c.to_bytes() for c in self.children)
+        else:
+            body = self.payload
+        if len(body) + 8 > UINT32_MAX:
+            return struct.pack(">I4sQ", 1, self.type, len(body) + 16) + body
+        return struct.pack(">I4s", len(body) + 8, self.type) + body
+
+
+def parse_boxes(data: bytes) -> list:
+    boxes = []
+    pos = 0
+    while pos + 8 <= len(data):
+        size, type_ = struct.unpack_from(">I4s", data, pos)
+        header = 8
+        if size == 1:
+            size = struct.unpack_from(">Q", data, pos + 8)[0]
+            header = 16
+        elif size == 0:
+            size = len(data) - pos
+        if size < header or pos + size > len(data):
+            raise JoinError(f"Broken {type_!r} box")
+        payload = data[pos + header : pos + size]
+        if type_ in CONTAINER_BOXES:
+            boxes.append(Box(type_, children=parse_boxes(payload)))
+        else:
+            boxes.append(Box(type_, payload))
+        pos += size
+    return boxes
+
+
+def scan_file(path: str):
+    """
+    Reads the top level of an MP4 without touching the media data.
+
+    returns: (ftyp box, moov box, [(payload start, payload end)] of every mdat)
+    """
+    ftyp = moov = None
+    mdats = []
+    with open(path, "rb") as f:
+        end = os.fstat(f.fileno()).st_size
+        pos = 0
+        while pos + 8 <= end:
+            f.seek(pos)
+            head = f.read(16)
+            size, type_ = struct.unpack_from(">I4s", head)
+            header = 8
+            if size == 1:
+                size = struct.unpack_from(">Q", head, 8)[0]
+                header = 16
+            elif size == 0:
+                size = end - pos
+            if size < header or pos + size > end:
+                raise JoinError(f"Truncated {type_!r} box in {path}")
+            if type_ == b"moof":
+                raise JoinError(f"{path} is fragmented")
+            if type_ == b"mdat":
+                mdats.append((pos + header, pos + size))
+            elif type_ in (b"ftyp", b"moov"):
+                f.seek(pos + header)
+                payload = f.read(size - header)
+                if type_ == b"moov":
+                    moov = Box(type_, children=parse_boxes(payload))
+                else:
+                    ftyp = Box(type_, payload)
+            pos += size
+    if ftyp is None or moov is None or not mdats:
+        raise JoinError(f"{path} is not a complete MP4")
+    if moov.find(b"mvex") is not None:
+        raise JoinError(f"{path} is fragmented")
+    return ftyp, moov, mdats
+
+
+def _uints(data: bytes, count: int, code: str = "I") -> array:
+    values = array(code)
+    values.frombytes(data[: count * values.itemsize])
+    if len(values) != count:
+        raise JoinError("Sample table shorter than its entry count")
+    if sys.byteorder == "little":
+        values.byteswap()
+    return values
+
+
+def _pack(values: array) -> bytes:
+    if sys.byteorder == "little":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _full_box(type_: bytes, version: int, body: bytes) -> Box:
+    return Box(type_, struct.pack(">I", version << 24) + body)
+
+
+class Mp4Track(object):
+    """Sample tables of one track, flattened for merging"""
+
+    def __init__(self, trak: Box):
+        self.trak = trak
+        mdhd = trak.find(b"mdia", b"mdhd").payload
+        if mdhd[0] == 1:
+            self.timescale, self.duration = struct.unpack_from(">IQ", mdhd, 20)
+        else:
+            self.timescale, self.duration = struct.unpack_from(">II", mdhd, 12)
+        self.handler = trak.find(b"mdia", b"hdlr").payload[8:12]
+        stbl = trak.find(b"mdia", b"minf", b"stbl")
+        if stbl is None:
+            raise JoinError("Track without sample table")
+        for child in stbl.children:
+            if child.type not in MERGED_STBL_BOXES + DROPPED_STBL_BOXES:
+                raise JoinError(f"Unsupported sample table box {child.type!r}")
+        self.stsd = stbl.find(b"stsd").payload
+
+        stts = stbl.find(b"stts").payload
+        self.stts = _uints(stts[8:], 2 * struct.unpack_from(">I", stts, 4)[0])
+        self.sample_count = sum(self.stts[0::2])
+        self.media_duration = sum(self.stts[n] * self.stts[n + 1] for n in range(0, len(self.stts), 2))
+        self.longest_sample = max(self.stts[1::2], default=0)
+
+        self.ctts = None
+        ctts = stbl.find(b"ctts")
+        if ctts is not None:
+            count = struct.unpack_from(">I", ctts.payload, 4)[0]
+            # Version 1 offsets are signed, version 0 ones fit in them too
+            self.ctts = _uints(ctts.payload[8:], 2 * count, "i")
+
+        self.stss = None
+        stss = stbl.find(b"stss")
+        if stss is not None:
+            count = struct.unpack_from(">I", stss.payload, 4)[0]
+            self.stss = _uints(stss.payload[8:], count)
+
+        stsz = stbl.find(b"stsz")
+        if stsz is None:
+            raise JoinError("Compact sample sizes (stz2) are not supported")
+        self.sample_size, count = struct.unpack_from(">II", stsz.payload, 4)
+        self.sizes = None if self.sample_size else _uints(stsz.payload[12:], count)
+        if count != self.sample_count:
+            raise JoinError("Sample counts of stts and stsz differ")
+
+        stsc = stbl.find(b"stsc").payload
+        self.stsc = _uints(stsc[8:], 3 * struct.unpack_from(">I", stsc, 4)[0])
+
+        stco = stbl.find(b"stco")
+        if stco is not None:
+            count = struct.unpack_from(">I", stco.payload, 4)[0]
+            self.chunks = array("Q", _uints(stco.payload[8:], count))
+        else:
+            co64 = stbl.find(b"co64").payload
+            self.chunks = _uints(co64[8:], struct.unpack_from(">I", co64, 4)[0], "Q")
+
+        self.media_time = None
+        elst = trak.find(b"edts", b"elst")
+        if elst is not None:
+            version = elst.payload[0]
+            count = struct.unpack_from(">I", elst.payload, 4)[0]
+            if count != 1:
+                raise JoinError("Edit lists with several entries are not supported")
+            if version == 1:
+                self.media_time = struct.unpack_from(">q", elst.payload, 16)[0]
+            else:
+                self.media_time = struct.unpack_from(">i", elst.payload, 12)[0]
+
+    @property
+    def layout(self):
+        """Everything that must be identical for the samples to be joined"""
+        return (self.handler, self.timescale, self.stsd, self.media_time)
+
+
+def _rebase(offsets: array, regions: list) -> array:
+    """Moves chunk offsets from their source mdat payloads to the output"""
+    starts = [r[0] for r in regions]
+    out = array("Q")
+    for offset in offsets:
+        n = bisect.bisect_right(starts, offset) - 1
+        if n < 0 or offset >= regions[n][1]:
+            raise JoinError("Chunk outside of the media data")
+        out.append(regions[n][2] + offset - regions[n][0])
+    return out
+
+
+def _merge_track(parts: list, regions: list, movie_timescale: int, co64: bool):
+    """
+    Builds the trak of the joined file from the same track of every input.
+
+    returns: (trak box, track duration in the movie timescale)
+
+    Parameters:
+    - `parts`: Mp4Track per input, in order.
+    - `regions`: Per input, the (source start, source end, output start)
+      of each of its mdat payloads.
+    """
+    first = parts[0]
+    stts, ctts, stss, sizes, stsc, chunks = (
+        array("I"), array("i"), array("I"), array("I"), array("I"), array("Q"),
+    )
+    has_ctts = any(p.ctts is not None for p in parts)
+    all_sync = all(p.stss is None for p in parts)
+    uniform = len({p.sample_size for p in parts}) == 1 and first.sample_size
+    samples = chunk_count = 0
+    for part, part_regions in zip(parts, regions):
+        stts.extend(part.stts)
+        if has_ctts:
+            ctts.extend(part.ctts if part.ctts is not None else array("i", [part.sample_count, 0]))
+        if not all_sync:
+            if part.stss is None:
+                stss.extend(range(samples + 1, samples + part.sample_count + 1))
+            else:
+                stss.extend(n + samples for n in part.stss)
+        if not uniform:
+            sizes.extend(part.sizes if part.sizes is not None else [part.sample_size] * part.sample_count)
+        for n in range(0, len(part.stsc), 3):
+            stsc.extend((part.stsc[n] + chunk_count, part.stsc[n + 1], part.stsc[n + 2]))
+        chunks.extend(_rebase(part.chunks, part_regions))
+        samples += part.sample_count
+        chunk_count += len(part.chunks)
+
+    children = [Box(b"stsd", first.stsd)]
+    children.append(_full_box(b"stts", 0, struct.pack(">I", len(stts) // 2) + _pack(stts)))
+    if has_ctts:
+        version = 1 if any(v < 0 for v in ctts[1::2]) else 0
+        children.append(_full_box(b"ctts", version, struct.pack(">I", len(ctts) // 2) + _pack(ctts)))
+    if not all_sync:
+        children.append(_full_box(b"stss", 0, struct.pack(">I", len(stss)) + _pack(stss)))
+    if uniform:
+        children.append(_full_box(b"stsz", 0, struct.pack(">II", first.sample_size, samples)))
+    else:
+        children.append(_full_box(b"stsz", 0, struct.pack(">II", 0, samples) + _pack(sizes)))
+    children.append(_full_box(b"stsc", 0, struct.pack(">I", len(stsc) // 3) + _pack(stsc)))
+    if co64:
+        children.append(_full_box(b"co64", 0, struct.pack(">I", len(chunks)) + _pack(chunks)))
+    else:
+        children.append(
+            _full_box(b"stco", 0, struct.pack(">I", len(chunks)) + _pack(array("I", chunks)))
+        )
+
+    media_duration = sum(p.media_duration for p in parts)
+    if media_duration > UINT32_MAX:
+        raise JoinError("Joined track too long for a version 0 header")
+    # New boxes along the trak/mdia/minf/stbl path, the input trees stay untouched
+    old_mdia = first.trak.find(b"mdia")
+    old_minf = old_mdia.find(b"minf")
+    minf = Box(
+        b"minf",
+        children=[c if c.type != b"stbl" else Box(b"stbl", children=children) for c in old_minf.children],
+    )
+    mdia = Box(
+        b"mdia",
+        children=[
+            _set_duration(c, media_duration) if c.type == b"mdhd" else minf if c.type == b"minf" else c
+            for c in old_mdia.children
+        ],
+    )
+
+    shown = media_duration - max(first.media_time or 0, 0)
+    track_duration = shown * movie_timescale // first.timescale
+    trak = Box(
+        b"trak",
+        children=[
+            _set_duration(c, track_duration) if c.type == b"tkhd"
+            else _set_edit(c, track_duration) if c.type == b"edts"
+            else mdia if c.type == b"mdia"
+            else c
+            for c in first.trak.children
+        ],
+    )
+    return trak, track_duration
+
+
+def _set_duration(box: Box, duration: int) -> Box:
+    """Copy of an mvhd, tkhd or mdhd box with a new duration"""
+    payload = bytearray(box.payload)
+    v1 = payload[0] == 1
+    offset = {b"mvhd": (16, 24), b"mdhd": (16, 24), b"tkhd": (20, 28)}[box.type][v1]
+    if v1:
+        struct.pack_into(">Q", payload, offset, duration)
+    elif duration > UINT32_MAX:
+        raise JoinError(f"Duration too long for a version 0 {box.type!r}")
+    else:
+        struct.pack_into(">I", payload, offset, duration)
+    return Box(box.type, bytes(payload))
+
+
+def _set_edit(edts: Box, duration: int) -> Box:
+    elst = edts.find(b"elst")
+    payload = bytearray(elst.payload)
+    if payload[0] == 1:
+        struct.pack_into(">Q", payload, 8, duration)
+    else:
+        struct.pack_into(">I", payload, 8, min(duration, UINT32_MAX))
+    return Box(b"edts", children=[Box(b"elst", bytes(payload))])
+
+
+def check_timing(inputs: list):
+    """
+    The merged tables play every sample of every part back to back. FFmpeg
+    concat restarts each part at its own edit list and end, the joiner can
+    only match that when the parts need neither.
+
+    raises: JoinError when a part trims audio priming through its edit list,
+    or its audio and video end more than one sample apart
+    """
+    if len(inputs) < 2:
+        return
+    for tracks in inputs:
+        if any(t.handler == b"soun" and t.media_time for t in tracks):
+            raise JoinError("Audio priming cut by an edit list would play at every join")
+    for tracks in inputs[:-1]:
+        timed = [t for t in tracks if t.handler in (b"vide", b"soun") and t.timescale]
+        if len(timed) < 2:
+            continue
+        lengths = [t.media_duration / t.timescale for t in timed]
+        sample = max(t.longest_sample / t.timescale for t in timed)
+        if max(lengths) - min(lengths) > sample:
+            raise JoinError("Tracks of a part end apart, the join would drift")
+
+
+def _copy(src, dst, offset: int, length: int):
+    """Zero-copy when the kernel allows it, plain reads otherwise"""
+    end = offset + length
+    while offset < end:
+        count = min(COPY_CHUNK, end - offset)
+        try:
+            copied = os.copy_file_range(src.fileno(), dst.fileno(), count, offset)
+        except (AttributeError, OSError):
+            try:
+                copied = os.sendfile(dst.fileno(), src.fileno(), offset, count)
+            except OSError:
+                # Straight to the descriptor, like the calls above
+                copied = os.write(dst.fileno(), os.pread(src.fileno(), count, offset))
+        if copied <= 0:
+            raise JoinError("Input ended early")
+        offset += copied
+
+
+def join_mp4(paths: list, output: str) -> str:
+    """
+    Concatenates MP4 files of identical tracks without FFmpeg.
+
+    The sample tables (stts, ctts, stss, stsz, stsc, chunk offsets) of every
+    track are merged and a new moov is written in front of a single mdat
+    that receives the media data of all inputs in order, copied in the
+    kernel with `copy_file_range`/`sendfile`. The output is fast start,
+    with a free box behind the moov so metadata edits fit in place.
+
+    returns: `output`
+
+    raises: JoinError when the inputs differ in tracks, codec setup or edit
+    lists, would drift apart (see `check_timing`), or use MP4 features the
+    joiner does not rewrite
+    """
+    files = [scan_file(p) for p in paths]
+    inputs = []
+    for _, moov, _ in files:
+        traks = [c for c in moov.children if c.type == b"trak"]
+        inputs.append([Mp4Track(t) for t in traks])
+    layouts = [[t.layout for t in tracks] for tracks in inputs]
+    if any(layout != layouts[0] for layout in layouts):
+        raise JoinError("Inputs differ in tracks or codec setup")
+    check_timing(inputs)
+
+    ftyp, moov, _ = files[0]
+    mvhd = moov.find(b"mvhd")
+    movie_timescale = struct.unpack_from(">I", mvhd.payload, 20 if mvhd.payload[0] == 1 else 12)[0]
+    payload = sum(end - start for _, _, mdats in files for start, end in mdats)
+    mdat_header = 16 if payload + 8 > UINT32_MAX else 8
+
+    def build(base: int, co64: bool) -> Box:
+        regions = []
+        position = base
+        for _, _, mdats in files:
+            regions.append([])
+            for start, end in mdats:
+                regions[-1].append((start, end, position))
+                position += end - start
+        children = []
+        tracks = iter(range(len(inputs[0])))
+        longest = 0
+        for child in moov.children:
+            if child.type == b"trak":
+                n = next(tracks)
+                trak, duration = _merge_track(
+                    [tracks_[n] for tracks_ in inputs], regions, movie_timescale, co64
+                )
+                longest = max(longest, duration)
+                children.append(trak)
+            elif child.type not in (b"mvhd", b"free", b"skip"):
+                children.append(child)
+        return Box(b"moov", children=[_set_duration(mvhd, longest)] + children)
+
+    ftyp_bytes = ftyp.to_bytes()
+    padding = struct.pack(">I4s", MOOV_PADDING, b"free") + b"\0" * (MOOV_PADDING - 8)
+    # Offsets have a fixed width, so the moov size does not depend on them;
+    # 64 bit offsets once the media data ends past 4 GiB
+    co64 = False
+    while True:
+        base = len(ftyp_bytes) + len(build(0, co64).to_bytes()) + len(padding) + mdat_header
+        if co64 or base + payload <= UINT32_MAX:
+            break
+        co64 = True
+    moov_bytes = build(base, co64).to_bytes()
+
+    with open(output, "wb") as out:
+        out.write(ftyp_bytes + moov_bytes + padding)
+        if mdat_header == 16:
+            out.write(struct.pack(">I4sQ", 1, b"mdat", payload + 16))
+        else:
+            out.write(struct.pack(">I4s", payload + 8, b"mdat"))
+        out.flush()
+        for path, (_, _, mdats) in zip(paths, files):
+            with open(path, "rb") as src:
+                for start, end in mdats:
+                    _copy(src, out, start, end - start)
+    LOGGER.info(f"Joined {len(paths)} MP4 files at box level into {output}")
+    return output
+
+
+async def join_mp4_async(paths: list, output: str) -> str:
+    """`join_mp4` in a worker thread, None when FFmpeg has to join the inputs"""
+    try:
+        return await asyncio.get_running_loop().run_in_executor(None, join_mp4, paths, output)
+    except (JoinError, OSError, OverflowError, struct.error) as err:
+        LOGGER.info(f"Box level join not possible, using FFmpeg: {err}")
+        if os.path.exists(output):
+            os.remove(output)
+        return None
@@ -0,0 +1,116 @@
+# previewer.py - Sample clip and contact sheet of a merged video from one decode
+import os
+
+from __init__ import LOGGER
+from helpers.ffmpeg_runner import run_ffmpeg
+from helpers.probe import get_duration, get_streams, probe_async
+
+PREVIEW_SNIPPETS = 5  # Short pieces spread over the video make up the clip
+PREVIEW_SNIPPET_SECONDS = 6
+PREVIEW_HEIGHT = 360
+PREVIEW_VIDEO_BITRATE = "400k"
+PREVIEW_AUDIO_BITRATE = "64k"
+SHEET_COLUMNS = 4
+SHEET_ROWS = 4
+SHEET_TILE_WIDTH = 320
+
+
+def _snippet_windows(duration: float) -> list:
+    """(start, end) of every clip snippet, evenly spaced and never overlapping"""
+    if duration <= PREVIEW_SNIPPETS * PREVIEW_SNIPPET_SECONDS:
+        return [(0.0, duration)]
+    step = duration / PREVIEW_SNIPPETS
+    return [
+        (i * step + (step - PREVIEW_SNIPPET_SECONDS) / 2,
+         i * step + (step + PREVIEW_SNIPPET_SECONDS) / 2)
+        for i in range(PREVIEW_SNIPPETS)
+    ]
+
+
+def preview_filter(duration: float, audio: bool = True) -> str:
+    """
+    Filter graph feeding both preview outputs from a single decode.
+
+    The decoded video is split in two: one branch keeps only the snippet
+    windows and is re-timed into a continuous clip, the other picks one
+    frame per sheet cell and tiles them into a single image.
+    """
+    within = "+".join(f"between(t,{a:.3f},{b:.3f})" for a, b in _snippet_windows(duration))
+    cells = SHEET_COLUMNS * SHEET_ROWS
+    interval = duration / cells
+    # Skip the first half interval, merged videos often open on black
+    sheet_select = (
+        f"gte(t,{interval / 2:.3f})"
+        f"*(isnan(prev_selected_t)+gte(t-prev_selected_t,{interval:.3f}))"
+    )
+    graph = [
+        "[0:v:0]split=2[c][s]",
+        f"[c]select='{within}',setpts=N/FRAME_RATE/TB,scale=-2:{PREVIEW_HEIGHT}[clip]",
+        f"[s]select='{sheet_select}',scale={SHEET_TILE_WIDTH}:-2,"
+        f"tile={SHEET_COLUMNS}x{SHEET_ROWS}[sheet]",
+    ]
+    if audio:
+        graph.append(f"[0:a:0]aselect='{within}',asetpts=N/SR/TB[aclip]")
+    return ";".join(graph)
+
+
+async def make_preview(video_file: str, output_directory: str):
+    """
+    Writes a low bitrate sample clip and a contact sheet of `video_file`.
+
+    Both come out of one FFmpeg run, so the merged video is read and
+    decoded once instead of once per sheet frame plus once for the clip.
+
+    Parameters:
+    - `video_file`: The merged video.
+    - `output_directory`: Where `preview.mp4` and `sheet.jpg` are written.
+
+    returns: (clip path, sheet path, clip duration), (None, None, 0) on failure
+    """
+    data = await probe_async(video_file)
+    duration = get_duration(data)
+    if duration <= 0 or not get_streams(data, "video"):
+        LOGGER.warning(f"Nothing to preview in {video_file}")
+        return None, None, 0
+    audio = bool(get_streams(data, "audio"))
+    clip = os.path.join(output_directory, "preview.mp4")
+    sheet = os.path.join(output_directory, "sheet.jpg")
+    cmd = [
+        "ffmpeg",
+        "-hide_banner",
+        "-y",
+        "-i",
+        video_file,
+        "-filter_complex",
+        preview_filter(duration, audio),
+        "-map",
+        "[clip]",
+    ]
+    if audio:
+        cmd += ["-map", "[aclip]", "-c:a", "aac", "-b:a", PREVIEW_AUDIO_BITRATE]
+    cmd += [
+        "-c:v",
+        "libx264",
+        "-preset",
+        "veryfast",
+        "-b:v",
+        PREVIEW_VIDEO_BITRATE,
+        "-pix_fmt",
+        "yuv420p",
+        "-movflags",
+        "+faststart",
+        clip,
+        "-map",
+        "[sheet]",
+        "-frames:v",
+        "1",
+        "-q:v",
+        "3",
+        sheet,
+    ]
+    returncode, _ = await run_ffmpeg(cmd)
+    if returncode != 0 or not os.path.exists(clip) or not os.path.exists(sheet):
+        LOGGER.error(f"Preview of {video_file} failed")
+        return None, None, 0
+    clip_duration = sum(b - a for a, b in _snippet_windows(duration))
+    return clip, sheet, clip_duration
@@ -0,0 +1,295 @@
+# probe.py - Cached ffprobe access shared by all FFmpeg helpers
+import asyncio
+import bisect
+import json
+import os
+import struct
+import subprocess
+from array import array
+
+import ffmpeg
+from __init__ import LOGGER
+
+# (abs path) -> ((size, mtime_ns), probe dict)
+_PROBE_CACHE = {}
+PROBE_PARALLEL = 4  # ffprobe processes per batch
+HEADER_PROBE_SIZE = 5 * 1024 * 1024  # Bytes read when only the header is wanted
+
+
+def _file_key(path: str):
+    st = os.stat(path)
+    return (st.st_size, st.st_mtime_ns)
+
+
+def probe(path: str) -> dict:
+    """
+    Probe a media file once and cache the result.
+
+    The cache entry is invalidated automatically when the file size or
+    modification time changes, so files rewritten in place are re-probed.
+
+    returns: ffprobe output as dict (`format` and `streams`)
+    """
+    path = os.path.abspath(path)
+    key = _file_key(path)
+    cached = _PROBE_CACHE.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    data = ffmpeg.probe(filename=path)
+    _PROBE_CACHE[path] = (key, data)
+    return data
+
+
+async def probe_async(path: str) -> dict:
+    """Same as `probe` but runs ffprobe off the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, probe, path)
+
+
+def probe_header(path: str) -> dict:
+    """
+    Probe only the container header, for files that are still downloading.
+
+    Stream layout and, for MKV/MP4 with the index in front, the duration are
+    known from the first few MB. The result is not cached as the file is
+    still growing.
+
+    returns: ffprobe output as dict, like `probe`
+    """
+    cmd = [
+        "ffprobe",
+        "-v",
+        "error",
+        "-probesize",
+        str(HEADER_PROBE_SIZE),
+        "-analyzeduration",
+        "0",
+        "-print_format",
+        "json",
+        "-show_format",
+        "-show_streams",
+        path,
+    ]
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise ffmpeg.Error("ffprobe", result.stdout, result.stderr)
+    return json.loads(result.stdout.decode(errors="ignore"))
+
+
+async def probe_many(paths: list, partial: bool = False) -> list:
+    """
+    Probe many files concurrently, at most `PROBE_PARALLEL` at a time.
+
+    Parameters:
+    - `paths`: Files to probe.
+    - `partial`: Read only the container headers (`probe_header`), for
+      files that may not be fully downloaded yet.
+
+    returns: Probe dict per path in the same order, None where probing failed
+    """
+    slots = asyncio.Semaphore(PROBE_PARALLEL)
+    loop = asyncio.get_running_loop()
+
+    async def probe_one(path):
+        async with slots:
+            try:
+                return await loop.run_in_executor(
+                    None, probe_header if partial else probe, path
+                )
+            except (ffmpeg.Error, OSError, ValueError) as e:
+                LOGGER.warning(f"Unable to probe {path}: {e}")
+                return None
+
+    return await asyncio.gather(*[probe_one(p) for p in paths])
+
+
+def forget(path: str):
+    """Drop a cached probe and keyframe index, e.g. before the file is deleted."""
+    _PROBE_CACHE.pop(os.path.abspath(path), None)
+    _KEYFRAME_CACHE.pop(os.path.abspath(path), None)
+
+
+def get_streams(data: dict, codec_type: str) -> list:
+    return [s for s in data.get("streams", []) if s.get("codec_type") == codec_type]
+
+
+def get_duration(data: dict) -> float:
+    """Container duration in seconds, falling back to the longest stream."""
+    try:
+        return float(data["format"]["duration"])
+    except (KeyError, TypeError, ValueError):
+        pass
+    duration = 0.0
+    for stream in data.get("streams", []):
+        try:
+            duration = max(duration, float(stream["duration"]))
+        except (KeyError, TypeError, ValueError):
+            continue
+    if duration == 0.0:
+        LOGGER.warning("No duration found in probe data")
+    return duration
+
+
+def start_time(path: str) -> float:
+    """Container start time in seconds, what `-ss` and durations count from"""
+    try:
+        return float(probe(path)["format"]["start_time"])
+    except (ffmpeg.Error, KeyError, TypeError, ValueError):
+        return 0.0
+
+
+def keyframe_packets(path: str, intervals: list = None):
+    """
+    Presentation times (seconds) and byte offsets of all video keyframes.
+
+    Reads packet flags only, no decoding, so it is fast even on long files.
+    With `intervals`, a list of (start, end) seconds, only packets inside
+    those windows are read instead of the whole file.
+
+    Times, and `intervals`, count from the container start time like `-ss`
+    does, not from the raw timestamps (MPEG-TS often starts at 1.4 s or
+    hours in).
+
+    returns: (times, positions), both sorted by time
+    """
+    offset = start_time(path)
+    cmd = [
+        "ffprobe",
+        "-v",
+        "error",
+        "-select_streams",
+        "v:0",
+        "-show_entries",
+        "packet=pts_time,pos,flags",
+        "-of",
+        "csv=print_section=0",
+    ]
+    if intervals:
+        cmd += [
+            "-read_intervals",
+            ",".join(f"{max(0.0, a) + offset:.3f}%{b + offset:.3f}" for a, b in intervals),
+        ]
+    cmd.append(path)
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    packets = []
+    for line in result.stdout.decode(errors="ignore").splitlines():
+        fields = line.split(",")
+        if len(fields) < 3 or "K" not in fields[2]:
+            continue
+        try:
+            pos = int(fields[1])
+        except ValueError:
+            pos = -1
+        try:
+            packets.append((float(fields[0]) - offset, pos))
+        except ValueError:
+            continue
+    packets.sort()
+    return [p[0] for p in packets], [p[1] for p in packets]
+
+
+async def keyframe_packets_async(path: str, intervals: list = None):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, keyframe_packets, path, intervals)
+
+
+# (abs path) -> ((size, mtime_ns), KeyframeIndex)
+_KEYFRAME_CACHE = {}
+KEYFRAME_INDEX_SUFFIX = ".kfidx"
+# magic, file size, file mtime_ns, keyframe count
+_INDEX_HEADER = struct.Struct("<8sqqq")
+_INDEX_MAGIC = b"KFIDX002"  # 002: times relative to the start time
+
+
+class KeyframeIndex(object):
+    """
+    Keyframe times and byte offsets of one file in two parallel arrays.
+
+    `times` is sorted, lookups are binary searches. A byte offset of -1
+    means the container did not report one.
+    """
+
+    __slots__ = ("times", "positions")
+
+    def __init__(self, times: array, positions: array):
+        self.times = times
+        self.positions = positions
+
+    @classmethod
+    def from_packets(cls, times: list, positions: list):
+        pairs = sorted(set(zip(times, positions)))
+        return cls(array("d", (p[0] for p in pairs)), array("q", (p[1] for p in pairs)))
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def at_or_before(self, t: float, tolerance: float = 0.0):
+        """Last keyframe time <= `t` + `tolerance`, None if there is none"""
+        i = bisect.bisect_right(self.times, t + tolerance)
+        return self.times[i - 1] if i else None
+
+    def at_or_after(self, t: float, tolerance: float = 0.0):
+        """First keyframe time >= `t` - `tolerance`, None if there is none"""
+        i = bisect.bisect_left(self.times, t - tolerance)
+        return self.times[i] if i < len(self.times) else None
+
+    def save(self, path: str, key):
+        with open(path, "wb") as f:
+            f.write(_INDEX_HEADER.pack(_INDEX_MAGIC, key[0], key[1], len(self.times)))
+            self.times.tofile(f)
+            self.positions.tofile(f)
+
+    @classmethod
+    def load(cls, path: str, key):
+        """Reads a saved index, None if missing or made for another file version"""
+        try:
+            with open(path, "rb") as f:
+                magic, size, mtime, count = _INDEX_HEADER.unpack(
+                    f.read(_INDEX_HEADER.size)
+                )
+                if magic != _INDEX_MAGIC or (size, mtime) != key:
+                    return None
+                times, positions = array("d"), array("q")
+                times.fromfile(f, count)
+                positions.fromfile(f, count)
+        except (OSError, EOFError, struct.error):
+            return None
+        return cls(times, positions)
+
+
+def cached_keyframe_index(path: str):
+    """The keyframe index of `path` if one was built already, else None"""
+    path = os.path.abspath(path)
+    cached = _KEYFRAME_CACHE.get(path)
+    if cached is not None and cached[0] == _file_key(path):
+        return cached[1]
+    return None
+
+
+def keyframe_index(path: str) -> KeyframeIndex:
+    """
+    Keyframe index of a file, built once by a packet-only ffprobe pass.
+
+    The index lives in memory next to the probe cache and is saved beside
+    the file (`<file>.kfidx`), so trim, split, segment encoding and
+    thumbnails share one scan. Both are invalidated with the file's size
+    or modification time.
+    """
+    path = os.path.abspath(path)
+    key = _file_key(path)
+    index = cached_keyframe_index(path)
+    if index is None:
+        index = KeyframeIndex.load(path + KEYFRAME_INDEX_SUFFIX, key)
+    if index is None:
+        index = KeyframeIndex.from_packets(*keyframe_packets(path))
+        try:
+            index.save(path + KEYFRAME_INDEX_SUFFIX, key)
+        except OSError as e:
+            LOGGER.warning(f"Unable to save keyframe index of {path}: {e}")
+    _KEYFRAME_CACHE[path] = (key, index)
+    return index
+
+
+async def keyframe_index_async(path: str) -> KeyframeIndex:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, keyframe_index, path)
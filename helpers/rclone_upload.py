@@ -9,7 +9,9 @@ from pyrogram.client import Client
 from pyrogram.errors import FloodWait, MessageNotModified
 from pyrogram.types import CallbackQuery, Message
 from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from config import Config
 from helpers import database
+from helpers.watchdog import WALL_BASE_SECONDS, Watchdog
 from __init__ import LOGGER
 
 
@@ -180,12 +182,25 @@ async def rclone_upload(
         "--buffer-size=1M",
         "-P",
     ]
-    rclonePr = subprocess.Popen(rclone_copy_cmd, stdout=subprocess.PIPE)
+    # Own process group so the watchdog can stop rclone and its helpers
+    rclonePr = subprocess.Popen(
+        rclone_copy_cmd, stdout=subprocess.PIPE, start_new_session=True
+    )
+    dog = Watchdog(
+        "rclone",
+        rclonePr.pid,
+        lambda: rclonePr.poll() is None,
+        Config.FFMPEG_STALL_TIMEOUT,
+        WALL_BASE_SECONDS + os.path.getsize(merged_video_path) / Config.RCLONE_MIN_SPEED,
+    )
     rcloneResult = await rclone_process_display(
-        rclonePr, edTime, msg, mess, userMess, task
+        rclonePr, edTime, msg, mess, userMess, task, dog
     )
     if rcloneResult is False:
-        await mess.edit(f"{mess.text} \n Canceled Rclone Upload")
+        if task._error:
+            await mess.edit(f"{mess.text} \n Rclone Upload failed: {task._error}")
+        else:
+            await mess.edit(f"{mess.text} \n Canceled Rclone Upload")
         await msg.delete()
         rclonePr.kill()
         task.cancel = True
@@ -218,17 +233,25 @@ async def rclone_process_display(
     mess: Message,
     userMess: Message,
     task: RCUploadTask,
+    dog: Watchdog = None,
 ):
     blank = 0  #
     sleeps = False  #
     start = time.time()  # Get current time
+    transferred = None
+    watch = asyncio.create_task(dog.watch()) if dog is not None else None
+    loop = asyncio.get_running_loop()
     while True:
-        data: str = process.stdout.readline().decode()
+        # readline blocks, keep it off the event loop so the watchdog runs
+        data: str = (await loop.run_in_executor(None, process.stdout.readline)).decode()
         data = data.strip()
         mat = re.findall("Transferred:.*ETA.*", data)
         if mat is not None:
             if len(mat) > 0:
                 sleeps = True
+                if dog is not None and mat[0].split(",")[0] != transferred:
+                    transferred = mat[0].split(",")[0]
+                    dog.touch()
                 if time.time() - start > edit_time:
                     start = time.time()
                     await task.refresh_info(data)
@@ -246,6 +269,12 @@ async def rclone_process_display(
             await asyncio.sleep(2)
             process.stdout.flush()
 
+    if watch is not None:
+        watch.cancel()
+        if dog.reason is not None:
+            await task.set_inactive(dog.reason)
+            return False
+
 
 async def getGdriveLink(driveName, baseDir, entName: str, conf_path: str, isdir=True):
     LOGGER.info("Ent - ", entName)
@@ -0,0 +1,189 @@
+# segment_encoder.py - Keyframe aligned, segment parallel video encoding
+import asyncio
+import bisect
+import math
+import os
+import shutil
+
+from config import Config
+from __init__ import LOGGER
+from helpers.ffmpeg_runner import available_cpus, run_ffmpeg
+from helpers.probe import forget, get_duration, keyframe_index_async, probe_async
+
+SEGMENT_MIN_SECONDS = 30  # Shorter segments cost more in encoder warm up than they save
+SEGMENTS_PER_WORKER = 2  # Smooths out segments that encode slower than others
+DURATION_TOLERANCE = 0.5  # Seconds the stitched output may differ from the input
+
+
+def pick_split_points(keyframes: list, duration: float, parts: int) -> list:
+    """
+    Choose up to `parts - 1` keyframes closest to evenly spaced positions.
+
+    returns: Sorted split times, never 0 and never the end
+    """
+    points = []
+    for n in range(1, parts):
+        target = duration * n / parts
+        i = bisect.bisect_left(keyframes, target)
+        candidates = keyframes[max(0, i - 1) : i + 1]
+        if not candidates:
+            continue
+        best = min(candidates, key=lambda k: abs(k - target))
+        if 0 < best < duration and (not points or best > points[-1]):
+            points.append(best)
+    return points
+
+
+def _workers() -> int:
+    return max(1, min(int(available_cpus()), Config.MAX_FFMPEG_JOBS))
+
+
+async def _single_pass(
+    src, out, video_args, audio_inputs, audio_args, extra_args, subtitles, duration
+):
+    cmd = ["ffmpeg", "-hide_banner", "-y", "-i", src] + audio_inputs
+    if video_args:
+        cmd += ["-map", "0:v:0"] + video_args
+    cmd += audio_args
+    if subtitles:
+        cmd += ["-map", "0:s?", "-c:s", "copy"]
+    cmd += ["-t", f"{duration:.6f}"] + extra_args + [out]
+    returncode, _ = await run_ffmpeg(cmd)
+    return returncode == 0 and os.path.exists(out)
+
+
+async def _gather_or_cancel(jobs: list) -> list:
+    """
+    Like `asyncio.gather`, but when one job fails the others are cancelled
+    and awaited, so none is left writing into a directory being removed.
+    """
+    try:
+        return await asyncio.gather(*jobs)
+    except BaseException:
+        for job in jobs:
+            job.cancel()
+        await asyncio.gather(*jobs, return_exceptions=True)
+        raise
+
+
+async def encode_segmented(
+    src: str,
+    out: str,
+    video_args: list,
+    audio_inputs: list = None,
+    audio_args: list = None,
+    extra_args: list = None,
+    subtitles: bool = False,
+    message=None,
+) -> bool:
+    """
+    Re-encode a file by splitting its video at keyframes and encoding the
+    segments concurrently, then stitching them with stream copy concat.
+
+    Audio is encoded once over the whole timeline alongside the segments, so
+    there are no priming gaps at segment boundaries.
+
+    Parameters:
+    - `src`: Input file.
+    - `out`: Output file.
+    - `video_args`: Encoder options for the first video stream (no `-map`).
+    - `audio_inputs`: Extra `-i` arguments audio maps may refer to (inputs 1..).
+    - `audio_args`: `-map`/codec options for audio, relative to `src` as input 0.
+    - `extra_args`: Muxer options for the final output.
+    - `subtitles`: Copy subtitle streams of `src` into the output.
+    - `message`: Optional editable message for status.
+
+    returns: True if `out` was written
+    """
+    audio_inputs = audio_inputs or []
+    audio_args = audio_args or []
+    extra_args = extra_args or []
+    duration = get_duration(await probe_async(src))
+    workers = _workers()
+    parts = min(
+        workers * SEGMENTS_PER_WORKER, int(duration // SEGMENT_MIN_SECONDS)
+    )
+    points = []
+    if video_args and workers > 1 and parts > 1:
+        index = await keyframe_index_async(src)
+        points = pick_split_points(index.times, duration, parts)
+    if not points:
+        return await _single_pass(
+            src, out, video_args, audio_inputs, audio_args, extra_args, subtitles, duration
+        )
+
+    work_dir = out + ".segments"
+    os.makedirs(work_dir, exist_ok=True)
+    bounds = [0.0] + points + [duration]
+    threads = str(max(1, math.floor(available_cpus() / workers)))
+    pool = asyncio.Semaphore(workers)
+    done = 0
+
+    async def encode_part(n, start, end):
+        nonlocal done
+        seg = os.path.join(work_dir, f"seg_{n:04d}.mkv")
+        cmd = ["ffmpeg", "-hide_banner", "-y", "-ss", f"{start:.6f}", "-i", src]
+        cmd += ["-t", f"{end - start:.6f}", "-map", "0:v:0", "-an", "-sn"]
+        cmd += video_args + ["-threads", threads, seg]
+        async with pool:
+            returncode, _ = await run_ffmpeg(cmd)
+        done += 1
+        if message is not None:
+            try:
+                await message.edit(f"⚙️ Encoding segments {done}/{len(bounds) - 1} ...")
+            except Exception:
+                pass
+        return seg if returncode == 0 and os.path.exists(seg) else None
+
+    async def encode_audio():
+        if not audio_args:
+            return None
+        aud = os.path.join(work_dir, "audio.mka")
+        cmd = ["ffmpeg", "-hide_banner", "-y", "-i", src] + audio_inputs
+        cmd += ["-vn", "-sn"] + audio_args + ["-t", f"{duration:.6f}", aud]
+        returncode, _ = await run_ffmpeg(cmd)
+        return aud if returncode == 0 and os.path.exists(aud) else None
+
+    LOGGER.info(f"Encoding {src} in {len(bounds) - 1} segments with {workers} workers")
+    jobs = [asyncio.ensure_future(encode_audio())] + [
+        asyncio.ensure_future(encode_part(n, s, e))
+        for n, (s, e) in enumerate(zip(bounds, bounds[1:]))
+    ]
+    try:
+        results = await _gather_or_cancel(jobs)
+        audio, segments = results[0], results[1:]
+        if None in segments or (audio_args and audio is None):
+            LOGGER.error("Segment encode failed, falling back to single pass")
+            return await _single_pass(
+                src, out, video_args, audio_inputs, audio_args, extra_args, subtitles, duration
+            )
+
+        list_file = os.path.join(work_dir, "segments.txt")
+        with open(list_file, "w") as _list:
+            _list.write("\n".join(f"file '{os.path.abspath(s)}'" for s in segments))
+        cmd = ["ffmpeg", "-hide_banner", "-y", "-f", "concat", "-safe", "0", "-i", list_file]
+        maps = ["-map", "0:v:0"]
+        if audio is not None:
+            cmd += ["-i", audio]
+            maps += ["-map", "1:a?"]
+        if subtitles:
+            cmd += ["-i", src]
+            maps += ["-map", f"{2 if audio is not None else 1}:s?"]
+        cmd += maps + ["-c", "copy"] + extra_args + [out]
+        returncode, _ = await run_ffmpeg(cmd)
+        if returncode != 0 or not os.path.exists(out):
+            return False
+
+        # Stitching must not change the timeline compared to a single pass
+        stitched = get_duration(await probe_async(out))
+        if abs(stitched - duration) > DURATION_TOLERANCE:
+            LOGGER.warning(
+                f"Segmented output is {stitched:.3f}s, expected {duration:.3f}s, re-encoding in one pass"
+            )
+            forget(out)
+            return await _single_pass(
+                src, out, video_args, audio_inputs, audio_args, extra_args, subtitles, duration
+            )
+        return True
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
@@ -0,0 +1,115 @@
+# splitter.py - Stream copy splitting of outputs above the Telegram limit
+import bisect
+import math
+import os
+
+from config import Config
+from __init__ import LOGGER
+from helpers.ffmpeg_runner import run_ffmpeg
+from helpers.probe import get_duration, keyframe_index_async, probe_async
+
+TG_UPLOAD_LIMIT = 2044723200
+TG_PREMIUM_UPLOAD_LIMIT = 4241280205
+SPLIT_HEADROOM = 0.97  # Room for container overhead and uneven GOP sizes
+SPLIT_MAX_ATTEMPTS = 3
+
+
+def get_upload_limit() -> int:
+    """Largest file the active Telegram session may upload"""
+    return TG_PREMIUM_UPLOAD_LIMIT if Config.IS_PREMIUM else TG_UPLOAD_LIMIT
+
+
+def pick_split_times(
+    times: list, positions: list, duration: float, file_size: int, parts: int
+) -> list:
+    """
+    Choose `parts - 1` keyframes so every part holds about the same number
+    of bytes. Falls back to time when the container reports no byte offsets.
+
+    returns: Sorted keyframe times to cut at
+    """
+    use_bytes = len(positions) > 0 and all(p >= 0 for p in positions)
+    axis = positions if use_bytes else times
+    total = file_size if use_bytes else duration
+    cuts = []
+    for n in range(1, parts):
+        target = total * n / parts
+        i = bisect.bisect_left(axis, target)
+        candidates = [j for j in (i - 1, i) if 0 <= j < len(axis)]
+        if not candidates:
+            continue
+        best = min(candidates, key=lambda j: abs(axis[j] - target))
+        t = times[best]
+        if 0 < t < duration and (not cuts or t > cuts[-1]):
+            cuts.append(t)
+    return cuts
+
+
+async def split_by_size(file_path: str, limit: int, message=None) -> list:
+    """
+    Cut a file at keyframes into the fewest parts below `limit` bytes,
+    using stream copy only.
+
+    Parameters:
+    - `file_path`: File to split.
+    - `limit`: Maximum size of a single part in bytes.
+    - `message`: Optional editable message for status.
+
+    returns: Ordered list of part paths, None on failure
+    """
+    file_size = os.path.getsize(file_path)
+    if file_size <= limit:
+        return [file_path]
+    duration = get_duration(await probe_async(file_path))
+    index = await keyframe_index_async(file_path)
+    times, positions = index.times, index.positions
+    if not times or duration <= 0:
+        LOGGER.error(f"No keyframes to split {file_path} at")
+        return None
+    stem, ext = os.path.splitext(file_path)
+    parts = math.ceil(file_size / (limit * SPLIT_HEADROOM))
+    for attempt in range(SPLIT_MAX_ATTEMPTS):
+        cuts = pick_split_times(times, positions, duration, file_size, parts)
+        if len(cuts) < parts - 1:
+            LOGGER.error(f"Not enough keyframes to split {file_path} in {parts} parts")
+            return None
+        if message is not None:
+            try:
+                await message.edit(f"✂️ Splitting into {parts} parts ...")
+            except Exception:
+                pass
+        pattern = f"{stem}.part%02d{ext}"
+        cmd = [
+            "ffmpeg",
+            "-hide_banner",
+            "-y",
+            "-i",
+            file_path,
+            "-map",
+            "0",
+            "-c",
+            "copy",
+            "-f",
+            "segment",
+            "-segment_times",
+            ",".join(f"{t:.6f}" for t in cuts),
+            "-segment_start_number",
+            "1",
+            "-reset_timestamps",
+            "1",
+            pattern,
+        ]
+        returncode, _ = await run_ffmpeg(cmd)
+        outputs = [pattern % n for n in range(1, parts + 1)]
+        if returncode != 0 or not all(os.path.exists(o) for o in outputs):
+            LOGGER.error(f"Failed to split {file_path}")
+            return None
+        if all(os.path.getsize(o) <= limit for o in outputs):
+            LOGGER.info(f"Split {file_path} into {parts} parts")
+            return outputs
+        # Keyframes were too sparse for balanced parts, try one more part
+        for o in outputs:
+            os.remove(o)
+        parts += 1
+    LOGGER.error(f"Unable to split {file_path} below {limit} bytes")
+    return None
@@ -0,0 +1,281 @@
+# subtitle_merger.py - Joins per-input subtitles into one track for a merged video
+import codecs
+import os
+import re
+
+from __init__ import LOGGER
+
+# Subtitle files the merger understands, anything else needs an FFmpeg mux
+TEXT_SUBTITLE_FORMATS = ("srt", "ass", "ssa")
+
+SRT_TIMING = re.compile(
+    r"(\d+):(\d{1,2}):(\d{1,2})[,.](\d{1,3})\s*-->\s*(\d+):(\d{1,2}):(\d{1,2})[,.](\d{1,3})"
+)
+ASS_TIME = re.compile(r"(\d+):(\d{1,2}):(\d{1,2})[.,](\d{1,3})")
+SRT_TAGS = (
+    (re.compile(r"<\s*i\s*>", re.I), r"{\\i1}"),
+    (re.compile(r"<\s*/\s*i\s*>", re.I), r"{\\i0}"),
+    (re.compile(r"<\s*b\s*>", re.I), r"{\\b1}"),
+    (re.compile(r"<\s*/\s*b\s*>", re.I), r"{\\b0}"),
+    (re.compile(r"<\s*u\s*>", re.I), r"{\\u1}"),
+    (re.compile(r"<\s*/\s*u\s*>", re.I), r"{\\u0}"),
+    (re.compile(r"<[^>]+>"), ""),
+)
+
+STYLE_FIELDS = [
+    "Name", "Fontname", "Fontsize", "PrimaryColour", "SecondaryColour",
+    "OutlineColour", "BackColour", "Bold", "Italic", "Underline", "StrikeOut",
+    "ScaleX", "ScaleY", "Spacing", "Angle", "BorderStyle", "Outline", "Shadow",
+    "Alignment", "MarginL", "MarginR", "MarginV", "Encoding",
+]
+DEFAULT_STYLE = dict(
+    zip(
+        STYLE_FIELDS,
+        [
+            "Default", "Arial", "48", "&H00FFFFFF", "&H000000FF", "&H00000000",
+            "&H00000000", "0", "0", "0", "0", "100", "100", "0", "0", "1", "2",
+            "2", "2", "10", "10", "10", "1",
+        ],
+    )
+)
+EVENT_FIELDS = [
+    "Layer", "Start", "End", "Style", "Name", "MarginL", "MarginR", "MarginV",
+    "Effect", "Text",
+]
+DEFAULT_SCRIPT_INFO = [
+    "[Script Info]",
+    "ScriptType: v4.00+",
+    "WrapStyle: 0",
+    "ScaledBorderAndShadow: yes",
+    "PlayResX: 384",
+    "PlayResY: 288",
+]
+
+
+def read_text(path: str) -> str:
+    """Reads a subtitle file whatever its encoding, BOMs are honoured"""
+    with open(path, "rb") as f:
+        raw = f.read()
+    for bom, encoding in (
+        (codecs.BOM_UTF8, "utf-8-sig"),
+        (codecs.BOM_UTF16_LE, "utf-16"),
+        (codecs.BOM_UTF16_BE, "utf-16"),
+    ):
+        if raw.startswith(bom):
+            return raw.decode(encoding, errors="replace")
+    for encoding in ("utf-8", "cp1252"):
+        try:
+            return raw.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return raw.decode("latin-1")
+
+
+def _ms(h, m, s, frac) -> int:
+    # "5" is 500ms in "0:00:01.5", pad the fraction to milliseconds
+    return ((int(h) * 60 + int(m)) * 60 + int(s)) * 1000 + int(frac.ljust(3, "0")[:3])
+
+
+def srt_time(ms: int) -> str:
+    ms = max(0, ms)
+    h, ms = divmod(ms, 3600000)
+    m, ms = divmod(ms, 60000)
+    s, ms = divmod(ms, 1000)
+    return f"{h:02d}:{m:02d}:{s:02d},{ms:03d}"
+
+
+def ass_time(ms: int) -> str:
+    cs = max(0, ms) // 10
+    h, cs = divmod(cs, 360000)
+    m, cs = divmod(cs, 6000)
+    s, cs = divmod(cs, 100)
+    return f"{h}:{m:02d}:{s:02d}.{cs:02d}"
+
+
+def iter_srt(text: str):
+    """Yields (start_ms, end_ms, text) for every SRT cue"""
+    timing = None
+    lines = []
+    for line in text.splitlines():
+        line = line.rstrip()
+        if timing is None:
+            match = SRT_TIMING.search(line) if "-->" in line else None
+            if match:
+                g = match.groups()
+                timing = (_ms(*g[:4]), _ms(*g[4:]))
+            continue
+        if line:
+            lines.append(line)
+            continue
+        yield timing[0], timing[1], "\n".join(lines)
+        timing, lines = None, []
+    if timing is not None:
+        yield timing[0], timing[1], "\n".join(lines)
+
+
+def _split_ass(text: str):
+    """
+    Splits an ASS/SSA script into its sections.
+
+    returns: {lowercase section name: [lines]}, keeping section order
+    """
+    sections = {}
+    current = None
+    for line in text.splitlines():
+        stripped = line.strip()
+        if stripped.startswith("[") and stripped.endswith("]"):
+            current = stripped.lower()
+            sections.setdefault(current, [])
+        elif current is not None and stripped and not stripped.startswith(";"):
+            sections[current].append(stripped)
+    return sections
+
+
+def _fields(format_line: str) -> list:
+    return [f.strip() for f in format_line.split(":", 1)[1].split(",")]
+
+
+def _parse_entries(lines: list, kind: str, default_format: list) -> list:
+    """Parses `Kind: a,b,...` lines of a section into dicts by the Format line"""
+    fmt = default_format
+    entries = []
+    for line in lines:
+        key, _, value = line.partition(":")
+        key = key.strip()
+        if key.lower() == "format":
+            fmt = _fields(line)
+        elif key in kind:
+            values = [v.strip() for v in value.split(",", len(fmt) - 1)]
+            entry = dict(zip(fmt, values))
+            entry["_kind"] = key
+            entries.append(entry)
+    return entries
+
+
+def _srt_to_ass_text(text: str) -> str:
+    for pattern, repl in SRT_TAGS:
+        text = pattern.sub(repl, text)
+    return text.replace("\n", r"\N")
+
+
+def merge_subtitles(subtitles: list, offsets: list, out_path: str) -> str:
+    """
+    Writes one subtitle file covering all inputs of a merged video.
+
+    Every file's cues are shifted by the start of its input in the merged
+    timeline. The output is UTF-8 SRT when all inputs are SRT, otherwise ASS
+    with the style sections of all files merged; styles with the same name
+    but different settings are renamed per file.
+
+    Parameters:
+    - `subtitles`: Subtitle path or None per input.
+    - `offsets`: Start of every input in the merged video, in seconds.
+    - `out_path`: Output path without extension.
+
+    returns: Path of the written file (`.srt` or `.ass`)
+    """
+    exts = [
+        os.path.splitext(s)[1].lstrip(".").lower() for s in subtitles if s is not None
+    ]
+    if all(e == "srt" for e in exts):
+        out_file = out_path + ".srt"
+        n = 0
+        with open(out_file, "w", encoding="utf-8") as out:
+            for sub, offset in zip(subtitles, offsets):
+                if sub is None:
+                    continue
+                shift = int(round(offset * 1000))
+                for start, end, text in iter_srt(read_text(sub)):
+                    n += 1
+                    out.write(
+                        f"{n}\n{srt_time(start + shift)} --> {srt_time(end + shift)}\n{text}\n\n"
+                    )
+        LOGGER.info(f"Merged {n} cues into {out_file}")
+        return out_file
+
+    out_file = out_path + ".ass"
+    script_info = None
+    styles = {}  # name -> style dict
+    events = []
+    for index, (sub, offset) in enumerate(zip(subtitles, offsets)):
+        if sub is None:
+            continue
+        shift = int(round(offset * 1000))
+        text = read_text(sub)
+        if sub.lower().endswith(".srt"):
+            for start, end, cue in iter_srt(text):
+                events.append(
+                    (start + shift, "Dialogue", "0", end + shift, "Default", _srt_to_ass_text(cue))
+                )
+            styles.setdefault("Default", dict(DEFAULT_STYLE))
+            continue
+        sections = _split_ass(text)
+        if script_info is None:
+            script_info = ["[Script Info]"] + sections.get("[script info]", [])
+        renames = {}
+        style_lines = sections.get("[v4+ styles]") or sections.get("[v4 styles]") or []
+        for style in _parse_entries(style_lines, ("Style",), STYLE_FIELDS):
+            full = dict(DEFAULT_STYLE)
+            full.update({k: v for k, v in style.items() if k in DEFAULT_STYLE})
+            name = full["Name"]
+            if name in styles and styles[name] != full:
+                # Reuse an identical style renamed for an earlier file
+                settings = {k: v for k, v in full.items() if k != "Name"}
+                new_name = next(
+                    (
+                        n
+                        for n, st in styles.items()
+                        if n.startswith(f"{name}_")
+                        and {k: v for k, v in st.items() if k != "Name"} == settings
+                    ),
+                    f"{name}_{index + 1}",
+                )
+                renames[name] = new_name
+                full["Name"] = new_name
+            styles[full["Name"]] = full
+        for event in _parse_entries(
+            sections.get("[events]", []), ("Dialogue", "Comment"), EVENT_FIELDS
+        ):
+            start = ASS_TIME.match(event.get("Start", ""))
+            end = ASS_TIME.match(event.get("End", ""))
+            if not start or not end:
+                continue
+            style = event.get("Style", "Default").lstrip("*")
+            events.append(
+                (
+                    _ms(*start.groups()) + shift,
+                    event["_kind"],
+                    event.get("Layer", "0"),
+                    _ms(*end.groups()) + shift,
+                    renames.get(style, style),
+                    event.get("Text", ""),
+                    event,
+                )
+            )
+    events.sort(key=lambda e: e[0])
+    with open(out_file, "w", encoding="utf-8") as out:
+        out.write("\n".join(script_info or DEFAULT_SCRIPT_INFO) + "\n\n")
+        out.write("[V4+ Styles]\n")
+        out.write("Format: " + ", ".join(STYLE_FIELDS) + "\n")
+        for style in styles.values():
+            out.write("Style: " + ",".join(style[f] for f in STYLE_FIELDS) + "\n")
+        out.write("\n[Events]\n")
+        out.write("Format: " + ", ".join(EVENT_FIELDS) + "\n")
+        for event in events:
+            start, kind, layer, end, style, text = event[:6]
+            extra = event[6] if len(event) > 6 else {}
+            values = [
+                layer,
+                ass_time(start),
+                ass_time(end),
+                style,
+                extra.get("Name", ""),
+                extra.get("MarginL", "0"),
+                extra.get("MarginR", "0"),
+                extra.get("MarginV", "0"),
+                extra.get("Effect", ""),
+                text,
+            ]
+            out.write(f"{kind}: " + ",".join(values) + "\n")
+    LOGGER.info(f"Merged {len(events)} events and {len(styles)} styles into {out_file}")
+    return out_file
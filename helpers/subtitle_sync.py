@@ -0,0 +1,237 @@
+# subtitle_sync.py - Moves subtitle cues onto the speech found in the audio track
+import asyncio
+import os
+import re
+
+import numpy as np
+
+from __init__ import LOGGER
+from helpers.ffmpeg_runner import run_ffmpeg_stream
+from helpers.probe import get_streams, probe_async
+from helpers.subtitle_merger import (
+    ASS_TIME,
+    SRT_TIMING,
+    TEXT_SUBTITLE_FORMATS,
+    _ms,
+    ass_time,
+    iter_srt,
+    read_text,
+    srt_time,
+)
+
+VAD_SAMPLE_RATE = 8000
+VAD_FRAME = 80  # Samples per 10 ms analysis frame
+FRAMES_PER_SECOND = VAD_SAMPLE_RATE // VAD_FRAME
+SPEECH_BAND = (300, 3000)  # Hz, where voices carry their energy
+SPEECH_MIN_BAND_RATIO = 0.5  # Share of the frame energy inside the band
+SYNC_MAX_OFFSET = 30.0  # Seconds searched in both directions
+SYNC_MIN_OFFSET = 0.1  # Smaller shifts are left alone
+SYNC_MIN_CONFIDENCE = 8.0  # Peak height in robust deviations of the correlation
+# Frame rate conversions behind subtitles that drift apart over the film
+DRIFT_RATIOS = (25 / 23.976, 23.976 / 25, 24 / 23.976, 23.976 / 24, 25 / 24, 24 / 25)
+DRIFT_MIN_GAIN = 1.1  # A drift must beat the plain shift by this factor
+
+# "Dialogue: 0,0:00:01.00,0:00:02.50,Default,..." -> prefix, start, end, rest
+_ASS_EVENT = re.compile(r"^((?:Dialogue|Comment):\s*[^,]*,)([^,]*),([^,]*)(,.*)$")
+
+
+class SpeechEnvelope(object):
+    """
+    Voice activity of a PCM stream, fed in chunks.
+
+    Only two floats per 10 ms frame are kept (speech band level and its
+    share of the frame energy), so a 3 hour film needs a few MB instead of
+    its whole decoded audio.
+    """
+
+    def __init__(self):
+        bins = np.fft.rfftfreq(VAD_FRAME, 1 / VAD_SAMPLE_RATE)
+        self.band = (bins >= SPEECH_BAND[0]) & (bins <= SPEECH_BAND[1])
+        self.levels = []
+        self.ratios = []
+
+    def feed(self, chunk: bytes):
+        samples = np.frombuffer(chunk, dtype="<i2").astype(np.float32)
+        frames = samples[: len(samples) // VAD_FRAME * VAD_FRAME].reshape(-1, VAD_FRAME)
+        power = np.abs(np.fft.rfft(frames, axis=1)) ** 2
+        band = power[:, self.band].sum(axis=1)
+        total = power.sum(axis=1) + 1e-9
+        self.levels.append(10 * np.log10(band + 1e-9).astype(np.float32))
+        self.ratios.append((band / total).astype(np.float32))
+
+    def speech(self) -> np.ndarray:
+        """Speech flag per frame, the level threshold adapts to the mix"""
+        if not self.levels:
+            return np.zeros(0, dtype=np.float32)
+        levels = np.concatenate(self.levels)
+        ratios = np.concatenate(self.ratios)
+        floor, loud = np.percentile(levels, (10, 95))
+        threshold = floor + 0.4 * (loud - floor)
+        return ((levels > threshold) & (ratios > SPEECH_MIN_BAND_RATIO)).astype(np.float32)
+
+
+async def speech_envelope(path: str) -> np.ndarray:
+    """Speech flag per 10 ms of the first audio stream of `path`"""
+    envelope = SpeechEnvelope()
+    cmd = [
+        "ffmpeg",
+        "-hide_banner",
+        "-i",
+        path,
+        "-map",
+        "0:a:0",
+        "-vn",
+        "-sn",
+        "-ac",
+        "1",
+        "-ar",
+        str(VAD_SAMPLE_RATE),
+        "-f",
+        "s16le",
+        "-",
+    ]
+    returncode, _ = await run_ffmpeg_stream(cmd, envelope.feed, frame_bytes=VAD_FRAME * 2)
+    if returncode != 0:
+        return np.zeros(0, dtype=np.float32)
+    return envelope.speech()
+
+
+def read_cues(text: str, ext: str) -> list:
+    """(start_ms, end_ms) of every cue of an SRT or ASS/SSA script"""
+    if ext == "srt":
+        return [(start, end) for start, end, _ in iter_srt(text)]
+    cues = []
+    for line in text.splitlines():
+        match = _ASS_EVENT.match(line.strip())
+        if not match or not line.lstrip().startswith("Dialogue"):
+            continue
+        start, end = ASS_TIME.match(match.group(2)), ASS_TIME.match(match.group(3))
+        if start and end:
+            cues.append((_ms(*start.groups()), _ms(*end.groups())))
+    return cues
+
+
+def cue_mask(cues: list, frames: int, ratio: float = 1.0) -> np.ndarray:
+    """Cue coverage per 10 ms frame, with timings scaled by `ratio`"""
+    mask = np.zeros(frames, dtype=np.float32)
+    if not cues:
+        return mask
+    spans = np.array(cues, dtype=np.float64) * ratio * FRAMES_PER_SECOND / 1000
+    spans = np.clip(spans.astype(np.int64), 0, frames)
+    # Cumulative sum of +1/-1 edges paints every span in one pass
+    edges = np.zeros(frames + 1, dtype=np.float32)
+    np.add.at(edges, spans[:, 0], 1)
+    np.add.at(edges, spans[:, 1], -1)
+    return (np.cumsum(edges[:-1]) > 0).astype(np.float32)
+
+
+def best_offset(speech: np.ndarray, mask: np.ndarray, max_frames: int):
+    """
+    Shift of `mask` that lines it up best with `speech`, by FFT
+    cross-correlation restricted to +-`max_frames`.
+
+    returns: (frames to delay the cues by, peak score, confidence)
+    """
+    size = 1 << (len(speech) + len(mask) - 1).bit_length()
+    corr = np.fft.irfft(
+        np.fft.rfft(speech - speech.mean(), size) * np.conj(np.fft.rfft(mask, size)), size
+    )
+    limit = min(max_frames, size // 2 - 1)
+    window = np.concatenate((corr[-limit:], corr[: limit + 1]))
+    peak = int(np.argmax(window))
+    # Median and MAD, the peak and its shoulders must not inflate the spread
+    median = float(np.median(window))
+    spread = 1.4826 * float(np.median(np.abs(window - median)))
+    confidence = (float(window[peak]) - median) / spread if spread > 0 else 0.0
+    return peak - limit, float(window[peak]), confidence
+
+
+def shift_text(text: str, ext: str, ratio: float, offset_ms: int) -> str:
+    """Rewrites every cue time t of a script as t * ratio + offset"""
+
+    def moved(ms: int) -> int:
+        return int(round(ms * ratio)) + offset_ms
+
+    if ext == "srt":
+
+        def _srt(match):
+            g = match.groups()
+            return f"{srt_time(moved(_ms(*g[:4])))} --> {srt_time(moved(_ms(*g[4:])))}"
+
+        return SRT_TIMING.sub(_srt, text)
+    lines = []
+    for line in text.splitlines():
+        match = _ASS_EVENT.match(line)
+        start = match and ASS_TIME.match(match.group(2))
+        end = match and ASS_TIME.match(match.group(3))
+        if start and end:
+            line = (
+                f"{match.group(1)}{ass_time(moved(_ms(*start.groups())))},"
+                f"{ass_time(moved(_ms(*end.groups())))}{match.group(4)}"
+            )
+        lines.append(line)
+    return "\n".join(lines) + "\n"
+
+
+def fit_timing(speech: np.ndarray, cues: list):
+    """
+    Best linear map of the cue times onto `speech`: a plain shift, or a
+    shift plus one of the usual frame rate conversion ratios when that
+    matches clearly better.
+
+    returns: (ratio, offset in frames, confidence)
+    """
+    max_frames = int(SYNC_MAX_OFFSET * FRAMES_PER_SECOND)
+    ratio = 1.0
+    offset, score, confidence = best_offset(speech, cue_mask(cues, len(speech)), max_frames)
+    for candidate in DRIFT_RATIOS:
+        c_offset, c_score, c_confidence = best_offset(
+            speech, cue_mask(cues, len(speech), candidate), max_frames
+        )
+        if c_score > score * DRIFT_MIN_GAIN:
+            ratio, offset, score, confidence = candidate, c_offset, c_score, c_confidence
+    return ratio, offset, confidence
+
+
+async def sync_subtitle(video_path: str, sub_path: str) -> bool:
+    """
+    Shifts, and if needed stretches, the cues of `sub_path` so they fall on
+    the speech of `video_path`'s first audio track. The file is rewritten in
+    place as UTF-8; nothing changes when no confident match is found.
+
+    Parameters:
+    - `video_path`: Video (or audio) file the subtitle belongs to.
+    - `sub_path`: SRT, ASS or SSA file.
+
+    returns: True when the timings were changed
+    """
+    ext = os.path.splitext(sub_path)[1].lstrip(".").lower()
+    if ext not in TEXT_SUBTITLE_FORMATS:
+        return False
+    if not get_streams(await probe_async(video_path), "audio"):
+        return False
+    text = read_text(sub_path)
+    cues = read_cues(text, ext)
+    if not cues:
+        return False
+    speech = await speech_envelope(video_path)
+    if not len(speech) or not speech.any():
+        LOGGER.info(f"No speech found in {video_path}, {sub_path} left as is")
+        return False
+    # A few FFTs over hours of frames, keep them off the event loop
+    ratio, offset, confidence = await asyncio.get_running_loop().run_in_executor(
+        None, fit_timing, speech, cues
+    )
+    if confidence < SYNC_MIN_CONFIDENCE:
+        LOGGER.info(f"No reliable sync for {sub_path} (confidence {confidence:.1f})")
+        return False
+    offset_ms = offset * 1000 // FRAMES_PER_SECOND
+    if ratio == 1.0 and abs(offset_ms) < SYNC_MIN_OFFSET * 1000:
+        return False
+    LOGGER.info(
+        f"Syncing {sub_path}: {offset_ms:+d} ms, ratio {ratio:.5f} "
+        f"(confidence {confidence:.1f})"
+    )
+    with open(sub_path, "w", encoding="utf-8") as f:
+        f.write(shift_text(text, ext, ratio, offset_ms))
+    return True
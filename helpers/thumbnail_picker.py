@@ -0,0 +1,112 @@
+# thumbnail_picker.py - Picks a representative frame for the upload thumbnail
+import numpy as np
+
+from __init__ import LOGGER
+from helpers.ffmpeg_runner import run_ffmpeg_pipe
+from helpers.probe import KeyframeIndex, cached_keyframe_index, keyframe_packets_async
+
+PICK_CANDIDATES = 8  # Keyframes scored per video
+PICK_WIDTH = 160  # Scoring resolution, plenty for brightness and blur
+PICK_HEIGHT = 90
+MIN_BRIGHTNESS = 24  # Mean luma below this is a black/fade frame
+MAX_BRIGHTNESS = 232  # Mean luma above this is a white flash
+SKIP_EDGES = 0.05  # Ignore the first/last 5%, usually logos and credits
+PICK_WINDOW = 10  # Seconds read before every candidate to find its keyframe
+
+
+def score_frames(frames: np.ndarray) -> np.ndarray:
+    """
+    Scores a stack of grayscale frames shaped (n, height, width).
+
+    Combines contrast (luma standard deviation) and sharpness (variance of
+    the Laplacian); black, washed out and flat frames get -inf.
+
+    returns: Score per frame, higher is better
+    """
+    f = frames.astype(np.float32)
+    brightness = f.mean(axis=(1, 2))
+    contrast = f.std(axis=(1, 2))
+    laplacian = (
+        f[:, :-2, 1:-1]
+        + f[:, 2:, 1:-1]
+        + f[:, 1:-1, :-2]
+        + f[:, 1:-1, 2:]
+        - 4 * f[:, 1:-1, 1:-1]
+    )
+    sharpness = laplacian.var(axis=(1, 2))
+    score = np.log1p(sharpness) + np.log1p(contrast)
+    unusable = (brightness < MIN_BRIGHTNESS) | (brightness > MAX_BRIGHTNESS) | (contrast < 1)
+    score[unusable] = -np.inf
+    return score
+
+
+async def _candidate_times(video_file: str, targets: list, interval: float) -> list:
+    """
+    Keyframe at or before each target, so every seek decodes one frame.
+    A full index built earlier is reused, otherwise only a short window
+    before every target is read. Targets without a keyframe stay as they are.
+    """
+    index = cached_keyframe_index(video_file)
+    if index is None:
+        window = min(PICK_WINDOW, interval)
+        index = KeyframeIndex.from_packets(
+            *await keyframe_packets_async(video_file, [(t - window, t) for t in targets])
+        )
+    times = []
+    for t in targets:
+        keyframe = index.at_or_before(t)
+        if keyframe is None or t - keyframe > interval:
+            keyframe = t
+        if keyframe not in times:
+            times.append(keyframe)
+    return times
+
+
+async def pick_thumbnail_time(video_file: str, duration: float):
+    """
+    Decodes a few evenly spaced keyframes at low resolution in one FFmpeg
+    run, one seeking input per keyframe, and returns the timestamp of the
+    best looking one.
+
+    returns: Timestamp in seconds, None if no frame could be scored
+    """
+    if not duration or duration <= 0:
+        return None
+    start = duration * SKIP_EDGES
+    interval = duration * (1 - 2 * SKIP_EDGES) / PICK_CANDIDATES
+    targets = [start + interval * (k + 0.5) for k in range(PICK_CANDIDATES)]
+    times = await _candidate_times(video_file, targets, interval)
+    cmd = ["ffmpeg", "-hide_banner"]
+    for t in times:
+        cmd += ["-ss", f"{t:.3f}", "-i", video_file]
+    graph = [
+        f"[{n}:v:0]trim=end_frame=1,scale={PICK_WIDTH}:{PICK_HEIGHT},format=gray,setsar=1[v{n}]"
+        for n in range(len(times))
+    ]
+    labels = "".join(f"[v{n}]" for n in range(len(times)))
+    graph.append(f"{labels}concat=n={len(times)}:v=1:a=0[out]")
+    cmd += [
+        "-filter_complex",
+        ";".join(graph),
+        "-map",
+        "[out]",
+        "-fps_mode",
+        "passthrough",
+        "-f",
+        "rawvideo",
+        "-",
+    ]
+    returncode, raw, _ = await run_ffmpeg_pipe(cmd)
+    frame_size = PICK_WIDTH * PICK_HEIGHT
+    count = min(len(raw) // frame_size, len(times))
+    if returncode != 0 or count == 0:
+        LOGGER.warning(f"Unable to sample frames of {video_file}")
+        return None
+    frames = np.frombuffer(raw[: count * frame_size], dtype=np.uint8)
+    scores = score_frames(frames.reshape(count, PICK_HEIGHT, PICK_WIDTH))
+    best = int(np.argmax(scores))
+    if not np.isfinite(scores[best]):
+        LOGGER.info(f"No usable keyframe in {video_file}, using the middle")
+        return None
+    LOGGER.info(f"Thumbnail frame at {times[best]:.2f}s (score {scores[best]:.2f})")
+    return times[best]
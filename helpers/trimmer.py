@@ -0,0 +1,244 @@
+# trimmer.py - Cuts a time range out of a video without a full re-encode
+import os
+import re
+
+from __init__ import LOGGER
+from helpers.concat_planner import (
+    CONFORM_CRF,
+    CONFORM_PRESET,
+    H264_PROFILES,
+    VIDEO_ENCODERS,
+)
+from helpers.ffmpeg_runner import run_ffmpeg
+from helpers.probe import (
+    KeyframeIndex,
+    cached_keyframe_index,
+    get_duration,
+    get_streams,
+    keyframe_index_async,
+    keyframe_packets_async,
+    probe_async,
+)
+
+KEYFRAME_EPSILON = 0.001  # A cut this close to a keyframe needs no encode
+KEYFRAME_WINDOW = 30  # Seconds read around every cut to find its keyframes
+# Codecs whose pieces are joined as Annex B so parameter sets travel in-band
+ANNEXB_CODECS = ("h264", "hevc")
+
+_TIMESTAMP = re.compile(r"^(?:(\d+):)?(?:(\d+):)?(\d+(?:\.\d+)?)$")
+
+
+def parse_timestamp(value: str) -> float:
+    """
+    Parses `SS`, `MM:SS` or `HH:MM:SS`, each with optional fractions.
+
+    returns: Seconds, None if `value` is not a timestamp
+    """
+    match = _TIMESTAMP.match(value.strip())
+    if not match:
+        return None
+    parts = [p for p in match.groups() if p is not None]
+    seconds = 0.0
+    for part in parts:
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+
+async def _find_keyframes(src: str, cuts: list) -> KeyframeIndex:
+    """
+    Keyframes around the cut points. A full index built earlier is reused,
+    otherwise only windows around the cuts are read, the full index being
+    the fallback for GOPs longer than the window.
+    """
+    index = cached_keyframe_index(src)
+    if index is not None:
+        return index
+    index = KeyframeIndex.from_packets(
+        *await keyframe_packets_async(
+            src, [(t - KEYFRAME_WINDOW, t + KEYFRAME_WINDOW) for t in cuts]
+        )
+    )
+    if all(index.at_or_before(t, KEYFRAME_EPSILON) is not None for t in cuts):
+        return index
+    return await keyframe_index_async(src)
+
+
+def _video_args(video: dict) -> list:
+    """Encoder options that reproduce the source video layout"""
+    codec = video["codec_name"]
+    args = ["-c:v", VIDEO_ENCODERS[codec]]
+    if codec in ("h264", "hevc"):
+        args += ["-preset", CONFORM_PRESET, "-crf", CONFORM_CRF]
+    if codec == "h264" and video.get("profile") in H264_PROFILES:
+        args += ["-profile:v", H264_PROFILES[video["profile"]]]
+    if video.get("pix_fmt"):
+        args += ["-pix_fmt", video["pix_fmt"]]
+    return args
+
+
+async def _copy_range(src: str, out: str, start: float, end: float, maps: list) -> bool:
+    cmd = [
+        "ffmpeg",
+        "-hide_banner",
+        "-y",
+        "-ss",
+        f"{start:.6f}",
+        "-i",
+        src,
+        "-t",
+        f"{end - start:.6f}",
+    ]
+    cmd += maps + ["-c", "copy", "-avoid_negative_ts", "make_zero", out]
+    returncode, _ = await run_ffmpeg(cmd)
+    return returncode == 0 and os.path.exists(out)
+
+
+async def _encode_range(
+    src: str, out: str, start: float, end: float, video_args: list
+) -> bool:
+    # Input seeking while transcoding is frame accurate
+    cmd = [
+        "ffmpeg",
+        "-hide_banner",
+        "-y",
+        "-ss",
+        f"{start:.6f}",
+        "-i",
+        src,
+        "-t",
+        f"{end - start:.6f}",
+        "-map",
+        "0:v:0",
+    ]
+    cmd += video_args + ["-an", "-sn", out]
+    returncode, _ = await run_ffmpeg(cmd)
+    return returncode == 0 and os.path.exists(out)
+
+
+async def trim_video(
+    src: str, out: str, start: float, end: float = None, exact: bool = False
+) -> float:
+    """
+    Cuts `start`..`end` out of `src` using stream copy.
+
+    By default the cut snaps back to the keyframe at or before `start`, so
+    the clip may begin up to one GOP early. With `exact` the partial GOPs at
+    both boundaries are re-encoded with matching parameters and joined to
+    the copied middle, audio and subtitles are copied for the exact range.
+
+    Parameters:
+    - `src`: Input file.
+    - `out`: Output file, its extension picks the container.
+    - `start`: Cut start in seconds.
+    - `end`: Cut end in seconds, None for the end of the file.
+    - `exact`: Re-encode boundary GOPs for a frame accurate cut.
+
+    returns: Time of `src` the written clip starts at, the snapped keyframe
+    unless `exact`; None on failure
+    """
+    data = await probe_async(src)
+    duration = get_duration(data)
+    start = max(0.0, start)
+    if end is None or end <= 0 or (duration and end > duration):
+        end = duration
+    if end <= start:
+        LOGGER.error(f"Empty trim range {start}-{end} for {src}")
+        return None
+    keyframes = await _find_keyframes(src, [start, end])
+    if not len(keyframes):
+        LOGGER.warning(f"No keyframes found in {src}, copying from {start}")
+        return start if await _copy_range(src, out, start, end, ["-map", "0"]) else None
+
+    videos = get_streams(data, "video")
+    codec = videos[0].get("codec_name") if videos else None
+    if exact and codec not in VIDEO_ENCODERS:
+        LOGGER.warning(f"No encoder for {codec}, trimming {src} at keyframes")
+        exact = False
+    if not exact:
+        cut = keyframes.at_or_before(start, KEYFRAME_EPSILON) or 0.0
+        LOGGER.info(f"Trimming {src} from keyframe {cut:.3f}s to {end:.3f}s")
+        return cut if await _copy_range(src, out, cut, end, ["-map", "0"]) else None
+
+    # head [start, body_start) encoded, body copied, tail [body_end, end) encoded
+    body_start = keyframes.at_or_after(start, KEYFRAME_EPSILON)
+    body_end = end
+    if end < duration - KEYFRAME_EPSILON:
+        body_end = keyframes.at_or_before(end, KEYFRAME_EPSILON)
+    if body_start is None or body_end is None or body_end <= body_start:
+        # The range lies inside one GOP, encoding all of it is cheapest
+        body_start = body_end = end
+    stem = os.path.splitext(out)[0]
+    piece_ext = "ts" if codec in ANNEXB_CODECS else "mkv"
+    video_args = _video_args(videos[0])
+    pieces = []
+    if body_start - start > KEYFRAME_EPSILON:
+        head = f"{stem}.head.{piece_ext}"
+        if not await _encode_range(src, head, start, body_start, video_args):
+            return None
+        pieces.append(head)
+    if body_end - body_start > KEYFRAME_EPSILON:
+        body = f"{stem}.body.{piece_ext}"
+        if not await _copy_range(src, body, body_start, body_end, ["-map", "0:v:0"]):
+            return None
+        pieces.append(body)
+    if end - body_end > KEYFRAME_EPSILON:
+        tail = f"{stem}.tail.{piece_ext}"
+        if not await _encode_range(src, tail, body_end, end, video_args):
+            return None
+        pieces.append(tail)
+    LOGGER.info(
+        f"Trimming {src}: encode {body_start - start:.2f}s + "
+        f"{end - body_end:.2f}s, copy {body_end - body_start:.2f}s"
+    )
+
+    pieces_list = f"{stem}.pieces.txt"
+    with open(pieces_list, "w") as _list:
+        _list.write(
+            "\n".join("file '" + os.path.abspath(p).replace("'", "'\\''") + "'" for p in pieces)
+        )
+    cmd = [
+        "ffmpeg",
+        "-hide_banner",
+        "-y",
+        "-f",
+        "concat",
+        "-safe",
+        "0",
+        "-i",
+        pieces_list,
+        "-ss",
+        f"{start:.6f}",
+        "-t",
+        f"{end - start:.6f}",
+        "-i",
+        src,
+        "-map",
+        "0:v:0",
+        "-map",
+        "1:a?",
+        "-map",
+        "1:s?",
+        "-c",
+        "copy",
+        out,
+    ]
+    returncode, _ = await run_ffmpeg(cmd)
+    for piece in pieces + [pieces_list]:
+        if os.path.exists(piece):
+            os.remove(piece)
+    return start if returncode == 0 and os.path.exists(out) else None
+
+
+async def trim_subtitle(src: str, out: str, start: float, end: float = None) -> bool:
+    """
+    Shifts and cuts a subtitle file to match a trimmed video, `start` being
+    the clip start returned by `trim_video`, which may well be 0.0.
+
+    returns: True once `out` is written
+    """
+    cmd = ["ffmpeg", "-hide_banner", "-y", "-ss", f"{start:.6f}"]
+    if end is not None:
+        cmd += ["-t", f"{end - start:.6f}"]
+    cmd += ["-i", src, out]
+    returncode, _ = await run_ffmpeg(cmd)
+    return returncode == 0 and os.path.exists(out)
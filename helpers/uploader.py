@@ -2,15 +2,22 @@
 # Fixed GoFile uploading issues and improved error handling
 
 import os
+import math
 import time
 import asyncio
 import aiohttp
 from aiohttp import ClientSession, ClientTimeout, FormData
 from random import choice
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type, RetryError
+from pyrogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 from config import Config
 from __init__ import LOGGER
 from helpers.utils import get_readable_file_size, get_readable_time
+from helpers.ffmpeg_helper import get_video_thumbnail
+from helpers.probe import get_duration, probe_async
+from helpers.compressor import compress_to_size, estimate_compression
+from helpers.previewer import make_preview
+from helpers.splitter import SPLIT_HEADROOM, split_by_size
 
 # GoFile Configuration - FIXED VALUES
 GOFILE_CHUNK_SIZE = 8192 * 1024  # 8MB chunks
@@ -19,6 +26,9 @@ GOFILE_RETRY_ATTEMPTS = 3
 GOFILE_RETRY_WAIT_MIN = 2
 GOFILE_RETRY_WAIT_MAX = 10
 
+# Seconds to wait for the split/compress answer before splitting
+OVERSIZE_CHOICE_TIMEOUT = 120
+
 def get_human_readable_size(size_bytes):
     """Convert bytes to human readable format"""
     return get_readable_file_size(size_bytes)
@@ -386,6 +396,158 @@ async def uploadVideo(c, cb, merged_video_path, width, height, duration, video_t
             pass
         return False
 
+async def uploadAudio(c, cb, merged_audio_path, duration, file_size, title=None):
+    """Upload a joined audio file as Telegram audio, no thumbnail or probing needed"""
+    try:
+        caption = f"🎧 **Joined Audio**\n\n" \
+                  f"📁 **File:** `{os.path.basename(merged_audio_path)}`\n" \
+                  f"📊 **Size:** `{get_readable_file_size(file_size)}`\n" \
+                  f"⏱ **Duration:** `{get_readable_time(duration)}`\n\n" \
+                  f"🤖 **Bot:** @{Config.OWNER_USERNAME}"
+        await cb.message.edit("📤 **Uploading as Audio...**")
+        sent_message = await c.send_audio(
+            chat_id=cb.from_user.id,
+            audio=merged_audio_path,
+            duration=int(duration),
+            title=title,
+            caption=caption,
+            progress=upload_progress,
+            progress_args=(cb.message, "📤 **Uploading Audio...**", time.time())
+        )
+        if Config.LOGCHANNEL:
+            try:
+                await sent_message.copy(chat_id=int(Config.LOGCHANNEL))
+            except Exception as e:
+                LOGGER.error(f"Failed to send to log channel: {e}")
+        return True
+    except Exception as e:
+        LOGGER.error(f"Audio upload failed: {e}")
+        try:
+            await cb.message.edit(f"❌ **Upload Failed!**\n\n🚨 **Error:** `{str(e)}`")
+        except:
+            pass
+        return False
+
+async def uploadPreview(c, cb, merged_video_path, file_size):
+    """
+    Send a sample clip and contact sheet of the merge, a few MB at most.
+
+    The preview is optional: any failure is logged and False returned, so
+    the merge goes on with the normal upload.
+    """
+    user_id = cb.from_user.id
+    await cb.message.edit("🎞 **Creating Preview...**")
+    try:
+        duration = get_duration(await probe_async(merged_video_path))
+        clip, sheet, clip_duration = await make_preview(
+            merged_video_path, os.path.dirname(merged_video_path)
+        )
+    except Exception as e:
+        LOGGER.error(f"Preview creation failed: {e}")
+        clip = None
+    if clip is None:
+        await cb.message.edit("⚠️ **Preview failed, continuing...**")
+        return False
+    try:
+        caption = f"🎞 **Preview**\n\n" \
+                  f"📁 **File:** `{os.path.basename(merged_video_path)}`\n" \
+                  f"📊 **Size:** `{get_readable_file_size(file_size)}`\n" \
+                  f"⏱ **Duration:** `{get_readable_time(duration)}`"
+        await c.send_photo(chat_id=user_id, photo=sheet, caption=caption)
+        await c.send_video(
+            chat_id=user_id,
+            video=clip,
+            duration=int(clip_duration),
+            supports_streaming=True,
+        )
+        return True
+    except Exception as e:
+        LOGGER.error(f"Preview upload failed: {e}")
+        return False
+    finally:
+        for path in (clip, sheet):
+            if os.path.exists(path):
+                os.remove(path)
+
+async def uploadVideoParts(c, cb, parts, upload_mode):
+    """Upload the parts of a split video in order, each with its own thumbnail"""
+    total = len(parts)
+    for n, part in enumerate(parts, start=1):
+        await cb.message.edit(f"📤 **Uploading Part {n}/{total}...**")
+        duration = int(get_duration(await probe_async(part))) or 1
+        thumb, width, height = await get_video_thumbnail(
+            part, os.path.dirname(part), duration
+        )
+        uploaded = await uploadVideo(
+            c=c,
+            cb=cb,
+            merged_video_path=part,
+            width=width,
+            height=height,
+            duration=duration,
+            video_thumbnail=thumb,
+            file_size=os.path.getsize(part),
+            upload_mode=upload_mode,
+        )
+        if not uploaded:
+            LOGGER.error(f"Upload of part {n}/{total} failed, stopping")
+            return False
+    return True
+
+async def ask_oversize_choice(cb, file_size, upload_limit, estimate):
+    """Show projected split/compress results and wait for the user to pick one"""
+    from __init__ import OVERSIZE_CHOICE
+
+    user_id = cb.from_user.id
+    parts = math.ceil(file_size / (upload_limit * SPLIT_HEADROOM))
+    buttons = [[InlineKeyboardButton(f"✂️ Split in {parts} parts", callback_data="oversize_split")]]
+    text = (
+        f"📁 **File is larger than Telegram allows!**\n\n"
+        f"📊 **Size:** `{get_readable_file_size(file_size)}`\n"
+        f"🚫 **Limit:** `{get_readable_file_size(upload_limit)}`\n\n"
+        f"✂️ **Split:** `{parts}` parts, no quality loss, takes seconds\n"
+    )
+    if estimate.feasible:
+        buttons.append([InlineKeyboardButton("🗜 Compress to one file", callback_data="oversize_compress")])
+        text += (
+            f"🗜 **Compress:** ~`{get_readable_file_size(estimate.projected_size)}`"
+            f"{' at 720p' if estimate.scale_height else ''}, "
+            f"~`{get_readable_time(estimate.projected_seconds)}` of encoding\n"
+        )
+    else:
+        text += "🗜 **Compress:** not possible, the bitrate would be too low\n"
+        await cb.message.edit(text)
+        return "split"
+    text += f"\n⏳ Splitting automatically in {OVERSIZE_CHOICE_TIMEOUT}s"
+    future = asyncio.get_running_loop().create_future()
+    OVERSIZE_CHOICE[user_id] = future
+    await cb.message.edit(text, reply_markup=InlineKeyboardMarkup(buttons))
+    try:
+        return await asyncio.wait_for(future, OVERSIZE_CHOICE_TIMEOUT)
+    except asyncio.TimeoutError:
+        return "split"
+    finally:
+        OVERSIZE_CHOICE.pop(user_id, None)
+
+
+async def uploadOversized(c, cb, merged_video_path, file_size, upload_limit, upload_mode):
+    """Let the user split or compress a file above the upload limit, then upload it"""
+    estimate = await estimate_compression(merged_video_path, upload_limit)
+    picked = await ask_oversize_choice(cb, file_size, upload_limit, estimate)
+    if picked == "compress":
+        await cb.message.edit("🗜 **Compressing to fit Telegram...**")
+        compressed = await compress_to_size(
+            merged_video_path, upload_limit, cb.message, estimate
+        )
+        if compressed is not None:
+            return await uploadVideoParts(c, cb, [compressed], upload_mode)
+        await cb.message.edit("❗ Compression did not fit, splitting instead ...")
+    parts = await split_by_size(merged_video_path, upload_limit, cb.message)
+    if parts is None:
+        await cb.message.edit("❌ Failed to split the merged video!")
+        return False
+    return await uploadVideoParts(c, cb, parts, upload_mode)
+
 async def upload_progress(current, total, message, text, start_time):
     """Upload progress callback with better formatting"""
     try:
@@ -19,6 +19,16 @@ def get_readable_file_size(size_in_bytes) -> str:
     except IndexError:
         return "File too large"
 
+def get_path_size(path: str) -> int:
+    """Size of a file, or total size of all files below a directory"""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total_size = 0
+    for root, dirs, files in os.walk(path):
+        for f in files:
+            total_size += os.path.getsize(os.path.join(root, f))
+    return total_size
+
 def get_readable_time(seconds: int) -> str:
     result = ""
     (days, remainder) = divmod(seconds, 86400)
@@ -0,0 +1,127 @@
+# watchdog.py - Supervises child processes (FFmpeg, rclone) so none runs forever
+import asyncio
+import os
+import shutil
+import signal
+import time
+
+from config import Config
+from __init__ import LOGGER
+
+WATCHDOG_INTERVAL = 5  # Seconds between checks
+KILL_GRACE_SECONDS = 5  # Between SIGTERM and SIGKILL of the process group
+CHILD_NICE = 10  # Keeps the bot itself responsive next to heavy jobs
+# Wall-clock budget: a base plus seconds per GB of input
+WALL_BASE_SECONDS = 600
+WALL_SECONDS_PER_GB_COPY = 300
+WALL_SECONDS_PER_GB_ENCODE = 3600
+
+
+def wall_limit(input_bytes: int, encode: bool = True) -> float:
+    per_gb = WALL_SECONDS_PER_GB_ENCODE if encode else WALL_SECONDS_PER_GB_COPY
+    return WALL_BASE_SECONDS + input_bytes / 1024**3 * per_gb
+
+
+def limit_child():
+    """
+    `preexec_fn` for supervised children: lower CPU priority and cap the
+    address space at `FFMPEG_MEMORY_LIMIT_MB`. The process group comes from
+    `start_new_session=True`, so the whole tree can be killed at once.
+    """
+    try:
+        os.nice(CHILD_NICE)
+    except OSError:
+        pass
+    if Config.FFMPEG_MEMORY_LIMIT_MB > 0:
+        try:
+            import resource
+
+            limit = Config.FFMPEG_MEMORY_LIMIT_MB * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        except (ImportError, ValueError, OSError):
+            pass
+
+
+def ionice_prefix() -> list:
+    """Runs the child in the best-effort class at the lowest I/O priority"""
+    if shutil.which("ionice"):
+        return ["ionice", "-c", "2", "-n", "7"]
+    return []
+
+
+def read_bytes(pid: int):
+    """Bytes the process read so far (`rchar` of /proc/<pid>/io), None if unknown"""
+    try:
+        with open(f"/proc/{pid}/io") as f:
+            for line in f:
+                if line.startswith("rchar:"):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def kill_group(pid: int, sig=signal.SIGTERM):
+    try:
+        os.killpg(os.getpgid(pid), sig)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+class Watchdog(object):
+    """
+    Kills a process group that stops making progress or runs too long.
+
+    The owner calls `touch()` whenever it sees progress and runs `watch()`
+    next to the process; `reason` holds the failure text once it fired.
+    `activity`, when given, returns a counter that grows while the process
+    works (e.g. bytes read), any change of it also counts as progress.
+    """
+
+    def __init__(
+        self, name: str, pid: int, alive, stall_seconds: float, wall_seconds: float, activity=None
+    ):
+        self.name = name
+        self.pid = pid
+        self.alive = alive  # Callable, False once the process exited
+        self.stall_seconds = stall_seconds
+        self.wall_seconds = wall_seconds
+        self.activity = activity
+        self.last_activity = None
+        self.started = time.monotonic()
+        self.last_progress = self.started
+        self.reason = None
+
+    def touch(self):
+        self.last_progress = time.monotonic()
+
+    def _check(self):
+        if self.activity is not None:
+            current = self.activity()
+            if current is not None and current != self.last_activity:
+                self.last_activity = current
+                self.touch()
+        now = time.monotonic()
+        if now - self.last_progress > self.stall_seconds:
+            return f"{self.name} stalled, no progress for {int(now - self.last_progress)}s"
+        if now - self.started > self.wall_seconds:
+            return f"{self.name} exceeded its time limit of {int(self.wall_seconds)}s"
+        return None
+
+    async def watch(self):
+        while self.alive():
+            await asyncio.sleep(WATCHDOG_INTERVAL)
+            if not self.alive():
+                break
+            reason = self._check()
+            if reason is None:
+                continue
+            self.reason = reason
+            LOGGER.error(f"Killing pid {self.pid}: {reason}")
+            kill_group(self.pid)
+            deadline = time.monotonic() + KILL_GRACE_SECONDS
+            while self.alive() and time.monotonic() < deadline:
+                await asyncio.sleep(0.5)
+            if self.alive():
+                kill_group(self.pid, signal.SIGKILL)
+            break
@@ -11,7 +11,7 @@ from bot import UPLOAD_AS_DOC, UPLOAD_TO_DRIVE, delete_all, formatDB, gDict, que
 from config import Config
 from helpers.utils import UserSettings
 from plugins.mergeVideo import mergeNow
-from __init__ import MERGE_MODE
+from __init__ import MERGE_MODE, OVERSIZE_CHOICE, PREVIEW_MODE, TRIM_RANGES
 
 # Import GoFile uploader
 try:
@@ -51,6 +51,12 @@ async def callback_handler(c: Client, cb: CallbackQuery):
         elif data.startswith("gofile"):
             await handle_gofile_toggle(cb, data, user_id)
 
+        elif data.startswith("oversize_"):
+            await handle_oversize_choice(cb, data, user_id)
+
+        elif data == "preview_toggle":
+            await handle_preview_toggle(cb, user_id)
+
         elif data == "settings":
             await show_settings_menu(cb, user)
 
@@ -100,6 +106,14 @@ async def callback_handler(c: Client, cb: CallbackQuery):
             await cb.answer("🔍 Mode set: Extract Streams", show_alert=False)
             await show_settings_menu(cb, user)
 
+        elif data == "mode_audio_concat":
+            # Audio + Audio join
+            UPLOAD_TO_DRIVE.setdefault(str(user_id), False)
+            UPLOAD_AS_DOC.setdefault(str(user_id), False)
+            MERGE_MODE[user_id] = 5
+            await cb.answer("🎧 Mode set: Audio + Audio", show_alert=False)
+            await show_settings_menu(cb, user)
+
         elif data == "remove_stream":
             # Remove last added stream from queue
             q = queueDB.get(user_id, {})
@@ -107,6 +121,8 @@ async def callback_handler(c: Client, cb: CallbackQuery):
             if mode in (1,2,3):
                 # Remove last video for video modes
                 q["videos"].pop() if q["videos"] else None
+            elif mode == 5:
+                q["audios"].pop() if q["audios"] else None
             else:
                 # Remove last subtitle/audio for extract mode
                 q["subtitles"].pop() if q["subtitles"] else None
@@ -156,6 +172,8 @@ async def handle_cancel(cb: CallbackQuery, user_id: int):
         if user_id in formatDB:
             formatDB[user_id] = None
 
+        TRIM_RANGES.pop(user_id, None)
+
         if user_id in replyDB:
             del replyDB[user_id]
 
@@ -184,6 +202,13 @@ async def handle_cancel(cb: CallbackQuery, user_id: int):
 async def handle_merge_request(c: Client, cb: CallbackQuery, user_id: int):
     """Handle merge request with better UI"""
     try:
+        if MERGE_MODE.get(user_id) == 5:
+            if len(queueDB.get(user_id, {}).get("audios", [])) < 2:
+                await cb.answer("❌ Send at least 2 audio files to join!", show_alert=True)
+                return
+            await start_merge_process(cb, user_id)
+            return
+
         # Check if user has videos to merge
         if user_id not in queueDB or not queueDB[user_id]["videos"]:
             await cb.answer("❌ No videos found to merge!", show_alert=True)
@@ -265,6 +290,30 @@ async def handle_gofile_toggle(cb: CallbackQuery, data: str, user_id: int):
         LOGGER.error(f"GoFile toggle error: {e}")
         await cb.answer("❌ Error toggling GoFile", show_alert=True)
 
+async def handle_preview_toggle(cb: CallbackQuery, user_id: int):
+    """Cycle the preview setting: off -> before upload -> preview only"""
+    current = PREVIEW_MODE.get(user_id)
+    if current is None:
+        PREVIEW_MODE[user_id] = "before"
+        await cb.answer("🎞 Preview sent before the full file", show_alert=False)
+    elif current == "before":
+        PREVIEW_MODE[user_id] = "only"
+        await cb.answer("🎞 Only the preview is sent", show_alert=False)
+    else:
+        PREVIEW_MODE.pop(user_id, None)
+        await cb.answer("🎞 Preview disabled", show_alert=False)
+    await show_settings_menu(cb, UserSettings(user_id, cb.from_user.first_name))
+
+async def handle_oversize_choice(cb: CallbackQuery, data: str, user_id: int):
+    """Hand the split/compress answer to the waiting merge"""
+    future = OVERSIZE_CHOICE.get(user_id)
+    if future is None or future.done():
+        await cb.answer("⌛ This choice has expired", show_alert=True)
+        return
+    picked = data.split("_", 1)[1]
+    future.set_result(picked)
+    await cb.answer("🗜 Compressing" if picked == "compress" else "✂️ Splitting")
+
 async def handle_rename(cb: CallbackQuery, user_id: int):
     """Handle file renaming"""
     try:
@@ -308,6 +357,10 @@ async def start_merge_with_name(cb: CallbackQuery, user_id: int, file_name: str)
         await cb.message.edit_text("🔄 **Starting merge process...**\n\nPlease wait...")
 
         # Import and call merge function
+        if MERGE_MODE.get(user_id) == 5:
+            from plugins.mergeAudios import mergeAudios
+            await mergeAudios(cb.client, cb, file_name)
+            return
         from plugins.mergeVideo import mergeNow
         await mergeNow(cb.client, cb, file_name)
 
@@ -325,6 +378,9 @@ async def show_settings_menu(cb: CallbackQuery, user: UserSettings):
         # Get current settings
         upload_mode = "Video 📹" if not UPLOAD_AS_DOC.get(str(user.user_id), False) else "Document 📁"
         gofile_status = "✅" if UPLOAD_TO_DRIVE.get(str(user.user_id), False) else "❌"
+        preview_status = {"before": "Before Upload", "only": "Only"}.get(
+            PREVIEW_MODE.get(user.user_id), "❌"
+        )
 
         settings_keyboard = InlineKeyboardMarkup([
             [InlineKeyboardButton(f"📤 Upload As: {upload_mode}", callback_data="toggle_upload_mode")],
@@ -332,10 +388,12 @@ async def show_settings_menu(cb: CallbackQuery, user: UserSettings):
              InlineKeyboardButton("🎵 Video + Audio", callback_data="mode_audio")],
             [InlineKeyboardButton("📝 Video + Subtitle", callback_data="mode_subtitle"),
              InlineKeyboardButton("🔍 Extract", callback_data="mode_extract")],
+            [InlineKeyboardButton("🎧 Audio + Audio", callback_data="mode_audio_concat")],
             [InlineKeyboardButton("🗑️ Remove Stream", callback_data="remove_stream"),
              InlineKeyboardButton("✏️ Rename", callback_data="rename_file")],
             [InlineKeyboardButton("🖼️ Thumbnail ❌", callback_data="thumbnail_toggle")],
             [InlineKeyboardButton(f"🔗 GoFile {gofile_status}", callback_data="gofile_toggle")],
+            [InlineKeyboardButton(f"🎞 Preview: {preview_status}", callback_data="preview_toggle")],
             [InlineKeyboardButton("❌ Close", callback_data="close")]
         ])
 
@@ -346,7 +404,8 @@ async def show_settings_menu(cb: CallbackQuery, user: UserSettings):
 📤 **Upload As:** {upload_mode}
 🚫 **Ban Status:** {"True" if user.banned else "False"} {"❌" if user.banned else "✅"}
 🔗 **GoFile:** {gofile_status}
-📊 **Metadata:** False ❌
+🎞 **Preview:** {preview_status}
+📊 **Metadata:** {user.edit_metadata} {"✅" if user.edit_metadata else "❌"}
 🎭 **Mode:** Video + Video"""
 
         await cb.message.edit_text(settings_text, reply_markup=settings_keyboard)
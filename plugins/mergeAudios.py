@@ -0,0 +1,92 @@
+# mergeAudios.py - Joins queued audio files (chapters, podcast parts) into one
+import asyncio
+import os
+import time
+
+from bot import LOGGER, delete_all, formatDB, gDict, queueDB
+from helpers.display_progress import Progress
+from helpers.ffmpeg_helper import MergeAudios, write_concat_list
+from helpers.probe import get_duration, probe_async
+from helpers.splitter import get_upload_limit
+from helpers.uploader import uploadAudio
+from pyrogram import Client
+from pyrogram.errors import MessageNotModified
+from pyrogram.types import CallbackQuery, Message
+
+
+def _cleanup(user_id: int):
+    delete_all(root=f"downloads/{str(user_id)}")
+    queueDB.update({user_id: {"videos": [], "subtitles": [], "audios": []}})
+    formatDB.update({user_id: None})
+
+
+async def mergeAudios(c: Client, cb: CallbackQuery, new_file_name: str):
+    await cb.message.edit("⭕ Processing...")
+    list_message_ids: list = queueDB.get(cb.from_user.id, {}).get("audios", [])
+    list_message_ids.sort()
+    if len(list_message_ids) < 2:
+        await cb.answer("Send at least 2 audio files", show_alert=True)
+        return
+    if not os.path.exists(f"downloads/{str(cb.from_user.id)}/"):
+        os.makedirs(f"downloads/{str(cb.from_user.id)}/")
+    msgs: list[Message] = await c.get_messages(
+        chat_id=cb.from_user.id, message_ids=list_message_ids
+    )
+    all = len(msgs)
+    n = 1
+    files_list = []
+    for i in msgs:
+        media = i.audio or i.document
+        if media is None:
+            continue
+        # Keep the file name, it becomes the chapter title
+        file_name = media.file_name or f"part_{i.id}.mka"
+        try:
+            c_time = time.time()
+            prog = Progress(cb.from_user.id, c, cb.message)
+            file_dl_path = await c.download_media(
+                message=media,
+                file_name=f"downloads/{str(cb.from_user.id)}/{str(i.id)}/{file_name}",
+                progress=prog.progress_for_pyrogram,
+                progress_args=(f"🚀 Downloading: `{file_name}`", c_time, f"\n**Downloading: {n}/{all}**"),
+            )
+            n += 1
+            if gDict[cb.message.chat.id] and cb.message.id in gDict[cb.message.chat.id]:
+                return
+        except Exception as downloadErr:
+            LOGGER.warning(f"Failed to download Error: {downloadErr}")
+            queueDB.get(cb.from_user.id)["audios"].remove(i.id)
+            await cb.message.edit("❗File Skipped!")
+            await asyncio.sleep(4)
+            continue
+        files_list.append(file_dl_path)
+
+    input_ = f"downloads/{str(cb.from_user.id)}/input.txt"
+    write_concat_list(input_, files_list)
+    joined = await MergeAudios(input_, cb.from_user.id, cb.message)
+    if joined is None:
+        await cb.message.edit("❌ Failed to join audio files !")
+        _cleanup(cb.from_user.id)
+        return
+    try:
+        await cb.message.edit("✅ Sucessfully Joined Audio !")
+    except MessageNotModified:
+        await cb.message.edit("Sucessfully Joined Audio ! ✅")
+    LOGGER.info(f"Audio joined for: {cb.from_user.first_name} ")
+
+    # Keep the container MergeAudios picked for the codec
+    new_file_name = os.path.splitext(new_file_name)[0] + os.path.splitext(joined)[1]
+    os.rename(joined, new_file_name)
+    file_size = os.path.getsize(new_file_name)
+    if file_size > get_upload_limit():
+        await cb.message.edit(
+            "❌ Joined audio is above the Telegram upload limit, send fewer parts."
+        )
+        _cleanup(cb.from_user.id)
+        return
+    duration = get_duration(await probe_async(new_file_name))
+    title = os.path.splitext(os.path.basename(new_file_name))[0]
+    if await uploadAudio(c, cb, new_file_name, duration, file_size, title=title):
+        await cb.message.delete(True)
+    # On failure the status message holds the error, leave it for the user
+    _cleanup(cb.from_user.id)
@@ -1,17 +1,26 @@
 # mergeVideo.py - Modified to use separate downloader.py
 import asyncio
 import os
+import shutil
 import time
-from bot import (LOGGER, UPLOAD_AS_DOC, UPLOAD_TO_DRIVE, delete_all, formatDB,
-                 gDict, queueDB, replyDB)
+from __init__ import PREVIEW_MODE
+from bot import (LOGGER, TRIM_RANGES, UPLOAD_AS_DOC, UPLOAD_TO_DRIVE, delete_all,
+                 formatDB, gDict, queueDB, replyDB)
 from config import Config
-from hachoir.metadata import extractMetadata
-from hachoir.parser import createParser
+from helpers.boundary_detector import find_trim_points
 from helpers.display_progress import Progress
-from helpers.ffmpeg_helper import MergeSub, MergeVideo, take_screen_shot
-from helpers.uploader import uploadVideo
-from helpers.utils import UserSettings
-from PIL import Image
+from helpers.concat_planner import ConcatPlan, plan_concat
+from helpers.fingerprint import (DUPLICATE_DURATION_SECONDS, HEAD_CHUNKS, find_duplicates,
+                                  fingerprint, head_fingerprint)
+from helpers.ffmpeg_helper import (MergeVideo, cult_small_video, get_video_thumbnail,
+                                   write_concat_list)
+from helpers.header_reader import media_duration
+from helpers.probe import get_duration, probe_many
+from helpers.splitter import get_upload_limit
+from helpers.trimmer import trim_subtitle
+from helpers.uploader import uploadOversized, uploadPreview, uploadVideo
+from helpers.utils import UserSettings, get_readable_file_size
+from plugins.metadataEditor import metaEditor
 from pyrogram import Client
 from pyrogram.errors import MessageNotModified
 from pyrogram.errors.rpc_error import UnknownError
@@ -60,9 +69,21 @@ async def mergeNow(c: Client, cb: CallbackQuery, new_file_name: str):
             os.makedirs(f"downloads/{str(cb.from_user.id)}/")
         
         input_ = f"downloads/{str(cb.from_user.id)}/input.txt"
+        head_prints = {}  # Downloaded path -> fingerprint of its first seconds
         all = len(list_message_ids)
         n = 1
         
+        # Inputs judged from their container header while they download
+        early_inputs = []
+        header_probes = []
+        
+        async def inspect_header(path, size):
+            early_inputs.extend((await plan_concat([path], partial=True, sizes=[size])).inputs)
+            LOGGER.info(f"Early plan of user {user_id}: {ConcatPlan(early_inputs).describe()}")
+        
+        def on_header(path, size):
+            header_probes.append(asyncio.create_task(inspect_header(path, size)))
+        
         # Process each video/URL in the queue
         for i in await c.get_messages(
             chat_id=cb.from_user.id, message_ids=list_message_ids):
@@ -82,7 +103,8 @@ async def mergeNow(c: Client, cb: CallbackQuery, new_file_name: str):
                     file_dl_path = await download_from_url(
                         url=i.text,
                         user_id=cb.from_user.id,
-                        status_message=cb.message
+                        status_message=cb.message,
+                        on_header=on_header,
                     )
                     
                     if not file_dl_path:
@@ -94,6 +116,15 @@ async def mergeNow(c: Client, cb: CallbackQuery, new_file_name: str):
                         continue
                 
                 elif media:
+                    # Same episode from another source? Decide from the first chunks
+                    if await is_early_duplicate(c, i, media, vid_list, head_prints):
+                        LOGGER.info(f"Skipping duplicate {media.file_name}")
+                        queueDB.get(cb.from_user.id)["videos"].remove(i.id)
+                        await cb.message.edit(f"♻️ Duplicate of a queued video, skipped: `{media.file_name}`")
+                        await asyncio.sleep(3)
+                        n += 1
+                        continue
+                    
                     # Handle Telegram File
                     await cb.message.edit(f"📥 Downloading TG File ({n}/{all}): `{media.file_name}`")
                     LOGGER.info(f"📥 Starting TG Download: {media.file_name}")
@@ -102,7 +133,8 @@ async def mergeNow(c: Client, cb: CallbackQuery, new_file_name: str):
                     file_dl_path = await download_from_tg(
                         message=i,
                         user_id=cb.from_user.id,
-                        status_message=cb.message
+                        status_message=cb.message,
+                        on_header=on_header,
                     )
                     
                     if not file_dl_path:
@@ -128,6 +160,20 @@ async def mergeNow(c: Client, cb: CallbackQuery, new_file_name: str):
                 
                 await cb.message.edit(f"✅ Downloaded: `{os.path.basename(file_dl_path)}`")
                 LOGGER.info(f"Downloaded Successfully: {os.path.basename(file_dl_path)}")
+                
+                # Stop before the next download when the inputs seen so far
+                # already need more disk than is free
+                await asyncio.gather(*header_probes)
+                early = ConcatPlan(early_inputs)
+                free_space = shutil.disk_usage(f"downloads/{str(cb.from_user.id)}").free
+                if early_inputs and free_space < early.required_space:
+                    await cleanup_user_data(cb.from_user.id)
+                    await cb.message.edit(
+                        f"❌ Not enough disk space to merge!\n\n"
+                        f"Needed: `{get_readable_file_size(early.required_space)}`\n"
+                        f"Free: `{get_readable_file_size(free_space)}`"
+                    )
+                    return
                 await asyncio.sleep(2)
                 
             except UnknownError as e:
@@ -141,7 +187,7 @@ async def mergeNow(c: Client, cb: CallbackQuery, new_file_name: str):
                 continue
             
             # Handle subtitles if present
-            if list_subtitle_ids[sIndex] is not None:
+            if sIndex < len(list_subtitle_ids) and list_subtitle_ids[sIndex] is not None:
                 a = await c.get_messages(
                     chat_id=cb.from_user.id, message_ids=list_subtitle_ids[sIndex]
                 )
@@ -149,39 +195,96 @@ async def mergeNow(c: Client, cb: CallbackQuery, new_file_name: str):
                     message=a,
                     file_name=f"downloads/{str(cb.from_user.id)}/{str(a.id)}/",
                 )
-                LOGGER.info("Got sub: ", a.document.file_name)
-                file_dl_path = await MergeSub(file_dl_path, sub_dl_path, cb.from_user.id)
-                LOGGER.info("Added subs")
+                LOGGER.info(f"Got sub: {a.document.file_name}")
                 sIndex += 1
             
-            # Extract metadata
-            metadata = extractMetadata(createParser(file_dl_path))
-            try:
-                if metadata.has("duration"):
-                    duration += metadata.get("duration").seconds
-                vid_list.append(f"file '{file_dl_path}'")
-            except:
-                await cleanup_user_data(cb.from_user.id)
-                await cb.message.edit("⚠️ Video is corrupted")
-                return
+            # Cut the video to the range set with /trim
+            trim = TRIM_RANGES.get(cb.from_user.id, {}).get(i.id)
+            if trim is not None and trim[0] is None:
+                await cb.message.edit(f"🔎 Finding intro and credits of `{os.path.basename(file_dl_path)}` ...")
+                start, end = await find_trim_points(file_dl_path)
+                trim = None
+                if start is not None or end is not None:
+                    trim = (start or 0.0, end, False)
+            if trim is not None:
+                start, end, exact = trim
+                await cb.message.edit(f"✂️ Trimming `{os.path.basename(file_dl_path)}` ...")
+                trimmed, cut = await cult_small_video(
+                    file_dl_path,
+                    f"{os.path.dirname(file_dl_path)}/trimmed_",
+                    start,
+                    end,
+                    os.path.splitext(file_dl_path)[1].lstrip(".") or "mkv",
+                    exact=exact,
+                )
+                if trimmed is None:
+                    LOGGER.warning(f"Trim failed, using the full {file_dl_path}")
+                else:
+                    file_dl_path = trimmed
+                    if sub_dl_path is not None:
+                        sub_out = f"{os.path.dirname(sub_dl_path)}/trimmed_{os.path.basename(sub_dl_path)}"
+                        # Keyframe trims start early, follow the real cut
+                        if await trim_subtitle(sub_dl_path, sub_out, cut, end):
+                            sub_dl_path = sub_out
+            
+            vid_list.append(file_dl_path)
+            sub_list.append(sub_dl_path)
         
         # Remove duplicates
         _cache = list()
+        _sub_cache = list()
         for i in range(len(vid_list)):
             if vid_list[i] not in _cache:
                 _cache.append(vid_list[i])
+                _sub_cache.append(sub_list[i])
         vid_list = _cache
+        sub_list = _sub_cache
+        
+        # Same content under different files, compared by perceptual fingerprint
+        await cb.message.edit("🔍 Looking for duplicate videos ...")
+        prints = await asyncio.gather(*[fingerprint(p) for p in vid_list])
+        duplicates = find_duplicates(prints)
+        if duplicates:
+            names = "\n".join(
+                f"• `{os.path.basename(vid_list[j])}` = `{os.path.basename(vid_list[k])}`"
+                for j, k in duplicates.items()
+            )
+            LOGGER.info(f"Dropping duplicates of user {cb.from_user.id}: {duplicates}")
+            await cb.message.edit(f"♻️ Skipping duplicate videos:\n{names}")
+            await asyncio.sleep(3)
+            vid_list = [p for j, p in enumerate(vid_list) if j not in duplicates]
+            sub_list = [s for j, s in enumerate(sub_list) if j not in duplicates]
+        
+        # Probe all inputs at once, unreadable ones are corrupted downloads
+        await cb.message.edit("🔍 Checking videos ...")
+        plan = await plan_concat(vid_list)
+        LOGGER.info(f"Inputs of user {cb.from_user.id}:\n{plan.report()}")
+        if plan.unreadable:
+            await cleanup_user_data(cb.from_user.id)
+            await cb.message.edit(f"⚠️ Video is corrupted\n\n{plan.report()}")
+            return
+        free_space = shutil.disk_usage(f"downloads/{str(cb.from_user.id)}").free
+        if free_space < plan.required_space:
+            await cleanup_user_data(cb.from_user.id)
+            await cb.message.edit(
+                f"❌ Not enough disk space to merge!\n\n"
+                f"Needed: `{get_readable_file_size(plan.required_space)}`\n"
+                f"Free: `{get_readable_file_size(free_space)}`"
+            )
+            return
         
         LOGGER.info(f"Trying to merge videos user {cb.from_user.id}")
         await cb.message.edit(f"🔀 Merging videos... Please wait...")
         
         # Create input file for FFmpeg
-        with open(input_, "w") as _list:
-            _list.write("\n".join(vid_list))
+        write_concat_list(input_, vid_list)
         
-        # Merge videos
+        # Merge videos, subtitles are attached in the same pass
         merged_video_path = await MergeVideo(
-            input_file=input_, user_id=cb.from_user.id, message=cb.message, format_="mkv"
+            input_file=input_,
+            user_id=cb.from_user.id,
+            message=cb.message,
+            subtitles=sub_list,
         )
         
         if merged_video_path is None:
@@ -197,75 +300,63 @@ async def mergeNow(c: Client, cb: CallbackQuery, new_file_name: str):
         LOGGER.info(f"Video merged for: {cb.from_user.first_name}")
         await asyncio.sleep(3)
         
-        # Rename file
+        # Rename file, keeping the container MergeVideo picked
         file_size = os.path.getsize(merged_video_path)
+        new_file_name = os.path.splitext(new_file_name)[0] + os.path.splitext(merged_video_path)[1]
         os.rename(merged_video_path, new_file_name)
         await cb.message.edit(f"🔄 Renamed to: `{new_file_name.rsplit('/',1)[-1]}`")
         await asyncio.sleep(3)
         merged_video_path = new_file_name
+        await metaEditor(cb, merged_video_path)
+        file_size = os.path.getsize(merged_video_path)
         
-        # Check file size limits
-        if file_size > 2044723200 and Config.IS_PREMIUM == False:
-            await cb.message.edit(
-                f"📁 **File too large for regular Telegram!**\n\n"
-                f"📊 **Size:** `{get_readable_file_size(file_size)}`\n"
-                f"🚫 **Limit:** `2GB`\n\n"
-                f"💡 **Tip:** Use GoFile upload option or contact admin for premium access."
-            )
-            await cleanup_user_data(cb.from_user.id)
-            return
+        # Lightweight preview before, or instead of, the full file
+        preview = PREVIEW_MODE.get(cb.from_user.id)
+        if preview is not None:
+            sent = await uploadPreview(c, cb, merged_video_path, file_size)
+            if sent and preview == "only":
+                await cb.message.delete(True)
+                await cleanup_user_data(cb.from_user.id)
+                return
         
-        if Config.IS_PREMIUM and file_size > 4241280205:
-            await cb.message.edit(
-                f"📁 **File too large even for premium!**\n\n"
-                f"📊 **Size:** `{get_readable_file_size(file_size)}`\n"
-                f"🚫 **Limit:** `4GB`\n\n"
-                f"💡 **Tip:** Use GoFile upload option for larger files."
+        # Split or compress instead of failing when above the Telegram limit
+        upload_limit = get_upload_limit()
+        if file_size > upload_limit and not UPLOAD_TO_DRIVE.get(f"{cb.from_user.id}", False):
+            await uploadOversized(
+                c,
+                cb,
+                merged_video_path,
+                file_size,
+                upload_limit,
+                upload_mode=UPLOAD_AS_DOC[f"{cb.from_user.id}"],
             )
+            await cb.message.delete(True)
             await cleanup_user_data(cb.from_user.id)
             return
         
         await cb.message.edit("🎥 Extracting Video Data...")
-        duration = 1
-        
-        try:
-            metadata = extractMetadata(createParser(merged_video_path))
-            if metadata.has("duration"):
-                duration = metadata.get("duration").seconds
-        except Exception as er:
+        duration = await media_duration(merged_video_path)
+        if duration is None:
             await cleanup_user_data(cb.from_user.id)
             await cb.message.edit("⭕ Merged Video is corrupted")
             return
         
         # Handle thumbnail
+        custom_thumb = None
         try:
             user = UserSettings(cb.from_user.id, cb.from_user.first_name)
             thumb_id = user.thumbnail
             if thumb_id is None:
                 raise Exception
-            video_thumbnail = f"downloads/{str(cb.from_user.id)}_thumb.jpg"
-            await c.download_media(message=str(thumb_id), file_name=video_thumbnail)
+            custom_thumb = f"downloads/{str(cb.from_user.id)}_thumb.jpg"
+            await c.download_media(message=str(thumb_id), file_name=custom_thumb)
         except Exception as err:
+            custom_thumb = None
             LOGGER.info("Generating thumb")
-            video_thumbnail = await take_screen_shot(
-                merged_video_path, f"downloads/{str(cb.from_user.id)}", (duration / 2)
-            )
-        
-        # Process thumbnail
-        width = 1280
-        height = 720
-        try:
-            thumb = extractMetadata(createParser(video_thumbnail))
-            height = thumb.get("height")
-            width = thumb.get("width")
-            img = Image.open(video_thumbnail)
-            if width > height:
-                img.resize((320, height))
-            elif height > width:
-                img.resize((width, 320))
-            img.save(video_thumbnail)
-            Image.open(video_thumbnail).convert("RGB").save(video_thumbnail, "JPEG")
-        except:
+        video_thumbnail, width, height = await get_video_thumbnail(
+            merged_video_path, f"downloads/{str(cb.from_user.id)}", duration, custom_thumb
+        )
+        if video_thumbnail is None:
             await cleanup_user_data(cb.from_user.id)
             await cb.message.edit("⭕ Merged Video is corrupted")
             return
@@ -295,12 +386,53 @@ async def mergeNow(c: Client, cb: CallbackQuery, new_file_name: str):
         if user_id in user_processes:
             user_processes[user_id] = False
 
+async def is_early_duplicate(c: Client, message, media, vid_list: list, head_prints: dict) -> bool:
+    """
+    Compares the first chunks of a queued Telegram video with the inputs
+    downloaded so far, so a repeat is skipped before its full download.
+    Only inputs of about the same duration are considered.
+    """
+    duration = getattr(media, "duration", None)
+    if not duration or not vid_list:
+        return False
+    candidates = []
+    # Unreadable inputs are no candidates, the concat plan reports them later
+    for path, data in zip(vid_list, await probe_many(vid_list)):
+        if data is None:
+            continue
+        earlier = get_duration(data)
+        if abs(earlier - duration) <= DUPLICATE_DURATION_SECONDS:
+            candidates.append((path, earlier))
+    if not candidates:
+        return False
+    head = f"downloads/{str(message.from_user.id)}/{message.id}.head"
+    try:
+        with open(head, "wb") as f:
+            async for chunk in c.stream_media(message, limit=HEAD_CHUNKS):
+                f.write(chunk)
+        new = await head_fingerprint(head, duration)
+    except Exception as err:
+        LOGGER.info(f"Early duplicate check failed: {err}")
+        new = None
+    finally:
+        if os.path.exists(head):
+            os.remove(head)
+    if new is None:
+        return False
+    for path, earlier in candidates:
+        if path not in head_prints:
+            head_prints[path] = await head_fingerprint(path, earlier)
+        if head_prints[path] is not None and head_prints[path].matches(new):
+            return True
+    return False
+
 async def cleanup_user_data(user_id):
     """Enhanced cleanup function with downloader integration"""
     try:
         await delete_all(root=f"downloads/{str(user_id)}")
         queueDB.update({user_id: {"videos": [], "subtitles": [], "audios": []}})
         formatDB.update({user_id: None})
+        TRIM_RANGES.pop(user_id, None)
         
         # Clear reply database
         if user_id in replyDB:
@@ -316,14 +448,3 @@ async def cleanup_user_data(user_id):
         LOGGER.info(f"Cleaned up data for user {user_id}")
     except Exception as e:
         LOGGER.error(f"Cleanup error for user {user_id}: {e}")
-
-def get_readable_file_size(size_bytes):
-    """Convert bytes to human readable format"""
-    if size_bytes == 0:
-        return "0B"
-    size_name = ["B", "KB", "MB", "GB", "TB"]
-    i = 0
-    while size_bytes >= 1024 and i < len(size_name)-1:
-        size_bytes /= 1024.0
-        i += 1
-    return f"{size_bytes:.1f}{size_name[i]}"
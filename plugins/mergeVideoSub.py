@@ -14,14 +14,15 @@ from bot import (
     queueDB,
 )
 from config import Config
-from hachoir.metadata import extractMetadata
-from hachoir.parser import createParser
 from helpers.display_progress import Progress
-from helpers.ffmpeg_helper import MergeSubNew, take_screen_shot
+from helpers.ffmpeg_helper import MergeSubNew, get_video_thumbnail
+from helpers.header_reader import media_duration
 from helpers.rclone_upload import rclone_driver, rclone_upload
-from helpers.uploader import uploadVideo
+from helpers.splitter import get_upload_limit
+from helpers.subtitle_sync import sync_subtitle
+from helpers.uploader import uploadOversized, uploadVideo
 from helpers.utils import UserSettings
-from PIL import Image
+from plugins.metadataEditor import metaEditor
 from pyrogram import Client
 from pyrogram.errors import MessageNotModified
 from pyrogram.errors.exceptions.flood_420 import FloodWait
@@ -84,6 +85,10 @@ async def mergeSub(c: Client, cb: CallbackQuery, new_file_name: str):
             continue
         vid_list.append(f"{file_dl_path}")
 
+    if Config.SUBTITLE_AUTO_SYNC:
+        await cb.message.edit("📝 Syncing subtitles to the audio ...")
+        for sub in vid_list[1:]:
+            await sync_subtitle(vid_list[0], sub)
     subbed_video = MergeSubNew(
         filePath=vid_list[0],
         subPath=vid_list[1],
@@ -110,68 +115,53 @@ async def mergeSub(c: Client, cb: CallbackQuery, new_file_name: str):
     )
     await asyncio.sleep(3)
     merged_video_path = new_file_name
+    await metaEditor(cb, merged_video_path)
+    file_size = os.path.getsize(merged_video_path)
     if UPLOAD_TO_DRIVE[f"{cb.from_user.id}"]:
         await rclone_driver(omess, cb, merged_video_path)
         await delete_all(root=f"downloads/{str(cb.from_user.id)}")
         queueDB.update({cb.from_user.id: {"videos": [], "subtitles": [], "audios": []}})
         formatDB.update({cb.from_user.id: None})
         return
-    if file_size > 2044723200 and Config.IS_PREMIUM == False:
-        await cb.message.edit(
-            f"Video is Larger than 2GB Can't Upload,\n\n Tell {Config.OWNER_USERNAME} to add premium account to get 4GB TG uploads"
-        )
-        await delete_all(root=f"downloads/{str(cb.from_user.id)}")
-        queueDB.update({cb.from_user.id: {"videos": [], "subtitles": [], "audios": []}})
-        formatDB.update({cb.from_user.id: None})
-        return
-    if Config.IS_PREMIUM and file_size > 4241280205:
-        await cb.message.edit(
-            f"Video is Larger than 4GB Can't Upload,\n\n Tell {Config.OWNER_USERNAME} to die with premium account"
-        )
+    upload_limit = get_upload_limit()
+    if file_size > upload_limit:
+        if await uploadOversized(
+            c,
+            cb,
+            merged_video_path,
+            file_size,
+            upload_limit,
+            upload_mode=UPLOAD_AS_DOC[f"{cb.from_user.id}"],
+        ):
+            await cb.message.delete(True)
         await delete_all(root=f"downloads/{str(cb.from_user.id)}")
         queueDB.update({cb.from_user.id: {"videos": [], "subtitles": [], "audios": []}})
         formatDB.update({cb.from_user.id: None})
         return
     await cb.message.edit("🎥 Extracting Video Data ...")
 
-    duration = 1
-    try:
-        metadata = extractMetadata(createParser(merged_video_path))
-        if metadata.has("duration"):
-            duration = metadata.get("duration").seconds
-    except Exception as er:
+    duration = await media_duration(merged_video_path)
+    if duration is None:
         await delete_all(root=f"downloads/{str(cb.from_user.id)}")
         queueDB.update({cb.from_user.id: {"videos": [], "subtitles": [], "audios": []}})
         formatDB.update({cb.from_user.id: None})
         await cb.message.edit("⭕ Merged Video is corrupted")
         return
+    custom_thumb = None
     try:
         user = UserSettings(cb.from_user.id, cb.from_user.first_name)
         thumb_id = user.thumbnail
         if thumb_id is None:
             raise Exception
-        # thumb_id = await database.getThumb(cb.from_user.id)
-        video_thumbnail = f"downloads/{str(cb.from_user.id)}_thumb.jpg"
-        await c.download_media(message=str(thumb_id), file_name=video_thumbnail)
+        custom_thumb = f"downloads/{str(cb.from_user.id)}_thumb.jpg"
+        await c.download_media(message=str(thumb_id), file_name=custom_thumb)
     except Exception as err:
+        custom_thumb = None
         LOGGER.info("Generating thumb")
-        video_thumbnail = await take_screen_shot(
-            merged_video_path, f"downloads/{str(cb.from_user.id)}", (duration / 2)
-        )
-    width = 1280
-    height = 720
-    try:
-        thumb = extractMetadata(createParser(video_thumbnail))
-        height = thumb.get("height")
-        width = thumb.get("width")
-        img = Image.open(video_thumbnail)
-        if width > height:
-            img.resize((320, height))
-        elif height > width:
-            img.resize((width, 320))
-        img.save(video_thumbnail)
-        Image.open(video_thumbnail).convert("RGB").save(video_thumbnail, "JPEG")
-    except:
+    video_thumbnail, width, height = await get_video_thumbnail(
+        merged_video_path, f"downloads/{str(cb.from_user.id)}", duration, custom_thumb
+    )
+    if video_thumbnail is None:
         await delete_all(root=f"downloads/{str(cb.from_user.id)}")
         queueDB.update({cb.from_user.id: {"videos": [], "subtitles": [], "audios": []}})
         formatDB.update({cb.from_user.id: None})
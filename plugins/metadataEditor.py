@@ -1,10 +1,50 @@
 #
 # (c) Yash Oswal | yashoswal18@gmail.com
 
-from pyrogram import Client
-from pyrogram.types import Message
-from bot import mergeApp, LOGGER
-from config import Config
+import asyncio
+import os
 
-async def metaEditor(c:Client, m: Message):
-    1
+from bot import LOGGER, METADATA_EDITS
+from helpers.ffmpeg_runner import run_ffmpeg
+from helpers.metadata_editor import apply_edits, metadata_args
+from helpers.utils import UserSettings
+from pyrogram.types import CallbackQuery
+
+
+async def metaEditor(cb: CallbackQuery, merged_video_path: str):
+    """
+    Applies the `/metadata` edits of the user to the merged file, when the
+    Edit Metadata setting is on. The header is patched in place; FFmpeg
+    remuxes the file only when that is not possible.
+
+    Parameters:
+    - `cb`: Callback of the merge, for its user and status message.
+    - `merged_video_path`: Merged MKV/MP4 file, edited in place.
+    """
+    user = UserSettings(cb.from_user.id, cb.from_user.first_name)
+    edits = METADATA_EDITS.pop(cb.from_user.id, None)
+    if not user.edit_metadata or edits is None:
+        return
+    await cb.message.edit("🏷 Editing metadata ...")
+    try:
+        how = await asyncio.get_running_loop().run_in_executor(
+            None, apply_edits, merged_video_path, edits
+        )
+        LOGGER.info(f"Metadata of {merged_video_path} edited ({how})")
+        return
+    except Exception as err:
+        # Anything the header parser trips over is left to FFmpeg
+        LOGGER.warning(f"In place metadata edit failed, remuxing: {err}")
+    base, ext = os.path.splitext(merged_video_path)
+    remuxed = f"{base}.meta{ext}"
+    returncode, _ = await run_ffmpeg(
+        ["ffmpeg", "-hide_banner", "-y", "-i", merged_video_path, "-map", "0", "-c", "copy"]
+        + metadata_args(edits)
+        + [remuxed]
+    )
+    if returncode == 0 and os.path.exists(remuxed):
+        os.replace(remuxed, merged_video_path)
+    else:
+        LOGGER.warning(f"Metadata remux of {merged_video_path} failed, keeping the original")
+        if os.path.exists(remuxed):
+            os.remove(remuxed)
@@ -9,7 +9,7 @@ from __init__ import LOGGER, gDict, queueDB
 import os
 from bot import delete_all
 from helpers.display_progress import Progress
-from helpers.ffmpeg_helper import extractAudios, extractSubtitles
+from helpers.ffmpeg_helper import extractStreams
 from helpers.uploader import uploadFiles
 
 async def streamsExtractor(c: Client, cb:CallbackQuery ,media_mid, exAudios=False, exSubs=False):
@@ -49,12 +49,15 @@ async def streamsExtractor(c: Client, cb:CallbackQuery ,media_mid, exAudios=Fals
         await asyncio.sleep(4)
     await _hold.edit_text("Fetching data")
     await asyncio.sleep(3)
-    if exAudios:
+    if exAudios and exSubs:
+        await _hold.edit_text("Extracting Audios and Subtitles")
+    elif exAudios:
         await _hold.edit_text("Extracting Audios")
-        extract_dir = await extractAudios(file_dl_path,cb.from_user.id)
-    if exSubs:
+    elif exSubs:
         await _hold.edit_text("Extracting Subtitles")
-        extract_dir = await extractSubtitles(file_dl_path, cb.from_user.id)
+    extract_dir = await extractStreams(
+        file_dl_path, cb.from_user.id, audios=exAudios, subtitles=exSubs
+    )
 
     if extract_dir is None:
         await cb.message.edit("❌ Failed to Extract Streams !")
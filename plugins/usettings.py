@@ -72,7 +72,8 @@ async def userSettings(
             1: "Video 🎥 + Video 🎥",
             2: "Video 🎥 + Audio 🎵", 
             3: "Video 🎥 + Subtitle 📜",
-            4: "Extract"
+            4: "Extract",
+            5: "Audio 🎵 + Audio 🎵"
         }
         
         userMergeModeId = usettings.merge_mode
@@ -101,7 +102,7 @@ Merge Bot settings for {fname} {lname or ''}
             ],
             [
                 "tryotherbutton",
-                f"ch@ng3M0de_{uid}_{(userMergeModeId%4)+1}",
+                f"ch@ng3M0de_{uid}_{(userMergeModeId%5)+1}",
                 "tryotherbutton",
                 f"toggleEdit_{uid}",
                 "close",
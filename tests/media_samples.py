@@ -0,0 +1,184 @@
+# media_samples.py - Hand built MP4/MKV files and FFmpeg helpers shared by the tests
+import json
+import shutil
+import struct
+import subprocess
+
+import pytest
+
+from helpers.mp4_joiner import Box
+
+requires_ffmpeg = pytest.mark.skipif(
+    shutil.which("ffmpeg") is None or shutil.which("ffprobe") is None,
+    reason="FFmpeg is not installed",
+)
+
+
+def _full(type_: bytes, body: bytes, version: int = 0, flags: int = 0) -> Box:
+    return Box(type_, struct.pack(">I", version << 24 | flags) + body)
+
+
+def _language(code: str) -> int:
+    value = 0
+    for letter in code:
+        value = value << 5 | (ord(letter) - 0x60)
+    return value
+
+
+def build_mp4(
+    samples: list,
+    codec: bytes = b"avc1",
+    timescale: int = 1000,
+    delta: int = 100,
+    moov_first: bool = True,
+    free: int = 0,
+    language: str = "und",
+) -> bytes:
+    """
+    A one video track MP4 holding `samples` (bytes each) as one chunk, the
+    first sample being the only keyframe.
+
+    Parameters:
+    - `moov_first`: moov in front of the mdat, else behind it.
+    - `free`: Size of a free box right behind the moov, 0 for none.
+    """
+    count = len(samples)
+    duration = count * delta
+    ftyp = Box(b"ftyp", b"isom" + struct.pack(">I", 512) + b"isomiso2mp41")
+    payload = b"".join(samples)
+
+    def moov(chunk_offset: int) -> Box:
+        stbl = Box(
+            b"stbl",
+            children=[
+                _full(b"stsd", struct.pack(">I", 1) + Box(codec, b"\0" * 8 + b"setup").to_bytes()),
+                _full(b"stts", struct.pack(">III", 1, count, delta)),
+                _full(b"stss", struct.pack(">II", 1, 1)),
+                _full(b"stsz", struct.pack(">II", 0, count) + b"".join(struct.pack(">I", len(s)) for s in samples)),
+                _full(b"stsc", struct.pack(">IIII", 1, 1, count, 1)),
+                _full(b"stco", struct.pack(">II", 1, chunk_offset)),
+            ],
+        )
+        mdia = Box(
+            b"mdia",
+            children=[
+                _full(b"mdhd", struct.pack(">IIIIHH", 0, 0, timescale, duration, _language(language), 0)),
+                _full(b"hdlr", b"\0" * 4 + b"vide" + b"\0" * 12 + b"VideoHandler\0"),
+                Box(b"minf", children=[stbl]),
+            ],
+        )
+        tkhd = _full(
+            b"tkhd",
+            struct.pack(">IIIII", 0, 0, 1, 0, duration) + b"\0" * 52 + struct.pack(">II", 64 << 16, 48 << 16),
+            flags=3,
+        )
+        mvhd = _full(b"mvhd", struct.pack(">IIII", 0, 0, timescale, duration) + b"\0" * 80)
+        return Box(b"moov", children=[mvhd, Box(b"trak", children=[tkhd, mdia])])
+
+    head = ftyp.to_bytes()
+    padding = struct.pack(">I4s", free, b"free") + b"\0" * (free - 8) if free else b""
+    mdat = struct.pack(">I4s", len(payload) + 8, b"mdat") + payload
+    if moov_first:
+        size = len(moov(0).to_bytes())
+        return head + moov(len(head) + size + len(padding) + 8).to_bytes() + padding + mdat
+    return head + mdat + moov(len(head) + 8).to_bytes() + padding
+
+
+def ebml(element_id: int, data: bytes) -> bytes:
+    """EBML element with an 8 byte size field, so sizes never change its layout"""
+    return element_id.to_bytes((element_id.bit_length() + 7) // 8, "big") + (len(data) | 1 << 56).to_bytes(8, "big") + data
+
+
+def _uint(element_id: int, value: int) -> bytes:
+    return ebml(element_id, value.to_bytes(8, "big"))
+
+
+def build_mkv(
+    tracks: list,
+    title: str = None,
+    duration: float = 2500.0,
+    doctype: str = "matroska",
+    void: int = 0,
+    tracks_last: bool = False,
+) -> bytes:
+    """
+    A Matroska file with a SeekHead, Info, Tracks and one dummy Cluster.
+
+    Parameters:
+    - `tracks`: (kind, codec id, language, name, width, height) per track.
+    - `duration`: In milliseconds, the timecode scale is 1 ms.
+    - `void`: Size of a Void element right behind the Info, 0 for none.
+    - `tracks_last`: Tracks behind the Cluster, found only through the SeekHead.
+    """
+    types = {"video": 1, "audio": 2, "subtitle": 17}
+    info = _uint(0x2AD7B1, 1000000) + ebml(0x4489, struct.pack(">d", duration))
+    if title is not None:
+        info += ebml(0x7BA9, title.encode("utf-8"))
+    info = ebml(0x1549A966, info)
+    entries = b""
+    for number, (kind, codec, language, name, width, height) in enumerate(tracks, 1):
+        entry = _uint(0xD7, number) + _uint(0x83, types[kind]) + ebml(0x86, codec.encode("ascii"))
+        if language is not None:
+            entry += ebml(0x22B59C, language.encode("ascii"))
+        if name is not None:
+            entry += ebml(0x536E, name.encode("utf-8"))
+        if kind == "video":
+            entry += ebml(0xE0, _uint(0xB0, width) + _uint(0xBA, height))
+        entries += ebml(0xAE, entry)
+    tracks_ = ebml(0x1654AE6B, entries)
+    padding = b""
+    if void:
+        # Void with an 8 byte size: one ID byte, eight size bytes, then zeros
+        padding = b"\xec" + (void - 9 | 1 << 56).to_bytes(8, "big") + b"\0" * (void - 9)
+    cluster = ebml(0x1F43B675, _uint(0xE7, 0) + ebml(0xA3, b"\x81\0\0\x80frame"))
+
+    def seek_head(info_at: int, tracks_at: int) -> bytes:
+        seeks = b"".join(
+            ebml(0x4DBB, ebml(0x53AB, target.to_bytes(4, "big")) + _uint(0x53AC, position))
+            for target, position in ((0x1549A966, info_at), (0x1654AE6B, tracks_at))
+        )
+        return ebml(0x114D9B74, seeks)
+
+    head_size = len(seek_head(0, 0))
+    info_at = head_size
+    if tracks_last:
+        tracks_at = head_size + len(info) + len(padding) + len(cluster)
+        body = info + padding + cluster + tracks_
+    else:
+        tracks_at = head_size + len(info) + len(padding)
+        body = info + padding + tracks_ + cluster
+    segment = seek_head(info_at, tracks_at) + body
+    header = ebml(0x1A45DFA3, _uint(0x4286, 1) + ebml(0x4282, doctype.encode("ascii")))
+    return header + ebml(0x18538067, segment)
+
+
+def ffmpeg(*args: str):
+    subprocess.run(["ffmpeg", "-hide_banner", "-v", "error", "-y", *args], check=True)
+
+
+def ffprobe(path: str) -> dict:
+    out = subprocess.run(
+        ["ffprobe", "-v", "error", "-print_format", "json", "-show_format", "-show_streams", path],
+        check=True,
+        capture_output=True,
+    )
+    return json.loads(out.stdout)
+
+
+def frame_hashes(path: str) -> list:
+    """MD5 of every decoded video frame"""
+    out = subprocess.run(
+        ["ffmpeg", "-v", "error", "-i", path, "-map", "0:v:0", "-f", "framemd5", "-"],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return [line.rsplit(",", 1)[1].strip() for line in out.stdout.splitlines() if line and not line.startswith("#")]
+
+
+def decode_errors(path: str) -> str:
+    """Whatever FFmpeg complains about while decoding all of `path`"""
+    out = subprocess.run(
+        ["ffmpeg", "-v", "error", "-i", path, "-f", "null", "-"], capture_output=True, text=True
+    )
+    return out.stderr.strip() if out.returncode == 0 else out.stderr.strip() or "failed"
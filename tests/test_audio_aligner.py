@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from helpers.audio_aligner import ALIGN_MIN_CONFIDENCE, find_lag, offset_args
+
+RATE = 8000
+
+
+def _noise(seed: int, seconds: float = 4.0) -> np.ndarray:
+    return np.random.default_rng(seed).standard_normal(int(RATE * seconds)).astype(np.float32)
+
+
+@pytest.mark.parametrize("shift", [-1200, -80, 0, 80, 1200])
+def test_find_lag_recovers_shift(shift):
+    reference = _noise(1)
+    if shift >= 0:
+        # Track content starts `shift` samples early, it must be delayed
+        track = reference[shift:]
+    else:
+        track = np.concatenate((np.zeros(-shift, np.float32), reference))
+    lag, confidence = find_lag(reference, track, RATE, 1.0)
+    assert lag == pytest.approx(shift / RATE)
+    assert confidence > ALIGN_MIN_CONFIDENCE
+
+
+def test_find_lag_through_a_different_dub():
+    # Same effects bed, the dialogue on top is unrelated and louder
+    bed = _noise(2)
+    reference = bed + 3 * _noise(3)
+    track = (bed + 3 * _noise(4))[400:]
+    lag, confidence = find_lag(reference, track, RATE, 1.0)
+    assert lag == pytest.approx(400 / RATE)
+    assert confidence > ALIGN_MIN_CONFIDENCE
+
+
+def test_unrelated_tracks_have_low_confidence():
+    _, confidence = find_lag(_noise(5), _noise(6), RATE, 1.0)
+    assert confidence < ALIGN_MIN_CONFIDENCE
+
+
+def test_offset_args():
+    assert offset_args(0.25) == ["-itsoffset", "0.250"]
+    assert offset_args(-1.5) == ["-ss", "1.500"]
+    assert offset_args(0.0) == []
@@ -0,0 +1,128 @@
+import asyncio
+import struct
+
+import pytest
+
+from helpers.header_reader import (
+    HeaderError,
+    find_box,
+    media_duration,
+    mp4_language,
+    read_element,
+    read_media_info,
+    read_vint,
+)
+from media_samples import build_mkv, build_mp4, ffmpeg, ffprobe, requires_ffmpeg
+
+TRACKS = [
+    ("video", "V_MPEG4/ISO/AVC", "eng", "Main", 1920, 1080),
+    ("audio", "A_AAC", "jpn", "Japanese", 0, 0),
+    ("subtitle", "S_TEXT/UTF8", None, None, 0, 0),
+]
+
+
+def _write(path, data: bytes) -> str:
+    path.write_bytes(data)
+    return str(path)
+
+
+@pytest.mark.parametrize(
+    "data, marker, expected",
+    [
+        (b"\x81", False, (1, 1)),
+        (b"\x40\x02", False, (2, 2)),
+        (b"\x01\x00\x00\x00\x00\x00\x01\x00", False, (256, 8)),
+        (b"\xff", False, (None, 1)),
+        (b"\x1a\x45\xdf\xa3", True, (0x1A45DFA3, 4)),
+        (b"\xec", True, (0xEC, 1)),
+    ],
+)
+def test_read_vint(data, marker, expected):
+    assert read_vint(data, 0, marker=marker) == expected
+
+
+def test_read_vint_rejects_zero_byte():
+    with pytest.raises(HeaderError):
+        read_vint(b"\x00\x01", 0)
+
+
+def test_read_element_clamps_unknown_size():
+    data = b"\x18\x53\x80\x67\xff" + b"payload"
+    assert read_element(data, 0, len(data)) == (0x18538067, 5, len(data))
+
+
+def test_mp4_language():
+    assert mp4_language(0x2A0E) == "jpn"
+    assert mp4_language(0x55C4) == "und"
+
+
+def test_matroska_header(tmp_path):
+    path = _write(tmp_path / "a.mkv", build_mkv(TRACKS, title="Film", duration=2500.0))
+    info = read_media_info(path)
+    assert (info.container, info.duration, info.seconds, info.title) == ("matroska", 2500, 2, "Film")
+    assert (info.width, info.height) == (1920, 1080)
+    assert [(t.kind, t.codec, t.language, t.name) for t in info.tracks] == [
+        ("video", "V_MPEG4/ISO/AVC", "eng", "Main"),
+        ("audio", "A_AAC", "jpn", "Japanese"),
+        # Matroska's default language
+        ("subtitle", "S_TEXT/UTF8", "eng", None),
+    ]
+
+
+def test_matroska_tracks_behind_the_clusters(tmp_path):
+    data = build_mkv(TRACKS, doctype="webm", tracks_last=True)
+    info = read_media_info(_write(tmp_path / "a.webm", data))
+    assert info.container == "webm"
+    assert [t.kind for t in info.tracks] == ["video", "audio", "subtitle"]
+
+
+def test_mp4_header(tmp_path):
+    data = build_mp4([b"x" * 10] * 25, timescale=1000, delta=100, language="jpn")
+    info = read_media_info(_write(tmp_path / "a.mp4", data))
+    assert (info.container, info.duration, info.seconds, info.title) == ("mp4", 2500, 2, None)
+    assert (info.width, info.height) == (64, 48)
+    track = info.tracks[0]
+    assert (track.kind, track.codec, track.language, track.name) == ("video", "avc1", "jpn", "VideoHandler")
+
+
+def test_mp4_header_behind_the_media(tmp_path):
+    data = build_mp4([b"x" * 10] * 3, moov_first=False)
+    assert find_box(data, b"moov")[0] > find_box(data, b"mdat")[0]
+    assert read_media_info(_write(tmp_path / "a.mp4", data)).duration == 300
+
+
+@pytest.mark.parametrize("data", [b"", b"not a media file at all", b"\x1a\x45\xdf\xa3\x81"])
+def test_unreadable_files(tmp_path, data):
+    with pytest.raises(HeaderError):
+        read_media_info(_write(tmp_path / "bad.bin", data))
+
+
+def test_media_duration_from_header(tmp_path):
+    path = _write(tmp_path / "a.mkv", build_mkv(TRACKS, duration=61999.0))
+    assert asyncio.run(media_duration(path)) == 61
+
+
+def test_broken_box_size(tmp_path):
+    data = struct.pack(">I4s", 4, b"ftyp") + b"\0" * 8
+    with pytest.raises(HeaderError):
+        read_media_info(_write(tmp_path / "a.mp4", data))
+
+
+@requires_ffmpeg
+@pytest.mark.parametrize("ext", ["mkv", "mp4"])
+def test_header_matches_ffprobe(tmp_path, ext):
+    path = str(tmp_path / f"clip.{ext}")
+    ffmpeg(
+        "-f", "lavfi", "-i", "testsrc=duration=3:size=320x240:rate=25",
+        "-f", "lavfi", "-i", "sine=duration=3",
+        "-c:v", "mpeg4", "-c:a", "aac", "-shortest",
+        "-metadata", "title=Round Trip", "-metadata:s:a:0", "language=jpn",
+        path,
+    )
+    probed = ffprobe(path)
+    info = read_media_info(path)
+    assert info.duration / 1000 == pytest.approx(float(probed["format"]["duration"]), abs=0.05)
+    assert info.title == "Round Trip"
+    assert (info.width, info.height) == (320, 240)
+    assert [t.kind for t in info.tracks] == [s["codec_type"] for s in probed["streams"]]
+    assert info.tracks[1].language == "jpn"
@@ -0,0 +1,187 @@
+import os
+
+import pytest
+
+from helpers.header_reader import VOID, HeaderError, find_box, read_element, read_media_info, read_vint
+from helpers.metadata_editor import _edit_mp4, _vint, apply_edits, ebml_void, metadata_args, parse_edits
+from media_samples import build_mkv, build_mp4, decode_errors, ffmpeg, ffprobe, frame_hashes, requires_ffmpeg
+
+TRACKS = [
+    ("video", "V_MPEG4/ISO/AVC", "eng", "Main", 1920, 1080),
+    ("audio", "A_AAC", "jpn", "Japanese", 0, 0),
+    ("audio", "A_AC3", "eng", None, 0, 0),
+]
+
+
+def _write(path, data: bytes) -> str:
+    path.write_bytes(data)
+    return str(path)
+
+
+def _media(path: str, container: str) -> bytes:
+    """Bytes of the media data, which an edit must never touch"""
+    with open(path, "rb") as f:
+        data = f.read()
+    if container == "mp4":
+        _, start, end = find_box(data, b"mdat")
+        return data[start:end]
+    start = data.index(b"\x1f\x43\xb6\x75")
+    return data[start : read_element(data, start, len(data))[2]]
+
+
+@pytest.mark.parametrize(
+    "value, width, expected",
+    [
+        (0, None, b"\x80"),
+        (126, None, b"\xfe"),
+        # All value bits set means unknown size, 127 takes two bytes
+        (127, None, b"\x40\x7f"),
+        (16382, None, b"\x7f\xfe"),
+        (16383, None, b"\x20\x3f\xff"),
+        (5, 4, b"\x10\x00\x00\x05"),
+    ],
+)
+def test_vint(value, width, expected):
+    assert _vint(value, width) == expected
+    assert read_vint(expected, 0) == (value, len(expected))
+
+
+@pytest.mark.parametrize("total", [2, 3, 128, 129, 130, 131, 16385, 16386, 16387, 100000])
+def test_ebml_void_fills_exactly(total):
+    void = ebml_void(total)
+    assert len(void) == total
+    element_id, data, stop = read_element(void, 0, len(void))
+    assert (element_id, stop) == (VOID, total)
+    assert void[data:] == b"\0" * (total - data)
+
+
+def test_ebml_void_too_small():
+    with pytest.raises(HeaderError):
+        ebml_void(1)
+
+
+def test_parse_edits():
+    edits = parse_edits("title=My Film | a1.lang=JPN\nA1.name = Japanese | s2.name=Signs")
+    assert edits.title == "My Film"
+    assert edits.tracks == {("a", 1): {"language": "jpn", "name": "Japanese"}, ("s", 2): {"name": "Signs"}}
+    assert metadata_args(edits) == [
+        "-metadata", "title=My Film",
+        "-metadata:s:a:0", "title=Japanese",
+        "-metadata:s:a:0", "language=jpn",
+        "-metadata:s:s:1", "title=Signs",
+    ]
+
+
+@pytest.mark.parametrize("text", ["", "  |  ", "foo=bar", "a0.name=x", "a1.lang=english", "title"])
+def test_parse_edits_rejects(text):
+    with pytest.raises(ValueError):
+        parse_edits(text)
+
+
+def test_matroska_title_into_the_old_space(tmp_path):
+    path = _write(tmp_path / "a.mkv", build_mkv(TRACKS, title="A much longer original title"))
+    size = os.path.getsize(path)
+    assert apply_edits(path, parse_edits("title=Short")) == "void padding"
+    assert os.path.getsize(path) == size
+    info = read_media_info(path)
+    assert (info.title, info.duration) == ("Short", 2500)
+    assert [t.name for t in info.tracks] == ["Main", "Japanese", None]
+
+
+def test_matroska_title_into_a_following_void(tmp_path):
+    path = _write(tmp_path / "a.mkv", build_mkv(TRACKS, title="Old", void=256))
+    size = os.path.getsize(path)
+    apply_edits(path, parse_edits("title=" + "n" * 200))
+    assert os.path.getsize(path) == size
+    assert read_media_info(path).title == "n" * 200
+
+
+def test_matroska_relocates_a_grown_header(tmp_path):
+    path = _write(tmp_path / "a.mkv", build_mkv(TRACKS, title="Old"))
+    media = _media(path, "mkv")
+    size = os.path.getsize(path)
+    assert apply_edits(path, parse_edits("title=" + "x" * 500)) == "relocated header"
+    assert os.path.getsize(path) > size
+    assert _media(path, "mkv") == media
+    info = read_media_info(path)
+    assert info.title == "x" * 500
+    assert len(info.tracks) == 3
+
+
+def test_matroska_track_edits(tmp_path):
+    path = _write(tmp_path / "a.mkv", build_mkv(TRACKS))
+    apply_edits(path, parse_edits("a1.lang=fre | a1.name=French | a2.name=Commentary | v1.lang=jpn"))
+    tracks = read_media_info(path).tracks
+    assert [(t.language, t.name) for t in tracks] == [
+        ("jpn", "Main"),
+        ("fre", "French"),
+        ("eng", "Commentary"),
+    ]
+
+
+def test_mp4_title_into_free_padding(tmp_path):
+    path = _write(tmp_path / "a.mp4", build_mp4([b"a" * 10] * 3, free=4096))
+    media = _media(path, "mp4")
+    size = os.path.getsize(path)
+    assert apply_edits(path, parse_edits("title=Film | v1.name=Camera | v1.lang=ger")) == "free padding"
+    assert os.path.getsize(path) == size
+    assert _media(path, "mp4") == media
+    info = read_media_info(path)
+    assert info.title == "Film"
+    assert (info.tracks[0].name, info.tracks[0].language) == ("Camera", "ger")
+
+
+def test_mp4_moov_at_the_end_is_rewritten(tmp_path):
+    path = _write(tmp_path / "a.mp4", build_mp4([b"a" * 10] * 3, moov_first=False))
+    media = _media(path, "mp4")
+    assert apply_edits(path, parse_edits("title=Film")) == "rewritten at the end"
+    assert _media(path, "mp4") == media
+    assert read_media_info(path).title == "Film"
+
+
+def test_mp4_moov_in_front_is_relocated(tmp_path):
+    path = _write(tmp_path / "a.mp4", build_mp4([b"a" * 10] * 3))
+    media = _media(path, "mp4")
+    assert apply_edits(path, parse_edits("title=Film")) == "relocated header"
+    with open(path, "rb") as f:
+        data = f.read()
+    # The old moov became a free box, chunk offsets still point at the media
+    assert data[find_box(data, b"ftyp")[2] + 4 :][:4] == b"free"
+    assert _media(path, "mp4") == media
+    assert read_media_info(path).title == "Film"
+
+
+def test_edit_mp4_patch_fills_the_room():
+    data = build_mp4([b"a" * 10] * 3, free=1024)
+    head = find_box(data, b"moov")[0]
+    mdat = find_box(data, b"mdat")[0]
+    patches, appended, how = _edit_mp4(data, parse_edits("title=Film"))
+    assert (appended, how) == (b"", "free padding")
+    assert len(patches) == 1 and patches[0][0] == head
+    patched = bytearray(data)
+    patched[head : head + len(patches[0][1])] = patches[0][1]
+    # New moov plus a shrunk free box end right where the media starts
+    moov_end = find_box(patched, b"moov")[2]
+    assert find_box(patched, b"free", moov_end) == (moov_end, moov_end + 8, mdat)
+
+
+@requires_ffmpeg
+@pytest.mark.parametrize("ext, flags", [("mkv", []), ("mp4", []), ("mp4", ["-movflags", "+faststart"])])
+def test_edits_read_back_by_ffprobe(tmp_path, ext, flags):
+    path = str(tmp_path / f"clip.{ext}")
+    ffmpeg(
+        "-f", "lavfi", "-i", "testsrc=duration=2:size=64x48:rate=10",
+        "-f", "lavfi", "-i", "sine=duration=2",
+        "-c:v", "mpeg4", "-c:a", "aac", "-shortest", *flags,
+        path,
+    )
+    frames = frame_hashes(path)
+    apply_edits(path, parse_edits("title=Edited | a1.lang=fre | a1.name=French"))
+
+    probed = ffprobe(path)
+    assert probed["format"]["tags"]["title"] == "Edited"
+    audio = next(s for s in probed["streams"] if s["codec_type"] == "audio")
+    assert audio["tags"]["language"] == "fre"
+    assert audio["tags"]["title"] == "French"
+    assert decode_errors(path) == ""
+    assert frame_hashes(path) == frames
@@ -0,0 +1,132 @@
+import asyncio
+import struct
+
+import pytest
+
+from helpers.mp4_joiner import (
+    MOOV_PADDING,
+    Box,
+    JoinError,
+    Mp4Track,
+    join_mp4,
+    join_mp4_async,
+    parse_boxes,
+    scan_file,
+)
+from media_samples import build_mp4, decode_errors, ffmpeg, ffprobe, frame_hashes, requires_ffmpeg
+
+
+def _samples(tag: bytes, sizes: list) -> list:
+    return [tag * size for size in sizes]
+
+
+def _write(path, data: bytes) -> str:
+    path.write_bytes(data)
+    return str(path)
+
+
+def _read_samples(path: str) -> list:
+    """Every sample of the first track, located through its sample tables"""
+    _, moov, _ = scan_file(path)
+    track = Mp4Track(moov.find(b"trak"))
+    stsc = [tuple(track.stsc[n : n + 3]) for n in range(0, len(track.stsc), 3)]
+    sizes = list(track.sizes) if track.sizes is not None else [track.sample_size] * track.sample_count
+    samples = []
+    with open(path, "rb") as f:
+        for index, offset in enumerate(track.chunks):
+            per_chunk = next(c[1] for c in reversed(stsc) if c[0] <= index + 1)
+            f.seek(offset)
+            for _ in range(per_chunk):
+                samples.append(f.read(sizes[len(samples)]))
+    return samples
+
+
+def test_parse_boxes_round_trip():
+    data = build_mp4(_samples(b"a", [5, 3]))
+    boxes = parse_boxes(data)
+    assert [b.type for b in boxes] == [b"ftyp", b"moov", b"mdat"]
+    assert boxes[1].find(b"trak", b"mdia", b"minf", b"stbl", b"stco") is not None
+    assert b"".join(b.to_bytes() for b in boxes) == data
+
+
+def test_parse_boxes_largesize_and_to_end():
+    large = struct.pack(">I4sQ", 1, b"free", 16 + 3) + b"abc"
+    to_end = struct.pack(">I4s", 0, b"mdat") + b"rest"
+    boxes = parse_boxes(large + to_end)
+    assert (boxes[0].type, boxes[0].payload) == (b"free", b"abc")
+    assert (boxes[1].type, boxes[1].payload) == (b"mdat", b"rest")
+
+
+def test_parse_boxes_rejects_truncated_box():
+    with pytest.raises(JoinError):
+        parse_boxes(struct.pack(">I4s", 100, b"free") + b"short")
+
+
+def test_empty_box_header():
+    box = Box(b"mdat", b"")
+    assert box.to_bytes() == struct.pack(">I4s", 8, b"mdat")
+
+
+def test_scan_file_rejects_fragmented(tmp_path):
+    data = build_mp4(_samples(b"a", [4]))
+    path = _write(tmp_path / "frag.mp4", data + struct.pack(">I4s", 8, b"moof"))
+    with pytest.raises(JoinError):
+        scan_file(path)
+
+
+@pytest.mark.parametrize("moov_first", [True, False])
+def test_join_rewrites_sample_tables(tmp_path, moov_first):
+    first = _samples(b"a", [10, 3, 7])
+    second = _samples(b"b", [4, 9])
+    a = _write(tmp_path / "a.mp4", build_mp4(first, moov_first=moov_first))
+    b = _write(tmp_path / "b.mp4", build_mp4(second, moov_first=moov_first))
+    out = join_mp4([a, b], str(tmp_path / "out.mp4"))
+
+    assert _read_samples(out) == first + second
+    _, moov, mdats = scan_file(out)
+    track = Mp4Track(moov.find(b"trak"))
+    assert track.sample_count == 5
+    assert list(track.stts) == [3, 100, 2, 100]
+    assert list(track.stss) == [1, 4]
+    assert track.duration == 500
+    mvhd = moov.find(b"mvhd").payload
+    assert struct.unpack_from(">I", mvhd, 16)[0] == 500
+    # Fast start, with room for metadata edits behind the moov
+    boxes = parse_boxes(open(out, "rb").read())
+    assert [b.type for b in boxes] == [b"ftyp", b"moov", b"free", b"mdat"]
+    assert len(boxes[2].to_bytes()) == MOOV_PADDING
+    assert len(mdats) == 1
+
+
+def test_join_refuses_different_codecs(tmp_path):
+    a = _write(tmp_path / "a.mp4", build_mp4(_samples(b"a", [4]), codec=b"avc1"))
+    b = _write(tmp_path / "b.mp4", build_mp4(_samples(b"b", [4]), codec=b"hvc1"))
+    with pytest.raises(JoinError):
+        join_mp4([a, b], str(tmp_path / "out.mp4"))
+
+
+def test_join_async_falls_back_and_cleans_up(tmp_path):
+    a = _write(tmp_path / "a.mp4", build_mp4(_samples(b"a", [4]), timescale=1000))
+    b = _write(tmp_path / "b.mp4", build_mp4(_samples(b"b", [4]), timescale=90000))
+    out = tmp_path / "out.mp4"
+    assert asyncio.run(join_mp4_async([a, b], str(out))) is None
+    assert not out.exists()
+
+
+@requires_ffmpeg
+def test_join_of_ffmpeg_output_decodes_every_frame(tmp_path):
+    parts = []
+    for n, pattern in enumerate(("testsrc", "smptebars")):
+        path = str(tmp_path / f"part{n}.mp4")
+        ffmpeg(
+            "-f", "lavfi", "-i", f"{pattern}=duration=2:size=64x48:rate=10",
+            "-c:v", "mpeg4", "-g", "5", path,
+        )
+        parts.append(path)
+    out = join_mp4(parts, str(tmp_path / "joined.mp4"))
+
+    assert decode_errors(out) == ""
+    assert frame_hashes(out) == frame_hashes(parts[0]) + frame_hashes(parts[1])
+    info = ffprobe(out)
+    assert float(info["format"]["duration"]) == pytest.approx(4.0, abs=0.1)
+    assert int(info["streams"][0]["nb_frames"]) == 40
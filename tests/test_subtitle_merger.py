@@ -0,0 +1,95 @@
+import codecs
+
+from helpers.subtitle_merger import ass_time, iter_srt, merge_subtitles, read_text, srt_time
+
+SRT_A = """1
+00:00:01,000 --> 00:00:02,500
+<i>Hello</i>
+
+2
+00:00:03,000 --> 00:00:04,000
+World
+"""
+
+SRT_B = """1
+00:00:00,5 --> 00:00:01,0
+Second file
+"""
+
+ASS = """[Script Info]
+ScriptType: v4.00+
+PlayResX: 1920
+
+[V4+ Styles]
+Format: Name, Fontname, Fontsize
+Style: Default,Verdana,60
+
+[Events]
+Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
+Dialogue: 0,0:00:01.00,0:00:02.00,Default,,0,0,0,,Styled, with comma
+"""
+
+
+def _write(path, text, encoding="utf-8"):
+    path.write_bytes(text.encode(encoding))
+    return str(path)
+
+
+def test_time_formats():
+    assert srt_time(3723004) == "01:02:03,004"
+    assert srt_time(-5) == "00:00:00,000"
+    assert ass_time(3723004) == "1:02:03.00"
+    assert ass_time(1234) == "0:00:01.23"
+
+
+def test_iter_srt_pads_short_fractions():
+    cues = list(iter_srt(SRT_B))
+    assert cues == [(500, 1000, "Second file")]
+
+
+def test_iter_srt_without_trailing_blank_line():
+    cues = list(iter_srt(SRT_A.rstrip("\n")))
+    assert cues[-1] == (3000, 4000, "World")
+    assert len(cues) == 2
+
+
+def test_read_text_honours_bom(tmp_path):
+    path = tmp_path / "bom.srt"
+    path.write_bytes(codecs.BOM_UTF16_LE + "Ünïcode".encode("utf-16-le"))
+    assert read_text(str(path)) == "Ünïcode"
+
+
+def test_read_text_falls_back_to_cp1252(tmp_path):
+    path = tmp_path / "legacy.srt"
+    path.write_bytes("café".encode("cp1252"))
+    assert read_text(str(path)) == "café"
+
+
+def test_srt_inputs_are_shifted_onto_the_merged_timeline(tmp_path):
+    a = _write(tmp_path / "a.srt", SRT_A)
+    b = _write(tmp_path / "b.srt", SRT_B)
+    out = merge_subtitles([a, None, b], [0.0, 10.0, 20.0], str(tmp_path / "merged"))
+    assert out.endswith(".srt")
+    cues = list(iter_srt(read_text(out)))
+    assert [c[:2] for c in cues] == [(1000, 2500), (3000, 4000), (20500, 21000)]
+    assert cues[0][2] == "<i>Hello</i>"
+    numbers = [line for line in read_text(out).splitlines() if line.isdigit()]
+    assert numbers == ["1", "2", "3"]
+
+
+def test_mixed_inputs_become_ass_with_renamed_styles(tmp_path):
+    srt = _write(tmp_path / "a.srt", SRT_A)
+    ass = _write(tmp_path / "b.ass", ASS)
+    out = merge_subtitles([srt, ass], [0.0, 5.0], str(tmp_path / "merged"))
+    assert out.endswith(".ass")
+    text = read_text(out)
+    # The SRT cues use the stock Default style, the ASS one differs
+    assert "Style: Default,Arial," in text
+    assert "Style: Default_2,Verdana,60," in text
+    assert "PlayResX: 1920" in text
+    events = [line for line in text.splitlines() if line.startswith("Dialogue:")]
+    assert events == [
+        r"Dialogue: 0,0:00:01.00,0:00:02.50,Default,,0,0,0,,{\i1}Hello{\i0}",
+        "Dialogue: 0,0:00:03.00,0:00:04.00,Default,,0,0,0,,World",
+        "Dialogue: 0,0:00:06.00,0:00:07.00,Default_2,,0,0,0,,Styled, with comma",
+    ]
@@ -0,0 +1,34 @@
+import numpy as np
+
+from helpers.thumbnail_picker import MAX_BRIGHTNESS, MIN_BRIGHTNESS, score_frames
+
+
+def _noise(seed: int, low: int = 40, high: int = 200) -> np.ndarray:
+    return np.random.default_rng(seed).integers(low, high, (90, 160), dtype=np.uint8)
+
+
+def _blur(frame: np.ndarray) -> np.ndarray:
+    f = frame.astype(np.float32)
+    for axis in (0, 1):
+        f = (np.roll(f, -1, axis) + f + np.roll(f, 1, axis)) / 3
+    return f.astype(np.uint8)
+
+
+def test_unusable_frames_score_minus_inf():
+    black = np.full((90, 160), MIN_BRIGHTNESS - 10, dtype=np.uint8)
+    white = np.full((90, 160), MAX_BRIGHTNESS + 10, dtype=np.uint8)
+    flat = np.full((90, 160), 128, dtype=np.uint8)
+    scores = score_frames(np.stack([black, white, flat, _noise(1)]))
+    assert np.isneginf(scores[:3]).all()
+    assert np.isfinite(scores[3])
+
+
+def test_sharp_frame_beats_blurred_copy():
+    sharp = _noise(2)
+    scores = score_frames(np.stack([_blur(sharp), sharp]))
+    assert int(np.argmax(scores)) == 1
+
+
+def test_one_score_per_frame():
+    frames = np.stack([_noise(n) for n in range(5)])
+    assert score_frames(frames).shape == (5,)
@@ -0,0 +1,23 @@
+import pytest
+
+from helpers.trimmer import parse_timestamp
+
+
+@pytest.mark.parametrize(
+    "value, seconds",
+    [
+        ("90", 90.0),
+        ("1:30", 90.0),
+        ("01:00:00", 3600.0),
+        ("1:02:03.5", 3723.5),
+        (" 12.25 ", 12.25),
+        ("0", 0.0),
+    ],
+)
+def test_parse_timestamp(value, seconds):
+    assert parse_timestamp(value) == seconds
+
+
+@pytest.mark.parametrize("value", ["", "abc", "1:2:3:4", "-5", "1,5", "10s"])
+def test_parse_timestamp_rejects(value):
+    assert parse_timestamp(value) is None